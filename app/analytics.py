@@ -0,0 +1,241 @@
+# app/analytics.py
+"""
+Lecturas analíticas con DuckDB para despliegues embebidos (un solo nodo).
+
+Con ``ANALYTICS_DUCKDB_PATH`` los agregados por usuario de /history y de los
+resúmenes anuales (app/year_reports.py) se calculan en una copia por columnas
+de income, expenses, savings e investments en DuckDB, en lugar de en la base
+de datos principal:
+
+- La primera vez se copian las cuatro tablas enteras (ordenadas por usuario y
+  fecha, para que DuckDB salte los bloques de otros usuarios).
+- Antes de cada consulta se aplican los cambios nuevos del registro de
+  app/changes.py (``seq`` > último aplicado): una consulta por el índice de
+  ``changes`` si no hay nada nuevo. Quien acaba de escribir ve su escritura.
+- Aplicar es idempotente (por id se borra la fila y se inserta su último
+  estado), así que no importa que la copia inicial ya incluya cambios
+  posteriores a su ``seq``.
+
+``ANALYTICS_DUCKDB_PATH`` es un fichero (se conserva entre reinicios y sólo
+se aplica lo que falte) o ``:memory:``. DuckDB no deja abrir el mismo fichero
+desde varios procesos: con varios workers, ``:memory:`` (cada uno carga su
+copia). Necesita el paquete ``duckdb``. No se usa con SHARD_DATABASE_URLS,
+donde cada shard tiene su propio registro.
+
+    python -m app.analytics    # carga o pone al día la copia (p. ej. antes de arrancar)
+"""
+
+import os
+import threading
+from datetime import date as pydate
+from functools import lru_cache
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+from sqlalchemy import BigInteger, cast, func, select
+
+from app import fx
+from app.changes import ENTITIES
+from app.database import get_engine
+from app.models import Change, Income, Expense, Saving, Investment
+
+try:
+    import duckdb
+except ImportError:  # pragma: no cover - dependencia opcional
+    duckdb = None
+
+ANALYTICS_DUCKDB_PATH = os.getenv("ANALYTICS_DUCKDB_PATH", "")
+# Filas leídas de la base de datos principal por lote (copia y registro).
+CHUNK_ROWS = 100_000
+
+MODELS = (Income, Expense, Saving, Investment)
+TABLES = {ENTITIES[Model][0]: Model for Model in MODELS}
+# Columnas de agrupación que admite ``converted_totals``.
+GROUP_BY = {"year": "year(date)", "month": "month(date)", "category": "category"}
+EPOCH = np.datetime64("1970-01-01", "D")
+
+
+def enabled() -> bool:
+    return bool(ANALYTICS_DUCKDB_PATH) and not os.getenv("SHARD_DATABASE_URLS")
+
+
+class Mirror:
+    def __init__(self, path: str):
+        if duckdb is None:
+            raise RuntimeError("ANALYTICS_DUCKDB_PATH requires the 'duckdb' package")
+        self._conn = duckdb.connect(path)
+        self._lock = threading.Lock()
+        self._seq: Optional[int] = None
+        self._conn.execute("CREATE TABLE IF NOT EXISTS mirror_state (seq BIGINT NOT NULL, source VARCHAR NOT NULL)")
+        for table in TABLES:
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} (id BIGINT NOT NULL, user_id INTEGER NOT NULL, date DATE NOT NULL, "
+                "amount DECIMAL(14, 2) NOT NULL, currency VARCHAR NOT NULL, category VARCHAR)"
+            )
+
+    def query(self, sql: str, parameters: Sequence = ()) -> list:
+        self.sync()
+        cursor = self._conn.cursor()
+        try:
+            return cursor.execute(sql, parameters).fetchall()
+        finally:
+            cursor.close()
+
+    def sync(self) -> None:
+        """Aplica los cambios pendientes del registro (o copia todo la primera vez)."""
+        with self._lock, get_engine().connect() as source:
+            if self._seq is None:
+                self._seq = self._stored_seq(source)
+                if self._seq is None:
+                    self._seq = self._load(source)
+            while True:
+                rows = source.execute(
+                    select(Change.seq, Change.user_id, Change.entity, Change.key, Change.op, Change.data)
+                    .where(Change.seq > self._seq, Change.entity.in_(TABLES))
+                    .order_by(Change.seq)
+                    .limit(CHUNK_ROWS)
+                ).all()
+                if not rows:
+                    return
+                self._apply(rows)
+                self._seq = rows[-1].seq
+                if len(rows) < CHUNK_ROWS:
+                    return
+
+    def _stored_seq(self, source) -> Optional[int]:
+        # Una copia de otra base de datos, o de una que ya no tiene esos seq
+        # (restaurada o recreada), se vuelve a copiar entera.
+        stored = self._conn.execute("SELECT seq, source FROM mirror_state").fetchone()
+        latest = source.execute(select(func.max(Change.seq))).scalar() or 0
+        if stored is None or stored[1] != str(source.engine.url) or stored[0] > latest:
+            return None
+        return stored[0]
+
+    def _load(self, source) -> int:
+        # El seq antes que las filas: lo que se confirme mientras se copia se
+        # aplica otra vez después, sin efecto.
+        seq = source.execute(select(func.max(Change.seq))).scalar() or 0
+        cursor = self._conn.cursor()
+        cursor.begin()
+        for table, Model in TABLES.items():
+            cursor.execute(f"DELETE FROM {table}")
+            category = Model.category if Model is not Income else None
+            statement = select(
+                Model.id, Model.user_id, Model.date, cast(func.round(Model.amount * 100), BigInteger), Model.currency,
+                *([category] if category is not None else []),
+            )
+            result = source.execution_options(stream_results=True, yield_per=CHUNK_ROWS).execute(statement)
+            for chunk in result.partitions():
+                columns = list(zip(*chunk))
+                self._insert(cursor, table, {
+                    "id": np.array(columns[0], dtype=np.int64),
+                    "user_id": np.array(columns[1], dtype=np.int32),
+                    "day": (np.array(columns[2], dtype="datetime64[D]") - EPOCH).astype(np.int32),
+                    "cents": np.array(columns[3], dtype=np.int64),
+                    "currency": columns[4],
+                    "category": columns[5] if category is not None else [None] * len(chunk),
+                })
+            cursor.execute(f"CREATE OR REPLACE TABLE {table} AS SELECT * FROM {table} ORDER BY user_id, date")
+        self._save_seq(cursor, seq, str(source.engine.url))
+        cursor.commit()
+        cursor.close()
+        return seq
+
+    def _apply(self, rows) -> None:
+        # Último estado de cada fila del lote: None si quedó borrada.
+        latest = {}
+        for row in rows:
+            latest[(row.entity, row.key)] = None if row.op == "delete" else (row.user_id, row.data)
+        cursor = self._conn.cursor()
+        cursor.begin()
+        for table in TABLES:
+            keys = [key for entity, key in latest if entity == table]
+            if not keys:
+                continue
+            cursor.register("mirror_ids", {"id": np.array([int(key) for key in keys], dtype=np.int64)})
+            cursor.execute(f"DELETE FROM {table} WHERE id IN (SELECT id FROM mirror_ids)")
+            cursor.unregister("mirror_ids")
+            upserts = [(int(key), latest[(table, key)]) for key in keys if latest[(table, key)] is not None]
+            if not upserts:
+                continue
+            self._insert(cursor, table, {
+                "id": np.array([row_id for row_id, _ in upserts], dtype=np.int64),
+                "user_id": np.array([user_id for _, (user_id, _) in upserts], dtype=np.int32),
+                "day": (np.array([data["date"] for _, (_, data) in upserts], dtype="datetime64[D]") - EPOCH)
+                .astype(np.int32),
+                "cents": np.round(np.array([data["amount"] for _, (_, data) in upserts], dtype=np.float64) * 100)
+                .astype(np.int64),
+                "currency": [data["currency"] for _, (_, data) in upserts],
+                "category": [data.get("category") for _, (_, data) in upserts],
+            })
+        self._save_seq(cursor, rows[-1].seq, str(get_engine().url))
+        cursor.commit()
+        cursor.close()
+
+    @staticmethod
+    def _insert(cursor, table: str, columns: dict) -> None:
+        # DuckDB lee los arrays de NumPy sin copiarlos fila a fila, pero no
+        # acepta datetime64[D] (van como días desde 1970) y con arrays de
+        # objetos va lentísimo: monedas y categorías van como códigos de su
+        # lista de valores (0 = NULL).
+        strings = {}
+        for name in ("currency", "category"):
+            values = ["" if value is None else value for value in columns[name]]
+            labels, codes = np.unique(np.array(values, dtype=str), return_inverse=True)
+            if labels.size and labels[0] == "":
+                codes, labels = codes - 1, labels[1:]
+            columns[name] = (codes + 1).astype(np.int32)
+            strings[name] = labels.tolist()
+        cursor.register("mirror_rows", columns)
+        cursor.execute(
+            f"INSERT INTO {table} SELECT id, user_id, DATE '1970-01-01' + day, "
+            "CAST(cents AS DECIMAL(14, 2)) / 100, (?::VARCHAR[])[currency], (?::VARCHAR[])[category] FROM mirror_rows",
+            [strings["currency"], strings["category"]],
+        )
+        cursor.unregister("mirror_rows")
+
+    @staticmethod
+    def _save_seq(cursor, seq: int, source: str) -> None:
+        cursor.execute("DELETE FROM mirror_state")
+        cursor.execute("INSERT INTO mirror_state VALUES (?, ?)", [seq, source])
+
+
+@lru_cache
+def get_mirror() -> Mirror:
+    return Mirror(ANALYTICS_DUCKDB_PATH)
+
+
+def converted_totals(
+    session,
+    Model,
+    user_id: int,
+    start: pydate,
+    end: Optional[pydate] = None,
+    by: Sequence[str] = (),
+    target: str = fx.BASE_CURRENCY,
+) -> Dict[tuple, float]:
+    """
+    Como ``fx.converted_totals`` para los movimientos de un usuario entre
+    ``start`` y ``end`` (sin incluir), agrupados por ``by`` ("year", "month",
+    "category"), calculado en DuckDB.
+    """
+    keys = [GROUP_BY[name] for name in by]
+    sql = (
+        f"SELECT {''.join(key + ', ' for key in keys)}currency, date, CAST(sum(amount) AS DOUBLE) "
+        f"FROM {ENTITIES[Model][0]} WHERE user_id = ? AND date >= ?"
+    )
+    parameters = [user_id, start]
+    if end is not None:
+        sql += " AND date < ?"
+        parameters.append(end)
+    rows = get_mirror().query(sql + " GROUP BY ALL", parameters)
+    if not rows:
+        return {(): 0.0} if not keys else {}
+    return fx.sum_converted(session, rows, len(keys), target)
+
+
+if __name__ == "__main__":
+    if not enabled():
+        raise SystemExit("ANALYTICS_DUCKDB_PATH is not set (or SHARD_DATABASE_URLS is)")
+    get_mirror().sync()
+    print({table: get_mirror().query(f"SELECT count(*) FROM {table}")[0][0] for table in TABLES})
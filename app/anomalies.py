@@ -0,0 +1,249 @@
+# app/anomalies.py
+"""
+Detección de gastos anómalos por usuario y categoría.
+
+``expense_stats`` guarda por usuario y categoría los últimos WINDOW_SIZE gastos
+(por fecha) con su mediana y MAD (desviación absoluta mediana). Cada gasto
+nuevo o modificado se puntúa contra la ventana de su categoría *antes* de
+entrar en ella con el z-score robusto de Iglewicz y Hoaglin,
+
+    z = 0.6745 · (importe - mediana) / MAD,
+
+y si z >= THRESHOLD queda en ``expense_flags``. Sólo se marcan gastos por
+encima de lo habitual, y sólo cuando la ventana tiene MIN_SAMPLES gastos.
+Ventanas y marcas van en EUR (fx.BASE_CURRENCY, al tipo del día del gasto):
+un gasto en USD se compara con los demás en la misma moneda.
+
+Las ventanas se actualizan de forma incremental con lo que cada commit
+escribió (``signals.on_commit_rows``: POST/PUT/DELETE /expense y la importación
+CSV), en un hilo en segundo plano para no alargar las peticiones. Ninguna
+escritura necesita recorrer el histórico; ``python -m app.jobs.anomalies``
+reconstruye las ventanas tras la migración o si el proceso cayó con cambios
+pendientes en la cola.
+
+ANOMALY_MODE: ``background`` (por defecto), ``inline`` (en el mismo hilo, tras
+el commit) u ``off``.
+
+``expense_flags`` no tiene FK a expenses (con el esquema particionado su
+clave es (id, date)): las marcas de los gastos borrados las quita
+``apply_changes``, que vuelve a evaluar cada gasto escrito desde cero (con
+ANOMALY_MODE=off, ``python -m app.jobs.anomalies`` después).
+"""
+
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import Dict, Iterable, List, Set, Tuple
+
+import numpy as np
+from sqlalchemy import delete
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, select
+
+from app import fx, signals
+from app.models import Expense, ExpenseStat, ExpenseFlag
+
+logger = logging.getLogger(__name__)
+
+ANOMALY_MODE = os.getenv("ANOMALY_MODE", "background")
+WINDOW_SIZE = int(os.getenv("ANOMALY_WINDOW_SIZE", "50"))
+MIN_SAMPLES = int(os.getenv("ANOMALY_MIN_SAMPLES", "8"))
+THRESHOLD = float(os.getenv("ANOMALY_THRESHOLD", "3.5"))
+# Si casi todos los importes son iguales la MAD es 0: se usa como mínimo este
+# porcentaje de la mediana para no marcar cualquier céntimo de diferencia.
+MIN_MAD_RATIO = 0.05
+# Intentos de ``process`` cuando otro proceso crea a la vez la ventana de la
+# misma categoría (IntegrityError al insertarla).
+PROCESS_ATTEMPTS = 3
+
+CENT = Decimal("0.01")
+
+
+def robust_stats(amounts: Iterable[float]) -> Tuple[float, float]:
+    """(mediana, MAD) de los importes."""
+    values = np.asarray(list(amounts), dtype=float)
+    if not values.size:
+        return 0.0, 0.0
+    median = float(np.median(values))
+    return median, float(np.median(np.abs(values - median)))
+
+
+def robust_score(amount: float, median: float, mad: float) -> float:
+    scale = max(mad, abs(median) * MIN_MAD_RATIO, 0.01)
+    return 0.6745 * (amount - median) / scale
+
+
+# ─── Actualización incremental ─────────────────────────────────────────────────
+# Cada entrada de la ventana es [id, fecha ISO, importe]; la ventana se mantiene
+# ordenada por (fecha, id) y se recorta por el principio.
+
+def _insert_sample(samples: List[list], expense: Expense, amount: float) -> List[list]:
+    entry = [expense.id, expense.date.isoformat(), amount]
+    samples = sorted(samples + [entry], key=lambda item: (item[1], item[0]))
+    return samples[-WINDOW_SIZE:]
+
+
+def _base_amounts(session: Session, expenses: List[Expense]) -> Dict[int, float]:
+    """Importe en EUR de cada gasto {id: importe}."""
+    amounts = np.array([float(expense.amount) for expense in expenses], dtype=np.float64)
+    currencies = np.array([expense.currency for expense in expenses])
+    if (currencies != fx.BASE_CURRENCY).any():
+        days = np.array([expense.date for expense in expenses], dtype="datetime64[D]")
+        amounts = fx.rate_table(session).convert(amounts, currencies, days, fx.BASE_CURRENCY)
+    return {expense.id: round(float(amount), 2) for expense, amount in zip(expenses, amounts)}
+
+
+def apply_changes(session: Session, keys: Set[Tuple[int, int]]) -> int:
+    """
+    Actualiza ventanas y marcas para los gastos {(user_id, expense_id)}
+    escritos (o borrados). Devuelve el número de gastos marcados.
+    """
+    by_user: Dict[int, Set[int]] = {}
+    for user_id, expense_id in keys:
+        by_user.setdefault(user_id, set()).add(expense_id)
+
+    flagged = 0
+    now = datetime.now(timezone.utc)
+    for user_id, expense_ids in sorted(by_user.items()):
+        # FOR UPDATE (en Postgres; SQLite ya serializa las escrituras): otro
+        # worker con el mismo usuario espera en vez de pisar la ventana. El
+        # orden por usuario y categoría evita interbloqueos entre lotes.
+        stats = {
+            stat.category: stat
+            for stat in session.exec(
+                select(ExpenseStat)
+                .where(ExpenseStat.user_id == user_id)
+                .order_by(ExpenseStat.category)
+                .with_for_update()
+            ).all()
+        }
+        expenses = session.exec(
+            select(Expense).where(Expense.user_id == user_id, Expense.id.in_(expense_ids))
+        ).all()
+        amounts = _base_amounts(session, expenses) if expenses else {}
+
+        # Fuera de cualquier ventana y sin marca: se vuelven a evaluar desde cero
+        # (cubre cambios de importe, fecha o categoría y borrados).
+        samples = {
+            category: [entry for entry in stat.samples if entry[0] not in expense_ids]
+            for category, stat in stats.items()
+        }
+        session.exec(delete(ExpenseFlag).where(
+            ExpenseFlag.user_id == user_id, ExpenseFlag.expense_id.in_(expense_ids)
+        ))
+
+        for expense in sorted(expenses, key=lambda e: (e.date, e.id)):
+            window = samples.setdefault(expense.category, [])
+            if len(window) >= MIN_SAMPLES:
+                median, mad = robust_stats(entry[2] for entry in window)
+                score = robust_score(amounts[expense.id], median, mad)
+                if score >= THRESHOLD:
+                    session.add(ExpenseFlag(
+                        expense_id=expense.id,
+                        user_id=user_id,
+                        category=expense.category,
+                        amount=Decimal(amounts[expense.id]).quantize(CENT),
+                        median=Decimal(median).quantize(CENT),
+                        mad=Decimal(mad).quantize(CENT),
+                        score=Decimal(score).quantize(CENT),
+                        flagged_at=now,
+                    ))
+                    flagged += 1
+            samples[expense.category] = _insert_sample(window, expense, amounts[expense.id])
+
+        for category, window in samples.items():
+            stat = stats.get(category)
+            if not window:
+                if stat is not None:
+                    session.delete(stat)
+                continue
+            median, mad = robust_stats(entry[2] for entry in window)
+            if stat is None:
+                stat = ExpenseStat(user_id=user_id, category=category)
+            # Se asigna una lista nueva para que SQLAlchemy detecte el cambio del JSON.
+            stat.samples = window
+            stat.sample_count = len(window)
+            stat.median = Decimal(median).quantize(CENT)
+            stat.mad = Decimal(mad).quantize(CENT)
+            session.add(stat)
+    return flagged
+
+
+def process(keys: Set[Tuple[int, int]]) -> None:
+    from app.database import new_session
+
+    for attempt in range(PROCESS_ATTEMPTS):
+        try:
+            with new_session() as session:
+                apply_changes(session, keys)
+                session.commit()
+            return
+        except IntegrityError:
+            # La ventana que íbamos a crear ya existe: el siguiente intento la
+            # lee (y la bloquea) y aplica los cambios sobre ella.
+            if attempt == PROCESS_ATTEMPTS - 1:
+                raise
+            logger.info("Ventana de anomalías creada a la vez por otro proceso; reintentando")
+
+
+# ─── Cola en segundo plano ─────────────────────────────────────────────────────
+
+_queue: "queue.Queue[Set[Tuple[int, int]]]" = queue.Queue()
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def _run_worker() -> None:
+    while True:
+        keys = set(_queue.get())
+        taken = 1
+        # Junta lo que se haya acumulado para procesarlo en una sola transacción.
+        while True:
+            try:
+                keys |= _queue.get_nowait()
+                taken += 1
+            except queue.Empty:
+                break
+        try:
+            process(keys)
+        except Exception:
+            logger.exception("No se pudieron actualizar las estadísticas de %d gastos", len(keys))
+        finally:
+            for _ in range(taken):
+                _queue.task_done()
+
+
+def _ensure_worker() -> None:
+    global _worker
+    if _worker is not None and _worker.is_alive():
+        return
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_run_worker, name="expense-anomalies", daemon=True)
+            _worker.start()
+
+
+@signals.on_commit_rows
+def _expenses_committed(rows):
+    keys = rows.get(Expense)
+    if not keys or ANOMALY_MODE == "off":
+        return
+    if ANOMALY_MODE == "inline":
+        process(keys)
+        return
+    _ensure_worker()
+    _queue.put(set(keys))
+
+
+def wait_idle(timeout: float = 5.0) -> bool:
+    """Espera a que la cola quede vacía (para scripts y pruebas manuales)."""
+    deadline = time.monotonic() + timeout
+    while _queue.unfinished_tasks:
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(0.01)
+    return True
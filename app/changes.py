@@ -0,0 +1,246 @@
+# app/changes.py
+"""
+Registro de cambios de movimientos y metas (tabla ``changes``).
+
+Cada alta, modificación o baja de income, expenses, savings, investments y
+de las tres metas deja una fila en ``changes``, en la misma transacción, con
+un ``seq`` que sólo crece. Quien necesite seguir los cambios (cachés,
+agregados, exportaciones, /changes) lee ``seq > último visto`` en lugar de
+volver a recorrer las tablas. Las bajas guardan la última versión de la fila
+borrada: el registro sirve también de auditoría.
+
+- Escrituras con el ORM: se recogen solas en cada flush.
+- Escrituras en bloque con Core (app/csv_import.py, app/jobs/recurring.py):
+  quien escribe llama a ``record_many``, como con signals.record_bulk_rows.
+
+Todo se inserta de golpe justo antes del commit. En Postgres, con un lock de
+transacción (pg_advisory_xact_lock) para que las transacciones que escriben
+cambios confirmen en el orden de sus ``seq``: sin él, un lector podría ver
+el seq 11 antes de que el 10 estuviera confirmado y saltárselo para siempre.
+"""
+
+import os
+from datetime import date as pydate, datetime, timezone
+from decimal import ROUND_HALF_UP, Decimal
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import event, func, inspect, select, text
+from sqlalchemy.ext.horizontal_shard import ShardedSession
+from sqlalchemy.orm import Session
+
+from app.models import (
+    Change,
+    Income,
+    Expense,
+    Saving,
+    Investment,
+    ExpenseGoal,
+    SavingGoal,
+    InvestmentGoal,
+)
+
+# Nombre de cada tabla en el registro (los mismos que los data_type de /import)
+# y columnas que se guardan de cada fila.
+ENTITIES = {
+    Income: ("income", ("date", "amount", "currency")),
+    Expense: ("expenses", ("date", "amount", "currency", "category", "notes")),
+    Saving: ("savings", ("date", "amount", "currency", "category", "notes")),
+    Investment: ("investments", ("date", "amount", "currency", "category", "notes")),
+    ExpenseGoal: ("expense_goals", ("date", "value")),
+    SavingGoal: ("saving_goals", ("date", "value")),
+    InvestmentGoal: ("investment_goals", ("date", "value")),
+}
+GOAL_MODELS = (ExpenseGoal, SavingGoal, InvestmentGoal)
+
+CENTS = Decimal("0.01")
+
+# Clave del pg_advisory_xact_lock que ordena los commits con cambios.
+ADVISORY_LOCK_KEY = 0x7765616C  # "weal"
+
+
+def _json_value(value):
+    if isinstance(value, pydate):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        # Como texto y en céntimos, redondeados como NUMERIC(_, 2) en
+        # Postgres: un float JSON no conserva los céntimos exactos.
+        return str(value.quantize(CENTS, ROUND_HALF_UP))
+    return value
+
+
+def _key(Model, row_id, day: str) -> str:
+    # Las metas no tienen id: hay una por usuario y mes (``day`` en ISO).
+    if Model in GOAL_MODELS:
+        return day[:7] + "-01"
+    return str(row_id)
+
+
+def record(session, Model, op: str, user_id: int, values, row_id: Optional[int] = None) -> None:
+    """Anota un cambio de ``Model`` (``values``: dict u objeto); se escribe antes del próximo commit."""
+    if not isinstance(values, dict):
+        values = {name: getattr(values, name) for name in ENTITIES[Model][1]}
+    record_many(session, Model, op, [(user_id, row_id, values)])
+
+
+def record_many(session, Model, op: str, rows: Iterable[Tuple[int, Optional[int], dict]]) -> None:
+    """Como ``record`` para filas ``(user_id, id, valores)`` escritas con Core (id None en metas)."""
+    entity, fields = ENTITIES[Model]
+    pending = session.info.setdefault("pending_changes", [])
+    for user_id, row_id, values in rows:
+        data = {name: _json_value(values.get(name)) for name in fields}
+        pending.append({
+            "user_id": user_id,
+            "entity": entity,
+            "key": _key(Model, row_id, data["date"]),
+            "op": op,
+            "data": data,
+        })
+
+
+def database_id(user_id: int) -> str:
+    """
+    Base de datos cuyos ``seq`` valen para ``user_id``: "main", o su shard.
+    Los seq sólo tienen sentido en la base de datos que los generó.
+    """
+    if os.getenv("SHARD_DATABASE_URLS"):
+        from app.sharding import shard_for_user
+
+        return shard_for_user(user_id)
+    return "main"
+
+
+def parse_cursor(session, cursor: Optional[str], database: str, user_id: int) -> Optional[int]:
+    """
+    ``seq`` de un cursor ``"{base de datos}:{seq}"`` (/sync, /changes), o None
+    si falta, no es válido, es de otra base de datos (el usuario se movió de
+    shard) o va por delante del último cambio del usuario (la base de datos
+    se restauró o cambió de primario): hay que empezar de cero. Los cursores
+    que se entregan nunca pasan de ``last_seq`` del usuario.
+    """
+    if not cursor:
+        return None
+    cursor_database, _, seq = cursor.rpartition(":")
+    if cursor_database != database or not seq.isdigit():
+        return None
+    if int(seq) > last_seq(session, user_id):
+        return None
+    return int(seq)
+
+
+def read_changes(session, since: int, limit: int, user_id: Optional[int] = None) -> List[Change]:
+    """Cambios con ``seq > since`` en orden, de un usuario o de todos."""
+    statement = select(Change).where(Change.seq > since)
+    if user_id is not None:
+        statement = statement.where(Change.user_id == user_id)
+    return list(session.scalars(statement.order_by(Change.seq).limit(limit)))
+
+
+def last_seq(session, user_id: int) -> int:
+    """Último ``seq`` de un usuario (0 si no tiene cambios)."""
+    statement = select(func.max(Change.seq)).where(Change.user_id == user_id)
+    return session.execute(statement).scalar() or 0
+
+
+def current_rows(session, Model, user_id: int) -> Iterator[Tuple[str, list]]:
+    """
+    (clave, valores) de las filas actuales de ``Model`` de un usuario, con las
+    claves y los valores como en el registro (en el orden de ``ENTITIES``).
+    """
+    fields = ENTITIES[Model][1]
+    row_id = Model.date if Model in GOAL_MODELS else Model.id
+    statement = select(row_id, *(getattr(Model, name) for name in fields)).where(Model.user_id == user_id)
+    for row in session.execute(statement):
+        values = [_json_value(value) for value in row[1:]]
+        yield _key(Model, row[0], values[0]), values
+
+
+# ─── Listeners ──────────────────────────────────────────────────────────────────
+
+def _old_value(state, name: str):
+    history = state.attrs[name].history
+    if history.deleted:
+        return history.deleted[0]
+    return getattr(state.object, name)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changes(session, flush_context):
+    # Tras el flush los movimientos nuevos ya tienen id, y new/dirty/deleted
+    # todavía reflejan lo que se acaba de escribir.
+    for obj in session.new:
+        if type(obj) in ENTITIES:
+            record(session, type(obj), "insert", obj.user_id, obj, getattr(obj, "id", None))
+    for obj in session.deleted:
+        if type(obj) in ENTITIES:
+            state = inspect(obj)
+            Model = type(obj)
+            old = {name: _old_value(state, name) for name in ENTITIES[Model][1]}
+            record(session, Model, "delete", _old_value(state, "user_id"), old, getattr(obj, "id", None))
+    for obj in session.dirty:
+        if type(obj) not in ENTITIES or not session.is_modified(obj, include_collections=False):
+            continue
+        Model = type(obj)
+        state = inspect(obj)
+        row_id = getattr(obj, "id", None)
+        old_user = _old_value(state, "user_id")
+        old_key = _key(Model, row_id, _old_value(state, "date").isoformat())
+        if (old_user, old_key) != (obj.user_id, _key(Model, row_id, obj.date.isoformat())):
+            # Cambió de usuario (o la meta de mes): para el anterior es una
+            # baja y para el nuevo un alta.
+            old = {name: _old_value(state, name) for name in ENTITIES[Model][1]}
+            record(session, Model, "delete", old_user, old, row_id)
+            record(session, Model, "insert", obj.user_id, obj, row_id)
+        else:
+            record(session, Model, "update", obj.user_id, obj, row_id)
+
+
+@event.listens_for(Session, "before_commit")
+def _write_changes(session):
+    # Lo que otros listeners escriben antes del commit (goal_status,
+    # anomalías) no son movimientos ni metas: da igual si corren después.
+    write_pending(session)
+
+
+def write_pending(session, returning: bool = False) -> List[int]:
+    """
+    Escribe ya los cambios pendientes de ``session`` (si no, lo hace el
+    commit). Con ``returning``, devuelve sus seq: así /sync distingue los
+    cambios que acaba de hacer el propio cliente.
+    """
+    session.flush()
+    pending = session.info.pop("pending_changes", None)
+    if not pending:
+        return []
+    changed_at = datetime.now(timezone.utc)
+    for entry in pending:
+        entry["changed_at"] = changed_at
+    table = Change.__table__
+    seqs = []
+    for conn, entries in _connections(session, pending):
+        if conn.dialect.name == "postgresql":
+            conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": ADVISORY_LOCK_KEY})
+        if returning:
+            seqs += conn.execute(table.insert().returning(table.c.seq), entries).scalars().all()
+        else:
+            conn.execute(table.insert(), entries)
+    return seqs
+
+
+def _connections(session, pending: list):
+    """(conexión, cambios) por base de datos: con sharding, la del shard de cada usuario."""
+    if not isinstance(session, ShardedSession):
+        return [(session.connection(), pending)]
+    from app.sharding import shard_for_user
+
+    by_shard = {}
+    for entry in pending:
+        by_shard.setdefault(shard_for_user(entry["user_id"]), []).append(entry)
+    return [
+        (session.connection(bind_arguments={"shard_id": shard_id}), entries)
+        for shard_id, entries in by_shard.items()
+    ]
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_changes(session, previous_transaction):
+    session.info.pop("pending_changes", None)
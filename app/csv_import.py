@@ -0,0 +1,827 @@
+# app/csv_import.py
+"""
+Parseo y escritura de los CSV de /import.
+
+El parseo (``parse_csv``) no toca la base de datos y sólo recibe y devuelve
+tipos simples, así que se ejecuta en los procesos de ``get_pool()``: un zip
+de cientos de ficheros se valida en paralelo, uno por núcleo. La escritura
+(``write_files``) la hace un único escritor en el proceso de la petición, que
+junta los ficheros ya validados en inserciones en bloque con Core (una
+transacción por base de datos o shard) en lugar de una sentencia por fila.
+
+Formato de cada tipo (con cabecera, que se ignora):
+- expenses, savings, investments: ``date,amount,category[,currency[,notes]]``
+  (las filas que ya se importaron antes se omiten: ver ``content_hashes``)
+- income: ``date,amount[,currency]`` (un ingreso por mes: se sustituye)
+- expense_goals, saving_goals, investment_goals: ``date,value`` (una meta
+  por mes: se sustituye)
+
+Las categorías son las de los routers (ExpenseCategory, SavingCategory,
+InvestmentCategory), como al crear un movimiento por la API.
+
+IMPORT_WORKERS fija el tamaño del pool (por defecto, un proceso por núcleo).
+"""
+
+import codecs
+import csv
+import hashlib
+import io
+import multiprocessing
+import os
+import threading
+import unicodedata
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date as pydate
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import Column, Date, MetaData, Numeric, String, Table, bindparam, exists, func, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlmodel import Session
+
+from app import changes, fx, signals, year_reports
+from app.database import get_engine
+from app.jobs.reconcile_goals import reconcile_users
+from app.models import (
+    Income, Expense, Saving, Investment,
+    ExpenseGoal, SavingGoal, InvestmentGoal,
+)
+from app.routers.expense import ExpenseCategory
+from app.routers.investment import InvestmentCategory
+from app.routers.saving import SavingCategory
+
+LEDGER_TYPES = {"expenses": Expense, "savings": Saving, "investments": Investment}
+GOAL_TYPES = {"expense_goals": ExpenseGoal, "saving_goals": SavingGoal, "investment_goals": InvestmentGoal}
+DATA_TYPES = (*LEDGER_TYPES, "income", *GOAL_TYPES)
+
+# Errores por fichero que se devuelven como mucho; el resto sólo se cuenta.
+MAX_REPORTED_ERRORS = 100
+
+IMPORT_WORKERS = int(os.getenv("IMPORT_WORKERS", "0")) or os.cpu_count() or 1
+
+
+class CSVFileError(ValueError):
+    pass
+
+
+class ParsedFile(NamedTuple):
+    """
+    Filas validadas de un CSV, por columnas: así vuelven de los procesos del
+    pool como unos pocos buffers y no como un objeto date y otro Decimal por
+    fila, que cuesta más serializar que parsear. Categorías y monedas van
+    como índices sobre la lista de valores distintos.
+    """
+    data_type: str
+    days: np.ndarray            # datetime64[D]
+    cents: np.ndarray           # int64: importe (o valor de la meta) x 100
+    categories: np.ndarray      # int32, índices en category_names (movimientos)
+    category_names: List[str]
+    currencies: np.ndarray      # int32, índices en currency_names (no en metas)
+    currency_names: List[str]
+    notes: List[Optional[str]]  # movimientos; None si la fila no trae notas
+    errors: List[str]
+
+    def records(self) -> list:
+        """
+        Tuplas (date, amount, category, currency, notes) para movimientos,
+        (date, amount, currency) para ingresos y (date, value) para metas.
+        """
+        days = self.days.tolist()
+        amounts = [Decimal(cents).scaleb(-2) for cents in self.cents.tolist()]
+        if self.data_type in GOAL_TYPES:
+            return list(zip(days, amounts))
+        currencies = [self.currency_names[code] for code in self.currencies.tolist()]
+        if self.data_type == "income":
+            return list(zip(days, amounts, currencies))
+        categories = [self.category_names[code] for code in self.categories.tolist()]
+        return list(zip(days, amounts, categories, currencies, self.notes))
+
+
+def _max_cents(Model, column: str) -> int:
+    numeric = Model.__table__.c[column].type
+    return 10 ** numeric.precision
+
+
+NOTES_MAX_LENGTH = Expense.__table__.c.notes.type.length
+
+
+class _Layout(NamedTuple):
+    min_columns: int
+    max_columns: int
+    # Límite (exclusivo) en céntimos según la columna Numeric del modelo.
+    max_cents: int
+    # Categorías admitidas (None si el tipo no lleva categoría).
+    categories: Optional[frozenset]
+    # Posición de la columna opcional de moneda (None en las metas).
+    currency_column: Optional[int]
+    # Posición de la columna opcional de notas (sólo en movimientos).
+    notes_column: Optional[int] = None
+
+
+def _categories(enum) -> frozenset:
+    return frozenset(member.value for member in enum)
+
+
+_LAYOUTS = {
+    "expenses": _Layout(3, 5, _max_cents(Expense, "amount"), _categories(ExpenseCategory), 3, 4),
+    "savings": _Layout(3, 5, _max_cents(Saving, "amount"), _categories(SavingCategory), 3, 4),
+    "investments": _Layout(3, 5, _max_cents(Investment, "amount"), _categories(InvestmentCategory), 3, 4),
+    "income": _Layout(2, 3, _max_cents(Income, "amount"), None, 2),
+    **{data_type: _Layout(2, 2, _max_cents(Model, "value"), None, None) for data_type, Model in GOAL_TYPES.items()},
+}
+
+
+# ─── Parseo (sin base de datos) ─────────────────────────────────────────────────
+
+def parse_csv(data_type: str, content: bytes) -> ParsedFile:
+    """
+    Valida todas las filas de un CSV y devuelve las correctas y los errores
+    de todas las demás. Lanza CSVFileError si el fichero entero no es válido.
+
+    Sin comillas (lo habitual) valida por columnas con NumPy; con comillas
+    (o bytes nulos), fila a fila con csv.reader. Los dos dan las mismas filas y los mismos
+    errores.
+    """
+    if data_type not in _LAYOUTS:
+        raise CSVFileError(f"Invalid data type: {data_type}")
+    try:
+        text = content.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise CSVFileError("Invalid file encoding. Please use UTF-8.")
+    if b'"' in content or b"\0" in content:
+        return _parse_rows(data_type, text)
+    return _parse_columns(data_type, content.removeprefix(codecs.BOM_UTF8))
+
+
+def _parse_rows(data_type: str, text: str) -> ParsedFile:
+    reader = _csv_rows(text)
+    if next(reader, None) is None:
+        raise CSVFileError("CSV file is empty.")
+
+    layout = _LAYOUTS[data_type]
+    days, cents, categories, currencies, notes = [], [], [], [], []
+    category_codes: Dict[str, int] = {}
+    currency_codes: Dict[str, int] = {}
+    errors = []
+    for i, row in enumerate(reader, 2):
+        if not row:
+            continue
+        try:
+            _check_width(layout, len(row))
+            day = _parse_date(row[0])
+            amount = _parse_cents(row[1], layout.max_cents)
+            if layout.categories is not None:
+                category = _parse_category(row[2], layout.categories)
+                categories.append(category_codes.setdefault(category, len(category_codes)))
+            if layout.currency_column is not None:
+                currency = _parse_currency(row[layout.currency_column] if len(row) > layout.currency_column else "")
+                currencies.append(currency_codes.setdefault(currency, len(currency_codes)))
+            if layout.notes_column is not None:
+                notes.append(_parse_notes(row[layout.notes_column] if len(row) > layout.notes_column else ""))
+            days.append(day)
+            cents.append(amount)
+        except ValueError as e:
+            errors.append((i, str(e)))
+    return ParsedFile(
+        data_type=data_type,
+        days=np.array(days, dtype="datetime64[D]"),
+        cents=np.array(cents, dtype=np.int64),
+        categories=np.array(categories, dtype=np.int32),
+        category_names=list(category_codes),
+        currencies=np.array(currencies, dtype=np.int32),
+        currency_names=list(currency_codes),
+        notes=notes,
+        errors=_error_messages(errors),
+    )
+
+
+def _csv_rows(text: str):
+    # newline=None: \r y \r\n como \n, igual que en _parse_columns.
+    try:
+        yield from csv.reader(io.StringIO(text, newline=None))
+    except csv.Error as e:
+        raise CSVFileError(f"Invalid CSV: {e}")
+
+
+def _parse_columns(data_type: str, content: bytes) -> ParsedFile:
+    """
+    Como _parse_rows, pero por columnas: las fechas AAAA-MM-DD y los importes
+    ``-?\\d+(\\.\\d{1,2})?`` se validan y convierten de golpe sobre matrices
+    de bytes, y las categorías y monedas una vez por valor distinto. Sólo
+    los valores que no encajan en ese formato rápido (espacios, exponentes,
+    más decimales... o errores) pasan por los validadores de fila.
+    """
+    body = content.replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+    if not body:
+        raise CSVFileError("CSV file is empty.")
+    body = body.removesuffix(b"\n")
+
+    # Límites de línea y número de campos por línea a partir de las
+    # posiciones de saltos y comas; todos los campos, en un único split.
+    layout = _LAYOUTS[data_type]
+    buffer = np.frombuffer(body, dtype=np.uint8)
+    line_ends = np.append(np.flatnonzero(buffer == 10), len(body))
+    commas = np.flatnonzero(buffer == 44)
+    widths = np.bincount(np.searchsorted(line_ends, commas), minlength=len(line_ends)) + 1
+    blank = np.diff(line_ends, prepend=-1) == 1
+    first_field = np.concatenate(([0], np.cumsum(widths)[:-1]))
+    fields = np.array(body.replace(b"\n", b",").split(b","), dtype=object)
+    # Sin la cabecera.
+    widths, blank, first_field = widths[1:], blank[1:], first_field[1:]
+    fits = (widths >= layout.min_columns) & (widths <= layout.max_columns) & ~blank
+
+    # Errores como (índice de línea tras la cabecera, mensaje); por fila,
+    # el primero en el mismo orden que _parse_rows.
+    errors = []
+    for index in np.flatnonzero(~fits & ~blank).tolist():
+        try:
+            _check_width(layout, int(widths[index]))
+        except ValueError as e:
+            errors.append((index, str(e)))
+
+    positions = np.flatnonzero(fits)
+    starts = first_field[positions]
+    failed: Dict[int, str] = {}
+
+    raw_days = fields[starts]
+    days, fast = _date_column(raw_days)
+    for k in np.flatnonzero(~fast).tolist():
+        try:
+            days[k] = _parse_date(raw_days[k].decode())
+        except ValueError as e:
+            failed.setdefault(k, str(e))
+
+    raw_amounts = fields[starts + 1]
+    cents, fast = _amount_column(raw_amounts, layout.max_cents)
+    for k in np.flatnonzero(~fast).tolist():
+        try:
+            cents[k] = _parse_cents(raw_amounts[k].decode(), layout.max_cents)
+        except ValueError as e:
+            failed.setdefault(k, str(e))
+
+    categories, category_names = np.zeros(0, dtype=np.int32), []
+    if layout.categories is not None:
+        allowed = layout.categories
+        categories, category_names = _code_column(
+            fields[starts + 2], lambda value: _parse_category(value, allowed), failed
+        )
+
+    currencies, currency_names = np.zeros(0, dtype=np.int32), []
+    if layout.currency_column is not None:
+        # Columna opcional: vacía en las filas que no la traen.
+        present = widths[positions] > layout.currency_column
+        raw_currencies = np.full(len(positions), b"", dtype=object)
+        raw_currencies[present] = fields[starts[present] + layout.currency_column]
+        currencies, currency_names = _code_column(raw_currencies, _parse_currency, failed)
+
+    notes: List[Optional[str]] = []
+    if layout.notes_column is not None:
+        # Texto libre: uno a uno, pero sólo en las filas que lo traen.
+        notes = [None] * len(positions)
+        present = np.flatnonzero(widths[positions] > layout.notes_column)
+        for k, value in zip(present.tolist(), fields[starts[present] + layout.notes_column].tolist()):
+            try:
+                notes[k] = _parse_notes(value.decode())
+            except ValueError as e:
+                failed.setdefault(k, str(e))
+
+    valid = np.ones(len(positions), dtype=bool)
+    if failed:
+        valid[list(failed)] = False
+        errors.extend((int(positions[k]), message) for k, message in failed.items())
+        notes = [note for note, ok in zip(notes, valid.tolist()) if ok] if notes else notes
+    return ParsedFile(
+        data_type=data_type,
+        days=days[valid],
+        cents=cents[valid],
+        categories=categories[valid] if layout.categories is not None else categories,
+        category_names=category_names,
+        currencies=currencies[valid] if layout.currency_column is not None else currencies,
+        currency_names=currency_names,
+        notes=notes,
+        errors=_error_messages((index + 2, message) for index, message in errors),
+    )
+
+
+_MONTH_DAYS = np.array([31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31])
+
+
+def _date_column(values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """(días, máscara) de las fechas con formato AAAA-MM-DD exacto y válidas."""
+    # 11 bytes: si el undécimo no es nulo, el valor es más largo.
+    raw = values.astype("S11").view(np.uint8).reshape(len(values), 11)
+    digits = raw[:, [0, 1, 2, 3, 5, 6, 8, 9]].astype(np.int64) - 48
+    fast = (raw[:, 4] == 45) & (raw[:, 7] == 45) & (raw[:, 10] == 0) & ((digits >= 0) & (digits <= 9)).all(axis=1)
+    year = digits[:, 0] * 1000 + digits[:, 1] * 100 + digits[:, 2] * 10 + digits[:, 3]
+    month = digits[:, 4] * 10 + digits[:, 5]
+    day = digits[:, 6] * 10 + digits[:, 7]
+    leap = (year % 4 == 0) & ((year % 100 != 0) | (year % 400 == 0))
+    month_days = _MONTH_DAYS[np.clip(month - 1, 0, 11)] + (leap & (month == 2))
+    fast &= (year >= 1) & (month >= 1) & (month <= 12) & (day >= 1) & (day <= month_days)
+    # Las filas descartadas se sustituyen después; aquí sólo deben ser fechas.
+    year, month, day = np.where(fast, year, 1970), np.where(fast, month, 1), np.where(fast, day, 1)
+    days = ((year - 1970) * 12 + month - 1).astype("datetime64[M]").astype("datetime64[D]") + (day - 1)
+    return days, fast
+
+
+def _amount_column(values: np.ndarray, max_cents: int) -> Tuple[np.ndarray, np.ndarray]:
+    """(céntimos, máscara) de los importes -?\\d+(\\.\\d{1,2})? dentro del límite."""
+    # Tantas columnas como el importe más largo (como mucho 19) más una nula
+    # para detectar los que se han recortado.
+    width = min(values.astype(bytes).dtype.itemsize, 19) + 1
+    raw = values.astype(f"S{width}").view(np.uint8).reshape(len(values), width)
+    length = (raw != 0).sum(axis=1)
+    negative = raw[:, 0] == 45
+    count = len(values)
+    cents = np.zeros(count, dtype=np.int64)
+    int_digits = np.zeros(count, dtype=np.int64)
+    frac_digits = np.zeros(count, dtype=np.int64)
+    dots = np.zeros(count, dtype=np.int64)
+    fast = raw[:, width - 1] == 0
+    # Horner columna a columna: cada paso es una operación sobre todo el fichero.
+    for j in range(width - 1):
+        column = raw[:, j]
+        inside = j < length
+        if j == 0:
+            inside &= ~negative
+        is_digit = inside & (column >= 48) & (column <= 57)
+        is_dot = inside & (column == 46)
+        fast &= ~inside | is_digit | is_dot
+        int_digits += is_digit & (dots == 0)
+        frac_digits += is_digit & (dots > 0)
+        dots += is_dot
+        cents = np.where(is_digit, cents * 10 + (column.astype(np.int64) - 48), cents)
+    # Con más de 17 cifras el int64 podría desbordarse: al validador de fila.
+    fast &= (int_digits >= 1) & (int_digits + frac_digits <= 17) & (dots <= 1)
+    fast &= (dots == 0) | ((frac_digits >= 1) & (frac_digits <= 2))
+    cents *= 10 ** (2 - np.clip(frac_digits, 0, 2))
+    cents = np.where(negative, -cents, cents)
+    fast &= np.abs(cents) < max_cents
+    return cents, fast
+
+
+def _code_column(values: np.ndarray, parse, failed: Dict[int, str]) -> Tuple[np.ndarray, List[str]]:
+    """
+    Índices sobre los valores distintos ya validados con ``parse``; las filas
+    con un valor no válido se anotan en ``failed``.
+    """
+    fixed = values.astype(bytes)
+    distinct = set(values.tolist())
+    if len(distinct) > 64:
+        uniques, raw_codes = np.unique(fixed, return_inverse=True)
+    else:
+        # Pocas categorías o monedas: una comparación por valor es más
+        # rápida que ordenar la columna.
+        uniques = list(distinct)
+        raw_codes = np.zeros(len(values), dtype=np.intp)
+        for code, value in enumerate(uniques[1:], 1):
+            raw_codes[fixed == value] = code
+
+    names: Dict[str, int] = {}
+    remap = np.zeros(len(uniques), dtype=np.int32)
+    rejected = {}
+    for code, value in enumerate(uniques):
+        try:
+            remap[code] = names.setdefault(parse(bytes(value).decode()), len(names))
+        except ValueError as e:
+            rejected[code] = str(e)
+    if rejected:
+        for k in np.flatnonzero(np.isin(raw_codes, list(rejected))).tolist():
+            failed.setdefault(k, rejected[int(raw_codes[k])])
+    return remap[raw_codes], list(names)
+
+
+def _error_messages(errors: Iterable[Tuple[int, str]]) -> List[str]:
+    errors = sorted(errors)
+    messages = [f"Row {row}: {message}" for row, message in errors[:MAX_REPORTED_ERRORS]]
+    if len(errors) > MAX_REPORTED_ERRORS:
+        messages.append(f"... and {len(errors) - MAX_REPORTED_ERRORS} more errors")
+    return messages
+
+
+def _check_width(layout: _Layout, width: int) -> None:
+    if not layout.min_columns <= width <= layout.max_columns:
+        if layout.min_columns == layout.max_columns:
+            expected = str(layout.min_columns)
+        elif layout.max_columns == layout.min_columns + 1:
+            expected = f"{layout.min_columns} or {layout.max_columns}"
+        else:
+            expected = f"{layout.min_columns} to {layout.max_columns}"
+        raise ValueError(f"Expected {expected} columns, found {width}")
+
+
+def _parse_cents(value: str, max_cents: int) -> int:
+    try:
+        amount = Decimal(value.strip())
+    except InvalidOperation:
+        raise ValueError(f"Invalid number: {value}")
+    if not amount.is_finite():
+        raise ValueError(f"Invalid number: {value}")
+    # Redondeo a céntimos como el de la columna NUMERIC en Postgres.
+    cents = int(amount.scaleb(2).to_integral_value(ROUND_HALF_UP))
+    if abs(cents) >= max_cents:
+        raise ValueError(f"Number out of range: {value}")
+    return cents
+
+
+def _parse_date(value: str) -> pydate:
+    # fromisoformat es mucho más rápido que strptime; también admitiría
+    # AAAAMMDD, de ahí la comprobación del formato.
+    value = value.strip()
+    if len(value) != 10 or value[4] != "-" or value[7] != "-":
+        raise ValueError(f"Invalid date: {value}")
+    try:
+        return pydate.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"Invalid date: {value}")
+
+
+def _parse_category(value: str, allowed: frozenset) -> str:
+    category = value.strip()
+    if category not in allowed:
+        raise ValueError(f"Invalid category: {category}")
+    return category
+
+
+def _parse_currency(value: str) -> str:
+    # Columna de moneda opcional al final de la fila (EUR si no viene).
+    value = value.strip()
+    return value.upper() if value else fx.BASE_CURRENCY
+
+
+def _parse_notes(value: str) -> Optional[str]:
+    notes = value.strip()
+    if len(notes) > NOTES_MAX_LENGTH:
+        raise ValueError(f"Notes too long: {len(notes)} characters (max {NOTES_MAX_LENGTH})")
+    return notes or None
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ProcessPoolExecutor:
+    """Pool de procesos para parse_csv, creado en el primer uso."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn y no fork: el proceso del servidor tiene hilos (anomalías,
+            # LISTEN, pool de conexiones) que no deben copiarse a medias.
+            _pool = ProcessPoolExecutor(
+                max_workers=IMPORT_WORKERS, mp_context=multiprocessing.get_context("spawn")
+            )
+        return _pool
+
+
+def shutdown_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+            _pool = None
+
+
+# ─── Escritura ──────────────────────────────────────────────────────────────────
+
+def unsupported_currencies(session: Session, parsed: ParsedFile) -> List[str]:
+    return sorted(code for code in parsed.currency_names if not fx.is_supported(session, code))
+
+
+def engine_for_user(user_id: int):
+    """Engine donde viven los datos del usuario (el primario o su shard)."""
+    if os.getenv("SHARD_DATABASE_URLS"):
+        from app.sharding import get_shard_engines, shard_for_user
+
+        return get_shard_engines()[shard_for_user(user_id)]
+    return get_engine()
+
+
+def write_files(files: List[Tuple[int, ParsedFile]]) -> List[int]:
+    """
+    Escribe los ficheros ``(user_id, parsed)`` ya validados, agrupados por
+    base de datos, en una transacción por cada una. Devuelve las filas
+    escritas de cada fichero, en el mismo orden.
+    """
+    by_engine = defaultdict(list)
+    for index, (user_id, parsed) in enumerate(files):
+        by_engine[engine_for_user(user_id)].append(index)
+
+    written = [0] * len(files)
+    for engine, indexes in by_engine.items():
+        with Session(engine) as session:
+            counts = write_batch(session, [files[index] for index in indexes])
+            session.commit()
+        for index, count in zip(indexes, counts):
+            written[index] = count
+    return written
+
+
+def write_batch(session: Session, files: List[Tuple[int, ParsedFile]]) -> List[int]:
+    """
+    Escribe en ``session`` sin hacer commit, con goal_status recalculado.
+    Devuelve las filas escritas de cada fichero: en movimientos, sin las que
+    ya estaban (ver ``content_hashes``).
+    """
+    by_type: Dict[str, Dict[int, list]] = defaultdict(lambda: defaultdict(list))
+    ledgers: Dict[str, list] = defaultdict(list)
+    # Fichero al que se atribuye cada huella: si dos ficheros del lote se
+    # solapan, la fila se envía (y se cuenta) una sola vez.
+    owners: Dict[str, int] = {}
+    written = [len(parsed.days) for _, parsed in files]
+    for index, (user_id, parsed) in enumerate(files):
+        records = parsed.records()
+        if parsed.data_type not in LEDGER_TYPES:
+            by_type[parsed.data_type][user_id].extend(records)
+            continue
+        written[index] = 0
+        for row, content_hash in zip(records, content_hashes(user_id, records)):
+            if owners.setdefault(content_hash, index) == index:
+                ledgers[parsed.data_type].append((user_id, *row, content_hash))
+
+    conn = session.connection()
+    since: Optional[pydate] = None
+    for data_type, rows in ledgers.items():
+        earliest = min(row[1] for row in rows)
+        since = earliest if since is None else min(since, earliest)
+        for content_hash in _insert_ledger(session, conn, LEDGER_TYPES[data_type], rows):
+            written[owners[content_hash]] += 1
+    for data_type, by_user in by_type.items():
+        if not any(by_user.values()):
+            continue
+        earliest = min(row[0] for rows in by_user.values() for row in rows)
+        since = earliest if since is None else min(since, earliest)
+        if data_type == "income":
+            _upsert_income(session, conn, by_user)
+        else:
+            _upsert_goals(session, conn, GOAL_TYPES[data_type], by_user)
+
+    # Un fichero que sólo traía filas ya importadas no cambia goal_status.
+    user_ids = sorted({user_id for (user_id, _), count in zip(files, written) if count})
+    if user_ids:
+        reconcile_users(session, user_ids, since=since)
+        year_reports.mark_stale(session, (
+            (user_id, month)
+            for (user_id, parsed), count in zip(files, written) if count
+            for month in np.unique(parsed.days.astype("datetime64[M]")).astype("datetime64[D]").tolist()
+        ))
+    return written
+
+
+def content_hashes(user_id: int, records: list) -> List[str]:
+    """
+    Huella (BLAKE2b de 128 bits, en hexadecimal) de cada fila de movimientos
+    de un fichero: usuario, fecha, importe, moneda, categoría y notas
+    normalizadas (NFKC, sin mayúsculas ni espacios de más). Con el índice
+    único (user_id, content_hash, date), reimportar el mismo extracto, o uno
+    que se solapa con otro ya importado, no vuelve a insertar esas filas.
+
+    Dos filas iguales en un mismo fichero son dos movimientos (dos cafés el
+    mismo día): cada repetición lleva su número de orden en la huella, así
+    que sólo chocan con las de otro fichero que también las repita.
+    """
+    seen: Dict[str, int] = defaultdict(int)
+    hashes = []
+    for day, amount, category, currency, notes in records:
+        key = f"{user_id}|{day.isoformat()}|{amount}|{currency}|{category}|{_normalize_notes(notes)}"
+        hashes.append(hashlib.blake2b(f"{key}|{seen[key]}".encode(), digest_size=16).hexdigest())
+        seen[key] += 1
+    return hashes
+
+
+def _normalize_notes(notes: Optional[str]) -> str:
+    if not notes:
+        return ""
+    return " ".join(unicodedata.normalize("NFKC", notes).casefold().split())
+
+
+def _insert_ledger(session: Session, conn, Model, rows: list) -> List[str]:
+    """
+    INSERT en bloque de las filas ``(user_id, date, amount, category,
+    currency, notes, content_hash)``; las que chocan con una huella existente
+    se descartan en la propia base de datos (ON CONFLICT DO NOTHING), sin una
+    consulta previa por fila. Devuelve las huellas insertadas.
+    """
+    table = Model.__table__
+    values = [
+        {
+            "user_id": user_id, "date": day, "amount": amount, "category": category,
+            "currency": currency, "notes": notes, "content_hash": content_hash,
+        }
+        for user_id, day, amount, category, currency, notes, content_hash in rows
+    ]
+    dialect = postgresql if conn.dialect.name == "postgresql" else sqlite
+    statement = dialect.insert(table).on_conflict_do_nothing()
+    inserted = conn.execute(statement.returning(table.c.user_id, table.c.id, table.c.content_hash), values).all()
+    signals.record_bulk_rows(session, Model, [(user_id, row_id) for user_id, row_id, _ in inserted])
+    by_hash = {row["content_hash"]: row for row in values}
+    changes.record_many(session, Model, "insert", (
+        (user_id, row_id, by_hash[content_hash]) for user_id, row_id, content_hash in inserted
+    ))
+    return [content_hash for _, _, content_hash in inserted]
+
+
+def _latest_by_month(rows: list) -> Dict[pydate, tuple]:
+    # Como las escrituras fila a fila: si un mes se repite, gana la última.
+    latest = {}
+    for row in rows:
+        latest[signals.month_start(row[0])] = row
+    return latest
+
+
+def _existing_months(conn, table, user_column, by_month: Dict[int, dict], key_columns) -> Dict[tuple, tuple]:
+    """Primera fila existente de cada (usuario, mes) pedido, en una consulta."""
+    months = [month for latest in by_month.values() for month in latest]
+    first, last = min(months), max(months)
+    end = _next_month(last)
+    existing = conn.execute(
+        select(user_column, table.c.date, *key_columns)
+        .where(user_column.in_(list(by_month)), table.c.date >= first, table.c.date < end)
+        .order_by(*key_columns)
+    ).all()
+    found = {}
+    for user_id, day, *key in existing:
+        month = signals.month_start(day)
+        if month in by_month[user_id]:
+            found.setdefault((user_id, month), tuple(key))
+    return found
+
+
+def _upsert_income(session: Session, conn, by_user: Dict[int, list]) -> None:
+    table = Income.__table__
+    by_month = {user_id: _latest_by_month(rows) for user_id, rows in by_user.items() if rows}
+    existing = _existing_months(conn, table, table.c.user_id, by_month, [table.c.id])
+
+    updates, inserts = [], []
+    for user_id, latest in by_month.items():
+        for month, (day, amount, currency) in latest.items():
+            key = existing.get((user_id, month))
+            if key is None:
+                inserts.append({"user_id": user_id, "date": day, "amount": amount, "currency": currency})
+            else:
+                updates.append({"b_id": key[0], "user_id": user_id, "b_date": day, "b_amount": amount, "b_currency": currency})
+
+    touched = [(row["user_id"], row["b_id"]) for row in updates]
+    if updates:
+        conn.execute(
+            update(table)
+            .where(table.c.id == bindparam("b_id"))
+            .values(date=bindparam("b_date"), amount=bindparam("b_amount"), currency=bindparam("b_currency")),
+            updates,
+        )
+        changes.record_many(session, Income, "update", (
+            (row["user_id"], row["b_id"], {"date": row["b_date"], "amount": row["b_amount"], "currency": row["b_currency"]})
+            for row in updates
+        ))
+    if inserts:
+        inserted = conn.execute(
+            table.insert().returning(table.c.user_id, table.c.id, sort_by_parameter_order=True), inserts
+        ).all()
+        changes.record_many(session, Income, "insert", (
+            (user_id, row_id, row) for (user_id, row_id), row in zip(inserted, inserts)
+        ))
+        touched += inserted
+    signals.record_bulk_rows(session, Income, touched)
+
+
+def _upsert_goals(session: Session, conn, Model, by_user: Dict[int, list]) -> None:
+    table = Model.__table__
+    by_month = {user_id: _latest_by_month(rows) for user_id, rows in by_user.items() if rows}
+    # La clave primaria es (date, userid): la meta existente conserva su fecha.
+    existing = _existing_months(conn, table, table.c.userid, by_month, [table.c.date])
+
+    updates, inserts = [], []
+    for user_id, latest in by_month.items():
+        for month, (day, value) in latest.items():
+            key = existing.get((user_id, month))
+            if key is None:
+                inserts.append({"userid": user_id, "date": day, "value": value})
+            else:
+                updates.append({"b_user": user_id, "b_date": key[0], "b_value": value})
+
+    if updates:
+        conn.execute(
+            update(table)
+            .where(table.c.userid == bindparam("b_user"), table.c.date == bindparam("b_date"))
+            .values(value=bindparam("b_value")),
+            updates,
+        )
+        changes.record_many(session, Model, "update", (
+            (row["b_user"], None, {"date": row["b_date"], "value": row["b_value"]}) for row in updates
+        ))
+    if inserts:
+        conn.execute(table.insert(), inserts)
+        changes.record_many(session, Model, "insert", ((row["userid"], None, row) for row in inserts))
+    # Las metas no tienen id: basta con avisar de que el usuario cambió.
+    signals.record_bulk_users(session, by_month)
+
+
+# ─── Simulación (dry run) ───────────────────────────────────────────────────────
+
+STAGING_TABLE = "import_staging"
+
+
+def _staging_table(conn, *columns: Column) -> Table:
+    staging = Table(STAGING_TABLE, MetaData(), *columns, prefixes=["TEMPORARY"])
+    staging.create(conn)
+    return staging
+
+
+def diff_file(user_id: int, parsed: ParsedFile) -> Dict[str, int]:
+    """
+    Qué cambiaría ``write_files`` con este fichero, sin escribir nada: carga
+    las filas en una tabla temporal y las compara con las existentes con un
+    JOIN (una consulta por fichero, no una por fila). Todo ocurre en una
+    transacción que se deshace.
+
+    - Movimientos: ``new_rows`` y ``duplicate_rows`` (filas con la misma
+      huella que una ya importada, que la escritura omitiría).
+    - Ingresos y metas: ``new_months`` y ``overwritten_months``, de los que
+      ``unchanged_months`` ya tienen los mismos valores.
+    """
+    records = parsed.records()
+    if not records:
+        keys = ("new_rows", "duplicate_rows") if parsed.data_type in LEDGER_TYPES else (
+            "new_months", "overwritten_months", "unchanged_months"
+        )
+        return {"rows": 0, **dict.fromkeys(keys, 0)}
+    counts = {"rows": len(records)}
+    with engine_for_user(user_id).connect() as conn:
+        try:
+            if parsed.data_type in LEDGER_TYPES:
+                counts.update(_diff_ledger(conn, LEDGER_TYPES[parsed.data_type], user_id, records))
+            else:
+                counts.update(_diff_months(conn, parsed.data_type, user_id, records))
+        finally:
+            # En Postgres el rollback ya se lleva la tabla temporal; pysqlite
+            # ejecuta el CREATE fuera de la transacción y hay que borrarla.
+            conn.rollback()
+            Table(STAGING_TABLE, MetaData(), prefixes=["TEMPORARY"]).drop(conn, checkfirst=True)
+            conn.commit()
+    return counts
+
+
+def _diff_ledger(conn, Model, user_id: int, records: list) -> Dict[str, int]:
+    table = Model.__table__
+    staging = _staging_table(conn, Column("content_hash", String(32)))
+    conn.execute(staging.insert(), [
+        {"content_hash": content_hash} for content_hash in content_hashes(user_id, records)
+    ])
+    # El índice único (user_id, content_hash, date) resuelve cada EXISTS.
+    existing = exists().where(table.c.user_id == user_id, table.c.content_hash == staging.c.content_hash)
+    duplicates = conn.execute(select(func.count()).select_from(staging).where(existing)).scalar_one()
+    return {"new_rows": len(records) - duplicates, "duplicate_rows": duplicates}
+
+
+def _diff_months(conn, data_type: str, user_id: int, records: list) -> Dict[str, int]:
+    if data_type == "income":
+        table = Income.__table__
+        user_column, key, compared = table.c.user_id, table.c.id, ("date", "amount", "currency")
+    else:
+        table = GOAL_TYPES[data_type].__table__
+        # La meta existente conserva su fecha: sólo se sustituye el valor.
+        user_column, key, compared = table.c.userid, table.c.date, ("value",)
+
+    latest = _latest_by_month(records)
+    staging = _staging_table(
+        conn,
+        Column("month", Date),
+        Column("next_month", Date),
+        Column("date", Date),
+        Column("amount", Numeric(14, 2)),
+        Column("currency", String(3)),
+    )
+    conn.execute(staging.insert(), [
+        {
+            "month": month,
+            "next_month": _next_month(month),
+            "date": row[0],
+            "amount": row[1],
+            "currency": row[2] if len(row) > 2 else None,
+        }
+        for month, row in latest.items()
+    ])
+    # Como en la escritura, de cada mes cuenta la primera fila existente.
+    matches = conn.execute(
+        select(staging.c.month, staging.c.date, staging.c.amount, staging.c.currency, *(table.c[name] for name in compared))
+        .join(table, (user_column == user_id) & (table.c.date >= staging.c.month) & (table.c.date < staging.c.next_month))
+        .order_by(staging.c.month, key)
+    ).all()
+    first = {}
+    for row in matches:
+        first.setdefault(row[0], row)
+
+    unchanged = 0
+    for month, date, amount, currency, *current in first.values():
+        imported = (date, amount, currency) if data_type == "income" else (amount,)
+        unchanged += tuple(current) == imported
+    return {
+        "new_months": len(latest) - len(first),
+        "overwritten_months": len(first),
+        "unchanged_months": unchanged,
+    }
+
+
+def _next_month(month: pydate) -> pydate:
+    return pydate(month.year + month.month // 12, month.month % 12 + 1, 1)
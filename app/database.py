@@ -1,12 +1,171 @@
 # database.py
 import os
+import random
+import threading
+import time
+from functools import lru_cache
+from typing import Optional
+
 from dotenv import load_dotenv
-from sqlmodel import create_engine, Session, SQLModel
+from fastapi import Request
+from sqlalchemy import event
+from sqlmodel import create_engine, Session, SQLModel, select
+
+from app import anomalies, changes, goal_status, live, signals, year_reports  # noqa: F401  registran sus listeners de escritura
+from app.models import User
+
+load_dotenv()
+
+# Réplicas de sólo lectura, separadas por comas. Si no hay ninguna, las
+# lecturas van también al primario.
+REPLICA_DATABASE_URLS = [
+    url.strip() for url in os.getenv("REPLICA_DATABASE_URLS", "").split(",") if url.strip()
+]
+# Tras escribir, las lecturas de ese usuario van al primario durante esta
+# ventana para que vea sus propios cambios aunque la réplica vaya retrasada.
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
+
+
+# PRAGMAs de cada conexión SQLite (modo embebido, un solo nodo):
+# - busy_timeout: con dos escritores a la vez, el segundo espera en vez de
+#   fallar con "database is locked". El primero, para que también espere el
+#   cambio a WAL de una conexión nueva.
+# - WAL: las lecturas no esperan a la escritura en curso ni la bloquean.
+# - synchronous=NORMAL: en WAL basta para no corromper la base; un corte de
+#   luz puede perder las últimas transacciones confirmadas, no dejarlas a medias.
+# - 64 MB de caché de páginas por conexión, 256 MB de mmap y temporales en memoria.
+SQLITE_PRAGMAS = (
+    ("busy_timeout", "5000"),
+    ("journal_mode", "WAL"),
+    ("synchronous", "NORMAL"),
+    ("cache_size", "-65536"),
+    ("mmap_size", str(256 * 1024 * 1024)),
+    ("temp_store", "MEMORY"),
+)
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS:
+        cursor.execute(f"PRAGMA {name} = {value}")
+    cursor.close()
+
+
+def make_engine(url: str):
+    """Engine para ``url``; en SQLite, con SQLITE_PRAGMAS en cada conexión."""
+    engine = create_engine(url, echo=False)
+    if engine.dialect.name == "sqlite":
+        event.listen(engine, "connect", _set_sqlite_pragmas)
+    return engine
+
+
+@lru_cache(maxsize=None)
+def get_engine():
+    # El engine (y con él el driver de la base de datos) se crea en la primera
+    # sesión y no al importar el módulo, para no penalizar el arranque.
+    return make_engine(os.getenv("DATABASE_URL"))
+
+
+@lru_cache(maxsize=None)
+def get_replica_engines():
+    return tuple(make_engine(url) for url in REPLICA_DATABASE_URLS)
+
+
+def new_session() -> Session:
+    """Sesión sobre el primario, o sobre los shards si SHARD_DATABASE_URLS está definido."""
+    if os.getenv("SHARD_DATABASE_URLS"):
+        from app.sharding import ShardedSQLModelSession
 
-load_dotenv()  
+        return ShardedSQLModelSession()
+    return Session(get_engine())
 
-engine = create_engine(os.getenv("DATABASE_URL"), echo=False)
 
 def get_session():
-    with Session(engine) as session:
+    with new_session() as session:
+        yield session
+
+
+# ─── Read-your-writes ─────────────────────────────────────────────────────────
+# Registro en memoria del proceso: {user_id: instante de la última escritura}.
+# Con varios workers cada uno sólo conoce sus propias escrituras, por lo que
+# conviene que el balanceador mantenga afinidad por cliente.
+
+_recent_writes = {}
+_email_ids = {}
+_EMAIL_CACHE_SIZE = 10_000
+_lock = threading.Lock()
+
+
+@signals.on_commit
+def _mark_recent_writes(user_ids):
+    if not REPLICA_DATABASE_URLS:
+        return
+    now = time.monotonic()
+    with _lock:
+        if len(_recent_writes) > 1000:
+            for user_id, written_at in list(_recent_writes.items()):
+                if now - written_at >= READ_YOUR_WRITES_SECONDS:
+                    del _recent_writes[user_id]
+        for user_id in user_ids:
+            _recent_writes[user_id] = now
+
+
+def _wrote_recently(user_id: int) -> bool:
+    written_at = _recent_writes.get(user_id)
+    if written_at is None:
+        return False
+    if time.monotonic() - written_at < READ_YOUR_WRITES_SECONDS:
+        return True
+    with _lock:
+        _recent_writes.pop(user_id, None)
+    return False
+
+
+def user_id_for_email(email: str) -> Optional[int]:
+    """Id del usuario con ``email`` (cacheado en el proceso), o None."""
+    user_id = _email_ids.get(email)
+    if user_id is None:
+        with Session(get_engine()) as session:
+            user_id = session.exec(select(User.id).where(User.email == email)).first()
+        if user_id is not None:
+            with _lock:
+                if len(_email_ids) >= _EMAIL_CACHE_SIZE:
+                    _email_ids.clear()
+                _email_ids[email] = user_id
+    return user_id
+
+
+def _requesting_user_id(request: Request) -> Optional[int]:
+    user_id = request.path_params.get("user_id")
+    if user_id is not None:
+        try:
+            return int(user_id)
+        except ValueError:
+            return None
+    email = request.query_params.get("email")
+    if email:
+        return user_id_for_email(email)
+    return None
+
+
+def get_read_engine(request: Request):
+    replicas = get_replica_engines()
+    if not replicas:
+        return get_engine()
+    # Sólo hace falta identificar al usuario si alguien escribió hace poco.
+    if _recent_writes:
+        user_id = _requesting_user_id(request)
+        if user_id is not None and _wrote_recently(user_id):
+            return get_engine()
+    return random.choice(replicas)
+
+
+def get_read_session(request: Request):
+    """Sesión para endpoints de sólo lectura: réplica salvo escritura reciente."""
+    if os.getenv("SHARD_DATABASE_URLS"):
+        # Con sharding no hay réplicas: cada shard atiende sus lecturas.
+        with new_session() as session:
+            yield session
+        return
+    with Session(get_read_engine(request)) as session:
         yield session
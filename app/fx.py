@@ -0,0 +1,155 @@
+# app/fx.py
+"""
+Conversión de importes entre monedas con los tipos diarios de ``fx_rates``.
+
+Los tipos se guardan en memoria, por moneda, como dos arrays de NumPy (fechas
+y tipos) y se recargan cada FX_CACHE_SECONDS. Las agregaciones suman en SQL
+agrupando además por moneda y día, así que la base de datos devuelve como
+mucho una fila por día y moneda. ``converted_totals`` convierte esas sumas
+de golpe: nunca convierte fila a fila con Decimal. Si ese día no hay tipo
+publicado (fines de semana o festivos), se usa el último anterior.
+
+Cuando todas las sumas ya están en la moneda pedida (el caso habitual) no
+se consultan los tipos.
+"""
+
+import os
+import threading
+import time
+from typing import Dict, Iterable, Optional, Sequence
+
+import numpy as np
+from sqlalchemy import func
+from sqlmodel import Session, select
+
+from app.models import FxRate
+
+# fx_rates guarda unidades de cada moneda por 1 EUR (como los publica el BCE).
+BASE_CURRENCY = "EUR"
+FX_CACHE_SECONDS = int(os.getenv("FX_CACHE_SECONDS", "3600"))
+
+
+class UnknownCurrency(ValueError):
+    pass
+
+
+class RateTable:
+    def __init__(self, rows: Iterable):
+        """``rows``: (currency, date, rate) ordenadas por moneda y fecha."""
+        self.dates: Dict[str, np.ndarray] = {}
+        self.rates: Dict[str, np.ndarray] = {}
+        rows = list(rows)
+        if not rows:
+            return
+        currencies = np.array([row[0] for row in rows])
+        dates = np.array([row[1] for row in rows], dtype="datetime64[D]")
+        rates = np.array([row[2] for row in rows], dtype=np.float64)
+        codes, starts = np.unique(currencies, return_index=True)
+        bounds = list(starts[1:]) + [len(rows)]
+        for code, start, end in zip(codes, starts, bounds):
+            self.dates[str(code)] = dates[start:end]
+            self.rates[str(code)] = rates[start:end]
+
+    def supports(self, currency: str) -> bool:
+        return currency == BASE_CURRENCY or currency in self.rates
+
+    def rates_on(self, currency: str, days: np.ndarray) -> np.ndarray:
+        """Tipo vigente (unidades por 1 EUR) de ``currency`` en cada día de ``days``."""
+        if currency == BASE_CURRENCY:
+            return np.ones(len(days))
+        if currency not in self.rates:
+            raise UnknownCurrency(currency)
+        # Antes del primer tipo cargado se usa el primero.
+        index = np.searchsorted(self.dates[currency], days, side="right") - 1
+        return self.rates[currency][np.maximum(index, 0)]
+
+    def convert(self, amounts: np.ndarray, currencies: np.ndarray, days: np.ndarray, target: str) -> np.ndarray:
+        converted = amounts.astype(np.float64, copy=True)
+        target_rates = None
+        for code in np.unique(currencies):
+            if code == target:
+                continue
+            if target_rates is None:
+                target_rates = self.rates_on(target, days)
+            mask = currencies == code
+            converted[mask] = amounts[mask] / self.rates_on(str(code), days[mask]) * target_rates[mask]
+        return converted
+
+
+_table: Optional[RateTable] = None
+_loaded_at = 0.0
+_lock = threading.Lock()
+
+
+def rate_table(session: Optional[Session] = None) -> RateTable:
+    """
+    Tipos en memoria. Se cargan siempre del primario (directorio): ``fx_rates``
+    no está en los shards y ``session`` (que se ignora; se mantiene por
+    compatibilidad) puede ser de uno. La
+    consulta va fuera del lock y una tabla vacía no se guarda, para no dejar
+    el proceso sin tipos durante FX_CACHE_SECONDS.
+    """
+    global _table, _loaded_at
+    with _lock:
+        if _table is not None and time.monotonic() - _loaded_at <= FX_CACHE_SECONDS:
+            return _table
+    from app.database import get_engine
+
+    with Session(get_engine()) as primary:
+        table = RateTable(primary.exec(
+            select(FxRate.currency, FxRate.date, FxRate.rate).order_by(FxRate.currency, FxRate.date)
+        ).all())
+    if table.rates:
+        with _lock:
+            _table, _loaded_at = table, time.monotonic()
+    return table
+
+
+def clear_cache() -> None:
+    global _table
+    with _lock:
+        _table = None
+
+
+def is_supported(session: Session, currency: str) -> bool:
+    return currency == BASE_CURRENCY or rate_table(session).supports(currency)
+
+
+def converted_totals(
+    session: Session,
+    Model,
+    where: Sequence,
+    keys: Sequence = (),
+    target: str = BASE_CURRENCY,
+) -> Dict[tuple, float]:
+    """
+    Suma de ``Model.amount`` en ``target`` por cada combinación de ``keys``
+    (expresiones SQL; sin claves, {(): total}). La suma se hace en SQL por
+    clave, moneda y día; la conversión, con NumPy sobre esas sumas.
+    """
+    statement = (
+        select(*keys, Model.currency, Model.date, func.sum(Model.amount))
+        .where(*where)
+        .group_by(*keys, Model.currency, Model.date)
+    )
+    rows = session.exec(statement).all()
+    if not rows:
+        return {(): 0.0} if not keys else {}
+    return sum_converted(session, rows, len(keys), target)
+
+
+def sum_converted(session: Session, rows: Sequence, width: int, target: str = BASE_CURRENCY) -> Dict[tuple, float]:
+    """
+    Como ``converted_totals`` a partir de filas ya sumadas por día, (claves...,
+    moneda, día, importe), agrupadas por sus ``width`` primeras columnas.
+    """
+    amounts = np.array([row[width + 2] for row in rows], dtype=np.float64)
+    currencies = np.array([row[width] for row in rows])
+    if (currencies != target).any():
+        days = np.array([row[width + 1] for row in rows], dtype="datetime64[D]")
+        amounts = rate_table(session).convert(amounts, currencies, days, target)
+
+    groups: Dict[tuple, int] = {}
+    positions = np.array([groups.setdefault(tuple(row[:width]), len(groups)) for row in rows])
+    sums = np.round(np.bincount(positions, weights=amounts, minlength=len(groups)), 2)
+    return {key: float(sums[position]) for key, position in groups.items()}
@@ -0,0 +1,95 @@
+# app/goal_status.py
+"""
+Evaluación precalculada de metas.
+
+Las metas guardan un porcentaje del ingreso del mes. En vez de convertirlo en
+dinero en cada lectura, ``goal_status`` guarda por usuario, mes y tipo de meta
+el valor objetivo, el valor real y si se cumplió, en EUR (fx.BASE_CURRENCY). Se recalcula dentro de la
+misma transacción que cualquier escritura de ingresos, movimientos o metas
+(incluidos ``upsert_goal`` y la importación CSV) a través de app/signals.py;
+``python -m app.jobs.reconcile_goals`` corrige cualquier desviación cada noche.
+"""
+
+from datetime import date as pydate
+from decimal import Decimal
+from typing import Dict, Optional
+
+from dateutil.relativedelta import relativedelta
+from sqlalchemy import desc
+from sqlmodel import Session, select
+
+from app import fx, signals
+from app.models import (
+    Income,
+    Expense,
+    Saving,
+    Investment,
+    ExpenseGoal,
+    SavingGoal,
+    InvestmentGoal,
+    GoalStatus,
+)
+
+# goal_type -> (modelo de meta, modelo de movimientos)
+GOAL_TYPES = {
+    "expense": (ExpenseGoal, Expense),
+    "saving": (SavingGoal, Saving),
+    "investment": (InvestmentGoal, Investment),
+}
+
+CENT = Decimal("0.01")
+
+
+def compute_status(goal_percentage: Decimal, income: Decimal, actual: Decimal) -> Dict:
+    goal_value = (Decimal(income) * Decimal(goal_percentage) / 100).quantize(CENT)
+    actual_value = Decimal(actual).quantize(CENT)
+    return {
+        "goal_percentage": Decimal(goal_percentage),
+        "goal_value": goal_value,
+        "actual_value": actual_value,
+        "met": actual_value >= goal_value,
+    }
+
+
+def _month_total(session: Session, Model, user_id: int, start: pydate, end: pydate) -> Decimal:
+    total = fx.converted_totals(session, Model, (Model.user_id == user_id, Model.date >= start, Model.date < end))
+    return Decimal(str(total[()]))
+
+
+def _month_goal(session: Session, GoalModel, user_id: int, start: pydate, end: pydate) -> Optional[Decimal]:
+    return session.exec(
+        select(GoalModel.value)
+        .where(GoalModel.user_id == user_id, GoalModel.date >= start, GoalModel.date < end)
+        .order_by(desc(GoalModel.date))
+    ).first()
+
+
+def evaluate_month(session: Session, user_id: int, month: pydate) -> None:
+    """Recalcula (o elimina) las filas de goal_status de un usuario y mes."""
+    start = signals.month_start(month)
+    end = start + relativedelta(months=1)
+    income = None
+
+    for goal_type, (GoalModel, ActualModel) in GOAL_TYPES.items():
+        stored = session.get(GoalStatus, (user_id, start, goal_type))
+        percentage = _month_goal(session, GoalModel, user_id, start, end)
+        if percentage is None:
+            if stored is not None:
+                session.delete(stored)
+            continue
+
+        if income is None:
+            income = _month_total(session, Income, user_id, start, end)
+        values = compute_status(percentage, income, _month_total(session, ActualModel, user_id, start, end))
+        if stored is None:
+            stored = GoalStatus(user_id=user_id, month=start, goal_type=goal_type, **values)
+        else:
+            for key, value in values.items():
+                setattr(stored, key, value)
+        session.add(stored)
+
+
+@signals.on_before_commit
+def _refresh_touched_months(session, months):
+    for user_id, month in sorted(months):
+        evaluate_month(session, user_id, month)
@@ -0,0 +1,289 @@
+# app/idempotency.py
+"""
+Middleware ASGI para la cabecera ``Idempotency-Key`` en peticiones de escritura.
+
+Los clientes móviles reintentan POST /expense/, /saving/, /investment/,
+/income/ o /import/csv cuando la red falla. Con la misma Idempotency-Key:
+
+- La primera petición se ejecuta y su respuesta (estado, cabeceras y cuerpo
+  comprimido con zlib) se guarda en ``idempotency_keys`` durante
+  IDEMPOTENCY_TTL_SECONDS.
+- Un reintento con la misma petición recibe la respuesta guardada (con la
+  cabecera ``Idempotent-Replayed: true``) sin llegar al router, así que no
+  toca las tablas de movimientos.
+- Los duplicados concurrentes en el mismo proceso esperan a que termine el
+  primero (candado por clave) y reciben su respuesta. Si el primero está en
+  curso en otro proceso, reciben 409 con ``Retry-After``.
+- Reutilizar la clave con otra petición (otro método, ruta o cuerpo) da 422.
+- Una clave en curso desde hace más de IDEMPOTENCY_PENDING_TIMEOUT_SECONDS
+  se da por abandonada. Si la primera petición termina después, no guarda
+  ni borra nada: la clave ya es del reintento que la reclamó.
+- Las respuestas 5xx (y las de más de 1 MB) no se guardan: el reintento
+  vuelve a ejecutarse.
+
+La huella del cuerpo ignora el boundary de multipart, que cada reintento de
+un formulario genera de nuevo. SQLAlchemy y la base de datos se importan en la
+primera petición con la cabecera, para no penalizar el arranque en frío.
+"""
+
+import hashlib
+import os
+import time
+import zlib
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+
+import anyio
+from starlette.responses import JSONResponse
+
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", str(24 * 3600)))
+# Una clave "en curso" más antigua que esto se da por abandonada (el proceso
+# que la reclamó cayó) y la puede reclamar otra petición. Tiene que quedar muy
+# por encima de la escritura más lenta (/import/csv, /import/bulk): si no, un
+# reintento la ejecutaría dos veces.
+PENDING_TIMEOUT_SECONDS = int(os.getenv("IDEMPOTENCY_PENDING_TIMEOUT_SECONDS", "900"))
+PURGE_INTERVAL_SECONDS = 300
+MAX_KEY_LENGTH = 255
+MAX_STORED_BODY = 1024 * 1024
+METHODS = ("POST", "PUT", "PATCH", "DELETE")
+HEADER = b"idempotency-key"
+
+
+def _aware(value: datetime) -> datetime:
+    # SQLite devuelve las fechas sin zona horaria.
+    return value if value.tzinfo is not None else value.replace(tzinfo=timezone.utc)
+
+
+def request_fingerprint(method: str, path: str, query: bytes, content_type: str, body: bytes) -> str:
+    if content_type.startswith("multipart/form-data") and "boundary=" in content_type:
+        boundary = content_type.split("boundary=", 1)[1].split(";")[0].strip().strip('"')
+        body = body.replace(boundary.encode("latin-1"), b"")
+    digest = hashlib.sha256()
+    for part in (method.encode(), path.encode(), query, body):
+        digest.update(len(part).to_bytes(8, "big"))
+        digest.update(part)
+    return digest.hexdigest()
+
+
+# ─── Almacén (síncrono; se llama desde el threadpool) ──────────────────────────
+
+_last_purge = 0.0
+
+
+def _purge_expired(conn, now: datetime) -> None:
+    global _last_purge
+    from app.models import IdempotencyKey
+
+    if time.monotonic() - _last_purge < PURGE_INTERVAL_SECONDS:
+        return
+    _last_purge = time.monotonic()
+    table = IdempotencyKey.__table__
+    conn.execute(table.delete().where(table.c.expires_at < now))
+
+
+def claim(key: str, fingerprint: str):
+    """
+    ("claimed", created_at) si esta petición debe ejecutarse, ("replay", fila)
+    si ya hay respuesta guardada, ("in_progress", None) o ("mismatch", None).
+    ``created_at`` identifica la reclamación ante ``store`` y ``release``.
+    """
+    from sqlalchemy import select
+    from sqlalchemy.exc import IntegrityError
+
+    from app.database import get_engine
+    from app.models import IdempotencyKey
+
+    table = IdempotencyKey.__table__
+    now = datetime.now(timezone.utc)
+    try:
+        with get_engine().begin() as conn:
+            _purge_expired(conn, now)
+            row = conn.execute(select(table).where(table.c.key == key)).first()
+            if row is not None:
+                abandoned = (
+                    row.status_code is None
+                    and _aware(row.created_at) < now - timedelta(seconds=PENDING_TIMEOUT_SECONDS)
+                )
+                if _aware(row.expires_at) > now and not abandoned:
+                    if row.request_hash != fingerprint:
+                        return "mismatch", None
+                    if row.status_code is None:
+                        return "in_progress", None
+                    return "replay", row
+                conn.execute(table.delete().where(table.c.key == key))
+            conn.execute(table.insert().values(
+                key=key,
+                request_hash=fingerprint,
+                created_at=now,
+                expires_at=now + timedelta(seconds=IDEMPOTENCY_TTL_SECONDS),
+            ))
+    except IntegrityError:
+        # Otro proceso insertó la misma clave entre la consulta y el INSERT.
+        return "in_progress", None
+    return "claimed", now
+
+
+def _owned(table, key: str, claimed_at: datetime) -> tuple:
+    # Si la reclamación se dio por abandonada y la tomó otra petición, la
+    # fila ya es de esa otra: no se toca.
+    return table.c.key == key, table.c.created_at == claimed_at, table.c.status_code.is_(None)
+
+
+def store(key: str, claimed_at: datetime, status_code: int, headers: list, body: bytes) -> None:
+    from app.database import get_engine
+    from app.models import IdempotencyKey
+
+    table = IdempotencyKey.__table__
+    with get_engine().begin() as conn:
+        conn.execute(table.update().where(*_owned(table, key, claimed_at)).values(
+            status_code=status_code,
+            response_headers=[[name.decode("latin-1"), value.decode("latin-1")] for name, value in headers],
+            response_body=zlib.compress(body),
+        ))
+
+
+def release(key: str, claimed_at: datetime) -> None:
+    from app.database import get_engine
+    from app.models import IdempotencyKey
+
+    table = IdempotencyKey.__table__
+    with get_engine().begin() as conn:
+        conn.execute(table.delete().where(*_owned(table, key, claimed_at)))
+
+
+# ─── Candados por clave dentro del proceso ─────────────────────────────────────
+
+_locks: Dict[str, list] = {}
+
+
+class _KeyLock:
+    """Candado por clave que se elimina cuando nadie lo usa."""
+
+    def __init__(self, key: str):
+        self.key = key
+
+    async def __aenter__(self):
+        entry = _locks.setdefault(self.key, [anyio.Lock(), 0])
+        entry[1] += 1
+        await entry[0].acquire()
+
+    async def __aexit__(self, *exc_info):
+        entry = _locks[self.key]
+        entry[0].release()
+        entry[1] -= 1
+        if entry[1] == 0:
+            del _locks[self.key]
+
+
+# ─── Middleware ────────────────────────────────────────────────────────────────
+
+class IdempotencyMiddleware:
+    def __init__(self, app, methods=METHODS):
+        self.app = app
+        self.methods = tuple(methods)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in self.methods:
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope.get("headers") or [])
+        raw_key = headers.get(HEADER)
+        if raw_key is None:
+            await self.app(scope, receive, send)
+            return
+
+        key = raw_key.decode("latin-1").strip()
+        if not key or len(key) > MAX_KEY_LENGTH:
+            response = JSONResponse(
+                {"detail": f"Idempotency-Key must be 1-{MAX_KEY_LENGTH} characters"}, status_code=400
+            )
+            await response(scope, receive, send)
+            return
+
+        body = await self._read_body(receive)
+        fingerprint = request_fingerprint(
+            scope["method"],
+            scope["path"],
+            scope.get("query_string", b""),
+            headers.get(b"content-type", b"").decode("latin-1"),
+            body,
+        )
+
+        async with _KeyLock(key):
+            outcome, row = await anyio.to_thread.run_sync(claim, key, fingerprint)
+            if outcome == "replay":
+                await self._replay(row, send)
+                return
+            if outcome == "mismatch":
+                response = JSONResponse(
+                    {"detail": "Idempotency-Key was already used with a different request"}, status_code=422
+                )
+                await response(scope, receive, send)
+                return
+            if outcome == "in_progress":
+                response = JSONResponse(
+                    {"detail": "A request with this Idempotency-Key is still in progress"},
+                    status_code=409,
+                    headers={"Retry-After": "1"},
+                )
+                await response(scope, receive, send)
+                return
+            await self._run_and_store(scope, key, row, body, receive, send)
+
+    @staticmethod
+    async def _read_body(receive) -> bytes:
+        chunks = []
+        while True:
+            message = await receive()
+            if message["type"] != "http.request":
+                break
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                break
+        return b"".join(chunks)
+
+    async def _run_and_store(self, scope, key: str, claimed_at: datetime, body: bytes, receive, send):
+        body_sent = False
+
+        async def replay_receive():
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        status_code: Optional[int] = None
+        response_headers = []
+        chunks = []
+        size = 0
+
+        async def capture_send(message):
+            nonlocal status_code, response_headers, size
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                response_headers = list(message.get("headers", []))
+            elif message["type"] == "http.response.body":
+                chunk = message.get("body", b"")
+                size += len(chunk)
+                if size <= MAX_STORED_BODY:
+                    chunks.append(chunk)
+            await send(message)
+
+        try:
+            await self.app(scope, replay_receive, capture_send)
+        except BaseException:
+            with anyio.CancelScope(shield=True):
+                await anyio.to_thread.run_sync(release, key, claimed_at)
+            raise
+
+        if status_code is None or status_code >= 500 or size > MAX_STORED_BODY:
+            await anyio.to_thread.run_sync(release, key, claimed_at)
+        else:
+            await anyio.to_thread.run_sync(store, key, claimed_at, status_code, response_headers, b"".join(chunks))
+
+    @staticmethod
+    async def _replay(row, send):
+        headers = [(name.encode("latin-1"), value.encode("latin-1")) for name, value in row.response_headers]
+        headers.append((b"idempotent-replayed", b"true"))
+        await send({"type": "http.response.start", "status": row.status_code, "headers": headers})
+        await send({"type": "http.response.body", "body": zlib.decompress(row.response_body), "more_body": False})
@@ -0,0 +1,51 @@
+# app/jobs/anomalies.py
+"""
+Reconstrucción de expense_stats y expense_flags (app/anomalies.py).
+
+Las ventanas se mantienen solas con cada escritura; este job sólo hace falta
+para rellenarlas tras la migración 0006 o si un proceso terminó con cambios
+todavía en la cola. Recorre los gastos de cada usuario en orden cronológico,
+igual que si se hubieran ido escribiendo uno a uno.
+
+    python -m app.jobs.anomalies [--batch-size 500] [--user-id ID ...]
+"""
+
+import argparse
+from typing import List, Optional
+
+from sqlalchemy import delete
+from sqlmodel import select
+
+from app.anomalies import apply_changes
+from app.database import new_session
+from app.models import User, Expense, ExpenseStat, ExpenseFlag
+
+
+def rebuild(batch_size: int = 500, user_ids: Optional[List[int]] = None) -> dict:
+    with new_session() as session:
+        if user_ids is None:
+            user_ids = session.exec(select(User.id).order_by(User.id)).all()
+
+    flagged = 0
+    for offset in range(0, len(user_ids), batch_size):
+        batch = user_ids[offset:offset + batch_size]
+        with new_session() as session:
+            session.exec(delete(ExpenseFlag).where(ExpenseFlag.user_id.in_(batch)))
+            session.exec(delete(ExpenseStat).where(ExpenseStat.user_id.in_(batch)))
+            keys = {
+                (user_id, expense_id)
+                for user_id, expense_id in session.exec(
+                    select(Expense.user_id, Expense.id).where(Expense.user_id.in_(batch))
+                ).all()
+            }
+            flagged += apply_changes(session, keys)
+            session.commit()
+    return {"users": len(user_ids), "flagged": flagged}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--user-id", type=int, action="append", dest="user_ids")
+    args = parser.parse_args()
+    print(rebuild(args.batch_size, args.user_ids))
@@ -0,0 +1,133 @@
+# app/jobs/cohorts.py
+"""
+Distribuciones entre usuarios del gasto y el ahorro mensual por categoría.
+
+Para cada mes, tipo (gasto/ahorro) y categoría de ExpenseCategory /
+SavingCategory se calcula un t-digest (app/sketch.py) con el total mensual en
+EUR (app/fx.py) de cada usuario que tuvo movimientos en esa categoría. Los usuarios se reparten
+en rangos de ids entre varios procesos; cada uno devuelve sus digests
+parciales y el proceso principal los mezcla y los guarda en cohort_sketches,
+de donde /benchmarks calcula el percentil de un usuario sin recorrer los
+datos de los demás.
+
+Sólo se guardan las cohortes con al menos COHORT_MIN_USERS usuarios, para que
+ningún percentil describa a un grupo pequeño e identificable.
+
+    python -m app.jobs.cohorts [--months 2] [--workers 4] [--batch-size 5000]
+"""
+
+import argparse
+import os
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date as pydate, datetime, timezone
+from typing import Dict, List, Tuple
+
+from dateutil.relativedelta import relativedelta
+from sqlalchemy import delete, extract, func
+from sqlmodel import Session, select
+
+from app import fx
+from app.database import get_engine, new_session
+from app.models import User, Expense, Saving, CohortSketch
+from app.routers.expense import ExpenseCategory
+from app.routers.saving import SavingCategory
+from app.sketch import TDigest
+
+# kind -> (modelo de movimientos, categorías válidas)
+KINDS = {
+    "expense": (Expense, [category.value for category in ExpenseCategory]),
+    "saving": (Saving, [category.value for category in SavingCategory]),
+}
+
+COHORT_MIN_USERS = int(os.getenv("COHORT_MIN_USERS", "20"))
+
+
+def _init_worker() -> None:
+    # Con fork, el proceso hijo no debe reutilizar las conexiones del padre.
+    get_engine().dispose(close=False)
+    if os.getenv("SHARD_DATABASE_URLS"):
+        from app.sharding import get_shard_engines
+
+        for engine in get_shard_engines().values():
+            engine.dispose(close=False)
+
+
+def sketch_users(task: Tuple[int, int, pydate, pydate]) -> Dict[tuple, TDigest]:
+    """Digests parciales {(mes, kind, categoría): TDigest} de un rango de usuarios."""
+    first_id, last_id, start, end = task
+    values: Dict[tuple, List[float]] = defaultdict(list)
+    with new_session() as session:
+        for kind, (Model, categories) in KINDS.items():
+            totals = fx.converted_totals(
+                session,
+                Model,
+                (
+                    Model.user_id >= first_id,
+                    Model.user_id <= last_id,
+                    Model.date >= start,
+                    Model.date < end,
+                    Model.category.in_(categories),
+                ),
+                keys=(Model.user_id, extract("year", Model.date), extract("month", Model.date), Model.category),
+            )
+            for (_, y, m, category), total in totals.items():
+                values[(pydate(int(y), int(m), 1), kind, category)].append(total)
+    return {key: TDigest().update(totals) for key, totals in values.items()}
+
+
+def _user_id_ranges(batch_size: int) -> List[Tuple[int, int]]:
+    with new_session() as session:
+        first, last = session.exec(select(func.min(User.id), func.max(User.id))).one()
+    if first is None:
+        return []
+    return [(lo, min(lo + batch_size - 1, last)) for lo in range(first, last + 1, batch_size)]
+
+
+def compute(months: int = 2, workers: int = 4, batch_size: int = 5000) -> dict:
+    """Recalcula los ``months`` últimos meses (incluido el actual)."""
+    end = pydate.today().replace(day=1) + relativedelta(months=1)
+    start = end - relativedelta(months=months)
+    tasks = [(lo, hi, start, end) for lo, hi in _user_id_ranges(batch_size)]
+
+    merged: Dict[tuple, TDigest] = {}
+
+    def collect(partials):
+        for partial in partials:
+            for key, digest in partial.items():
+                merged[key] = merged[key].merge(digest) if key in merged else digest
+
+    if workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            collect(pool.map(sketch_users, tasks))
+    else:
+        collect(map(sketch_users, tasks))
+
+    now = datetime.now(timezone.utc)
+    rows = [
+        CohortSketch(
+            month=month,
+            kind=kind,
+            category=category,
+            user_count=int(digest.count),
+            sketch=digest.to_dict(),
+            computed_at=now,
+        )
+        for (month, kind, category), digest in sorted(merged.items())
+        if digest.count >= COHORT_MIN_USERS
+    ]
+    # cohort_sketches vive en la base principal (el directorio con sharding).
+    with Session(get_engine()) as session:
+        session.exec(delete(CohortSketch).where(CohortSketch.month >= start, CohortSketch.month < end))
+        session.add_all(rows)
+        session.commit()
+    return {"batches": len(tasks), "cohorts": len(merged), "stored": len(rows)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--months", type=int, default=2)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    args = parser.parse_args()
+    print(compute(args.months, args.workers, args.batch_size))
@@ -0,0 +1,93 @@
+# app/jobs/fx_rates.py
+"""
+Carga tipos de cambio diarios en fx_rates desde un CSV local.
+
+Admite el histórico del BCE tal cual se descarga (eurofxref-hist.csv: una
+columna Date y una columna por moneda, con "N/A" en los huecos) o un CSV
+largo con cabecera ``date,currency,rate``. Los tipos son unidades de cada
+moneda por 1 EUR. Las filas que ya existan se sobrescriben, así que se puede
+repetir con el fichero diario (eurofxref.csv) o con el histórico completo:
+
+    python -m app.jobs.fx_rates eurofxref-hist.csv [--batch-size 5000]
+
+Los workers recargan los tipos en memoria cada FX_CACHE_SECONDS (app/fx.py).
+"""
+
+import argparse
+import csv
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from typing import Iterator, Tuple
+
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app.database import get_engine
+from app.fx import BASE_CURRENCY
+from app.models import FxRate
+
+
+def _parse_date(value: str):
+    value = value.strip()
+    for fmt in ("%Y-%m-%d", "%d %B %Y"):
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            pass
+    raise ValueError(f"Invalid date: {value}")
+
+
+def read_rates(path: str) -> Iterator[Tuple]:
+    """(date, currency, rate) de cada tipo del fichero."""
+    with open(path, newline="", encoding="utf-8") as handle:
+        reader = csv.reader(handle)
+        header = [name.strip() for name in next(reader)]
+        long_format = [name.lower() for name in header[:3]] == ["date", "currency", "rate"]
+        for row in reader:
+            if not row:
+                continue
+            if long_format:
+                yield _parse_date(row[0]), row[1].strip().upper(), Decimal(row[2].strip())
+                continue
+            day = _parse_date(row[0])
+            for currency, value in zip(header[1:], row[1:]):
+                value = value.strip()
+                if not currency or currency == BASE_CURRENCY or value in ("", "N/A"):
+                    continue
+                try:
+                    yield day, currency, Decimal(value)
+                except InvalidOperation:
+                    raise ValueError(f"Invalid rate for {currency} on {day}: {value}")
+
+
+def load(path: str, batch_size: int = 5000) -> dict:
+    table = FxRate.__table__
+    counts = {"rates": 0, "batches": 0}
+    engine = get_engine()
+    dialect = postgresql if engine.dialect.name == "postgresql" else sqlite
+    statement = dialect.insert(table)
+    statement = statement.on_conflict_do_update(
+        index_elements=[table.c.date, table.c.currency], set_={"rate": statement.excluded.rate}
+    )
+
+    batch = []
+    with engine.begin() as conn:
+        for day, currency, rate in read_rates(path):
+            batch.append({"date": day, "currency": currency, "rate": rate})
+            if len(batch) >= batch_size:
+                conn.execute(statement, batch)
+                counts["rates"] += len(batch)
+                counts["batches"] += 1
+                batch = []
+        if batch:
+            conn.execute(statement, batch)
+            counts["rates"] += len(batch)
+            counts["batches"] += 1
+    return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", help="CSV del BCE (Date,USD,JPY,...) o date,currency,rate")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    args = parser.parse_args()
+    print(load(args.path, args.batch_size))
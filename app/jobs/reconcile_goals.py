@@ -0,0 +1,110 @@
+# app/jobs/reconcile_goals.py
+"""
+Reconciliación nocturna de goal_status.
+
+Recalcula por lotes de usuarios, con consultas agregadas (no fila a fila),
+el estado esperado de todas las metas y corrige las filas de goal_status que
+falten, sobren o difieran. Sirve también para rellenar la tabla tras la
+migración 0004. Las escrituras en bloque con Core (app/jobs/recurring.py)
+usan ``reconcile_users`` dentro de su propia transacción.
+
+    python -m app.jobs.reconcile_goals [--batch-size 500]
+"""
+
+import argparse
+from collections import defaultdict
+from datetime import date as pydate
+from decimal import Decimal
+from typing import Optional
+
+from sqlalchemy import extract
+from sqlmodel import select
+
+from app import fx
+from app.database import new_session
+from app.goal_status import GOAL_TYPES, compute_status
+from app.models import User, Income, GoalStatus
+from app.signals import month_start
+
+
+def _monthly_sums(session, Model, user_ids, since):
+    where = [Model.user_id.in_(user_ids)]
+    if since is not None:
+        where.append(Model.date >= since)
+    totals = fx.converted_totals(
+        session, Model, where, keys=(Model.user_id, extract("year", Model.date), extract("month", Model.date))
+    )
+    return {
+        (user_id, pydate(int(y), int(m), 1)): Decimal(str(total))
+        for (user_id, y, m), total in totals.items()
+    }
+
+
+def _expected_status(session, user_ids, since):
+    incomes = _monthly_sums(session, Income, user_ids, since)
+    expected = {}
+    for goal_type, (GoalModel, ActualModel) in GOAL_TYPES.items():
+        actuals = _monthly_sums(session, ActualModel, user_ids, since)
+        # La meta vigente de cada mes es la de fecha más reciente.
+        goals = {}
+        statement = select(GoalModel.user_id, GoalModel.date, GoalModel.value).where(GoalModel.user_id.in_(user_ids))
+        if since is not None:
+            statement = statement.where(GoalModel.date >= since)
+        for user_id, goal_date, value in session.exec(statement.order_by(GoalModel.date)).all():
+            goals[(user_id, month_start(goal_date))] = value
+        for key, percentage in goals.items():
+            expected[key + (goal_type,)] = compute_status(
+                percentage, incomes.get(key, Decimal(0)), actuals.get(key, Decimal(0))
+            )
+    return expected
+
+
+def reconcile_users(session, user_ids, since: Optional[pydate] = None, counts=None) -> dict:
+    """
+    Corrige goal_status de ``user_ids`` (sólo desde el mes ``since`` si se
+    indica) sin hacer commit.
+    """
+    counts = counts if counts is not None else defaultdict(int)
+    if since is not None:
+        since = month_start(since)
+    expected = _expected_status(session, user_ids, since)
+    statement = select(GoalStatus).where(GoalStatus.user_id.in_(user_ids))
+    if since is not None:
+        statement = statement.where(GoalStatus.month >= since)
+    stored = {(row.user_id, row.month, row.goal_type): row for row in session.exec(statement).all()}
+    for key, row in stored.items():
+        values = expected.get(key)
+        if values is None:
+            session.delete(row)
+            counts["deleted"] += 1
+        elif any(getattr(row, field) != value for field, value in values.items()):
+            for field, value in values.items():
+                setattr(row, field, value)
+            session.add(row)
+            counts["updated"] += 1
+    for key, values in expected.items():
+        if key not in stored:
+            user_id, month, goal_type = key
+            session.add(GoalStatus(user_id=user_id, month=month, goal_type=goal_type, **values))
+            counts["inserted"] += 1
+    return counts
+
+
+def reconcile(batch_size: int = 500) -> dict:
+    counts = defaultdict(int)
+    with new_session() as session:
+        user_ids = session.exec(select(User.id).order_by(User.id)).all()
+
+    for offset in range(0, len(user_ids), batch_size):
+        batch = user_ids[offset:offset + batch_size]
+        with new_session() as session:
+            reconcile_users(session, batch, counts=counts)
+            session.commit()
+    return dict(counts)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+    print(reconcile(args.batch_size))
@@ -0,0 +1,181 @@
+# app/jobs/recurring.py
+"""
+Materializa las ocurrencias vencidas de las plantillas recurrentes.
+
+Recorre recurring_templates por lotes (``next_run <= hoy``, en orden de id) y,
+en una transacción por lote:
+
+1. reclama cada ocurrencia con ``INSERT INTO recurring_runs ... ON CONFLICT
+   DO NOTHING RETURNING``: sólo devuelve las que nadie había materializado;
+2. inserta en bloque los movimientos de las ocurrencias reclamadas;
+3. adelanta ``next_run`` de las plantillas;
+4. recalcula goal_status de los usuarios afectados con consultas agregadas
+   (reconcile_goals.reconcile_users) y anota las filas para el resto de
+   listeners (signals.record_bulk_rows), para el registro de cambios
+   (changes.record_many) y para los resúmenes anuales (year_reports.mark_stale).
+
+Si el proceso cae, la transacción del lote se deshace entera; al repetirlo (o
+si dos schedulers coinciden) la clave primaria (template_id, period) de
+recurring_runs impide duplicar movimientos. Pensado para ejecutarse a diario:
+
+    python -m app.jobs.recurring [--batch-size 5000] [--today AAAA-MM-DD]
+"""
+
+import argparse
+import os
+from calendar import monthrange
+from collections import defaultdict
+from datetime import date as pydate, timedelta
+from typing import List, Optional, Tuple
+
+from sqlalchemy import bindparam, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlmodel import Session
+
+from app import changes, signals, year_reports
+from app.database import get_engine
+from app.jobs.reconcile_goals import reconcile_users
+from app.models import Income, Expense, Saving, Investment, RecurringTemplate, RecurringRun
+
+LEDGERS = {
+    "income": Income,
+    "expense": Expense,
+    "saving": Saving,
+    "investment": Investment,
+}
+FREQUENCIES = ("monthly", "weekly")
+
+
+def next_occurrence(start_date: pydate, frequency: str, current: pydate) -> pydate:
+    """Ocurrencia siguiente a ``current`` (que debe ser una ocurrencia)."""
+    if frequency == "weekly":
+        return current + timedelta(days=7)
+    # Siempre desde start_date para no arrastrar el recorte de fin de mes
+    # (31 ene -> 28 feb -> 31 mar). Sin relativedelta: es lo más caro del lote.
+    year, month = divmod(current.year * 12 + current.month, 12)
+    return pydate(year, month + 1, min(start_date.day, monthrange(year, month + 1)[1]))
+
+
+def due_occurrences(template, today: pydate) -> Tuple[List[pydate], Optional[pydate]]:
+    """(ocurrencias vencidas hasta ``today``, nuevo next_run)."""
+    dates = []
+    run = template.next_run
+    while run is not None and run <= today:
+        if template.end_date is not None and run > template.end_date:
+            return dates, None
+        dates.append(run)
+        run = next_occurrence(template.start_date, template.frequency, run)
+    if run is not None and template.end_date is not None and run > template.end_date:
+        run = None
+    return dates, run
+
+
+def _insert_ignoring_conflicts(conn, table):
+    dialect = postgresql if conn.dialect.name == "postgresql" else sqlite
+    return dialect.insert(table).on_conflict_do_nothing()
+
+
+def materialize_batch(session: Session, templates, today: pydate, counts) -> None:
+    conn = session.connection()
+    runs_table = RecurringRun.__table__
+    templates_table = RecurringTemplate.__table__
+
+    by_id = {template.id: template for template in templates}
+    runs, next_runs = [], []
+    for template in templates:
+        dates, next_run = due_occurrences(template, today)
+        runs.extend({"template_id": template.id, "period": d, "user_id": template.user_id} for d in dates)
+        next_runs.append({"b_id": template.id, "b_next_run": next_run})
+
+    claimed = []
+    if runs:
+        claimed = conn.execute(
+            _insert_ignoring_conflicts(conn, runs_table).returning(runs_table.c.template_id, runs_table.c.period),
+            runs,
+        ).all()
+    counts["occurrences"] += len(runs)
+    counts["skipped"] += len(runs) - len(claimed)
+
+    rows_by_ledger = defaultdict(list)
+    for template_id, period in claimed:
+        template = by_id[template_id]
+        row = {"user_id": template.user_id, "date": period, "amount": template.amount, "currency": template.currency}
+        if template.ledger != "income":
+            row["category"] = template.category
+        rows_by_ledger[template.ledger].append(row)
+
+    user_ids, since = set(), None
+    for ledger, rows in rows_by_ledger.items():
+        Model = LEDGERS[ledger]
+        table = Model.__table__
+        inserted = conn.execute(
+            table.insert().returning(table.c.user_id, table.c.id, sort_by_parameter_order=True), rows
+        ).all()
+        signals.record_bulk_rows(session, Model, inserted)
+        changes.record_many(session, Model, "insert", (
+            (user_id, row_id, row) for (user_id, row_id), row in zip(inserted, rows)
+        ))
+        user_ids.update(user_id for user_id, _ in inserted)
+        earliest = min(row["date"] for row in rows)
+        since = earliest if since is None else min(since, earliest)
+        counts["inserted"] += len(inserted)
+
+    conn.execute(
+        update(templates_table)
+        .where(templates_table.c.id == bindparam("b_id"))
+        .values(next_run=bindparam("b_next_run")),
+        next_runs,
+    )
+    if user_ids:
+        reconcile_users(session, sorted(user_ids), since=since)
+        year_reports.mark_stale(session, (
+            (row["user_id"], row["date"]) for rows in rows_by_ledger.values() for row in rows
+        ))
+
+
+def materialize(engine, today: Optional[pydate] = None, batch_size: int = 5000) -> dict:
+    today = today or pydate.today()
+    counts = defaultdict(int)
+    last_id = 0
+    while True:
+        with Session(engine) as session:
+            templates = session.execute(
+                select(RecurringTemplate.__table__)
+                .where(RecurringTemplate.next_run <= today, RecurringTemplate.id > last_id)
+                .order_by(RecurringTemplate.id)
+                .limit(batch_size)
+            ).all()
+            if not templates:
+                break
+            last_id = templates[-1].id
+            materialize_batch(session, templates, today, counts)
+            session.commit()
+        counts["templates"] += len(templates)
+        counts["batches"] += 1
+    return dict(counts)
+
+
+def engines():
+    """El primario o, con sharding, cada shard (las plantillas viven con el usuario)."""
+    if os.getenv("SHARD_DATABASE_URLS"):
+        from app.sharding import SHARD_IDS, get_shard_engines
+
+        shard_engines = get_shard_engines()
+        return [shard_engines[shard_id] for shard_id in SHARD_IDS]
+    return [get_engine()]
+
+
+def run(today: Optional[pydate] = None, batch_size: int = 5000) -> dict:
+    totals = defaultdict(int)
+    for engine in engines():
+        for key, value in materialize(engine, today, batch_size).items():
+            totals[key] += value
+    return dict(totals)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--today", type=pydate.fromisoformat, default=None)
+    args = parser.parse_args()
+    print(run(args.today, args.batch_size))
@@ -0,0 +1,58 @@
+# app/jobs/year_reports.py
+"""
+Calcula los resúmenes anuales (app/year_reports.py) antes de que nadie los
+pida: los de los usuarios con movimientos en el año que aún no tienen
+resumen y los que tienen meses marcados por escrituras posteriores. Con
+``--full`` recalcula todos los meses (p. ej. tras corregir tipos de cambio).
+
+    python -m app.jobs.year_reports [--year 2024] [--full]
+
+Por defecto, el año anterior.
+"""
+
+import argparse
+from collections import defaultdict
+from datetime import date as pydate
+
+from sqlmodel import select
+
+from app.database import new_session
+from app.models import YearReport
+from app.year_reports import LEDGERS, refresh
+
+
+def _pending_users(session, year: int, full: bool):
+    start, end = pydate(year, 1, 1), pydate(year + 1, 1, 1)
+    user_ids = set()
+    for Model in LEDGERS.values():
+        user_ids.update(session.exec(
+            select(Model.user_id).where(Model.date >= start, Model.date < end).distinct()
+        ).all())
+    built = {
+        user_id: stale
+        for user_id, stale in session.exec(
+            select(YearReport.user_id, YearReport.stale_months).where(YearReport.year == year)
+        ).all()
+    }
+    if full:
+        return sorted(user_ids | set(built))
+    return sorted((user_ids - set(built)) | {user_id for user_id, stale in built.items() if stale})
+
+
+def build(year: int, full: bool = False) -> dict:
+    counts = defaultdict(int)
+    with new_session() as session:
+        user_ids = _pending_users(session, year, full)
+    for user_id in user_ids:
+        with new_session() as session:
+            refresh(session, user_id, year, full=full)
+        counts["built"] += 1
+    return dict(counts)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--year", type=int, default=pydate.today().year - 1)
+    parser.add_argument("--full", action="store_true")
+    args = parser.parse_args()
+    print(build(args.year, args.full))
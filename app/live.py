@@ -0,0 +1,164 @@
+# app/live.py
+"""
+Pub/sub de cambios por usuario para /dashboard/stream (SSE).
+
+Cada commit que toca datos de un usuario publica un aviso con las filas de
+movimientos afectadas ({"expenses": {ids}, ...}; vacío si sólo cambiaron
+metas u otros datos). Los suscriptores son colas asyncio del event loop que
+atiende la conexión SSE, así que una conexión inactiva no ocupa ningún hilo.
+
+LIVE_BACKEND:
+- ``memory`` (por defecto): los avisos sólo llegan a las conexiones del mismo
+  proceso. Sirve con un único worker.
+- ``postgres``: los avisos se envían con NOTIFY y cada worker tiene un hilo
+  con LISTEN que los reparte a sus conexiones, así que el cliente recibe los
+  cambios aunque la escritura la haya atendido otro worker.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import select
+import threading
+from typing import Dict, Optional, Set
+
+from app import signals
+from app.models import Income, Expense, Saving, Investment
+
+logger = logging.getLogger(__name__)
+
+LIVE_BACKEND = os.getenv("LIVE_BACKEND", "memory")
+CHANNEL = "wealthtrack_live"
+# NOTIFY admite hasta 8000 bytes; con más filas se avisa de recargar todo.
+MAX_NOTIFY_IDS = 500
+
+LEDGER_KEYS = {Income: "income", Expense: "expenses", Saving: "savings", Investment: "investments"}
+
+
+class Subscription:
+    def __init__(self, user_id: int):
+        self.user_id = user_id
+        self.loop = asyncio.get_running_loop()
+        self.queue: "asyncio.Queue[Optional[dict]]" = asyncio.Queue()
+
+
+_subscriptions: Dict[int, Set[Subscription]] = {}
+_lock = threading.Lock()
+
+
+def subscribe(user_id: int) -> Subscription:
+    subscription = Subscription(user_id)
+    with _lock:
+        _subscriptions.setdefault(user_id, set()).add(subscription)
+    if LIVE_BACKEND == "postgres":
+        _ensure_listener()
+    return subscription
+
+
+def unsubscribe(subscription: Subscription) -> None:
+    with _lock:
+        subscribers = _subscriptions.get(subscription.user_id)
+        if subscribers is not None:
+            subscribers.discard(subscription)
+            if not subscribers:
+                del _subscriptions[subscription.user_id]
+
+
+def subscriber_count() -> int:
+    return sum(len(subscribers) for subscribers in _subscriptions.values())
+
+
+def deliver(user_id: int, rows: Optional[dict]) -> None:
+    """
+    Entrega un aviso a las conexiones de este proceso (desde cualquier hilo).
+    ``rows`` es {clave de ledger: [ids]} o None si hay que recargar todo.
+    """
+    with _lock:
+        subscribers = list(_subscriptions.get(user_id, ()))
+    for subscription in subscribers:
+        subscription.loop.call_soon_threadsafe(subscription.queue.put_nowait, rows)
+
+
+def publish(user_id: int, rows: Optional[dict]) -> None:
+    if LIVE_BACKEND == "postgres":
+        _notify(user_id, rows)
+    else:
+        deliver(user_id, rows)
+
+
+# ─── Avisos desde las escrituras ───────────────────────────────────────────────
+
+@signals.on_commit
+def _users_committed(user_ids):
+    # Cambios sin filas de movimientos (metas, goal_status...): basta con
+    # recalcular los totales.
+    for user_id in user_ids:
+        publish(user_id, {})
+
+
+@signals.on_commit_rows
+def _rows_committed(rows):
+    by_user: Dict[int, dict] = {}
+    for Model, keys in rows.items():
+        ledger = LEDGER_KEYS.get(Model)
+        if ledger is None:
+            continue
+        for user_id, row_id in keys:
+            by_user.setdefault(user_id, {}).setdefault(ledger, []).append(row_id)
+    for user_id, by_ledger in by_user.items():
+        too_many = sum(len(ids) for ids in by_ledger.values()) > MAX_NOTIFY_IDS
+        publish(user_id, None if too_many else by_ledger)
+
+
+# ─── Postgres LISTEN/NOTIFY ────────────────────────────────────────────────────
+
+_listener: Optional[threading.Thread] = None
+_listener_lock = threading.Lock()
+
+
+def _notify(user_id: int, rows: Optional[dict]) -> None:
+    from sqlalchemy import text
+
+    from app.database import get_engine
+
+    payload = json.dumps({"user_id": user_id, "rows": rows}, separators=(",", ":"))
+    try:
+        with get_engine().begin() as conn:
+            conn.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": CHANNEL, "payload": payload})
+    except Exception:
+        # El aviso es una optimización: el cliente recupera el estado al reconectar.
+        logger.exception("No se pudo publicar el aviso para el usuario %s", user_id)
+
+
+def _listen_forever() -> None:
+    from app.database import get_engine
+
+    while True:
+        try:
+            connection = get_engine().raw_connection()
+            dbapi = connection.driver_connection
+            dbapi.autocommit = True
+            with dbapi.cursor() as cursor:
+                cursor.execute(f"LISTEN {CHANNEL}")
+            while True:
+                if select.select([dbapi], [], [], 30) == ([], [], []):
+                    continue
+                dbapi.poll()
+                while dbapi.notifies:
+                    notification = dbapi.notifies.pop(0)
+                    message = json.loads(notification.payload)
+                    deliver(message["user_id"], message["rows"])
+        except Exception:
+            logger.exception("Conexión LISTEN perdida; se reintenta en 5 s")
+            threading.Event().wait(5)
+
+
+def _ensure_listener() -> None:
+    global _listener
+    if _listener is not None and _listener.is_alive():
+        return
+    with _listener_lock:
+        if _listener is None or not _listener.is_alive():
+            _listener = threading.Thread(target=_listen_forever, name="live-listen", daemon=True)
+            _listener.start()
@@ -1,23 +1,74 @@
 # main.py
-from fastapi import FastAPI, Depends
+import importlib
+import os
+
+import anyio
+from dotenv import load_dotenv
+from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from sqlmodel import SQLModel, Session, select
-
-from app.database import engine, get_session
-from app.routers.auth import router as auth_router
-from app.routers.users import router as users_router
-from app.routers.dashboard import router as dashboard_router
-from app.routers.goals import router as goals_router
-from app.routers.income import router as income_router # New Import
-from app.routers.expense import router as expense_router
-from app.routers.saving import router as saving_router
-from app.routers.investment import router as investment_router
-from app.routers import import_data
-from app.routers import history
-from app.routers import profile
+
+from app.compression import CompressionMiddleware
+from app.idempotency import IdempotencyMiddleware
+
+load_dotenv()
+
+# Con WEALTHTRACK_LAZY_STARTUP=1 los routers (y con ellos SQLModel, los modelos
+# y el driver de la base de datos) se importan en la primera petición y no al
+# importar app.main. Pensado para despliegues serverless / autoscaling donde
+# el arranque en frío cuenta; ver `python -m app.startup_profile`.
+LAZY_STARTUP = os.getenv("WEALTHTRACK_LAZY_STARTUP", "0") == "1"
+
+ROUTER_MODULES = (
+    "app.routers.auth",
+    "app.routers.users",
+    "app.routers.dashboard",
+    "app.routers.history",
+    "app.routers.goals",
+    "app.routers.profile",
+    "app.routers.income",
+    "app.routers.expense",
+    "app.routers.saving",
+    "app.routers.investment",
+    "app.routers.import_data",
+    "app.routers.forecast",
+    "app.routers.benchmarks",
+    "app.routers.anomalies",
+    "app.routers.recurring",
+    "app.routers.search",
+    "app.routers.changes",
+    "app.routers.sync",
+    "app.routers.stats",
+    "app.routers.reports",
+)
+
+
+def include_routers(app: FastAPI) -> None:
+    for module_name in ROUTER_MODULES:
+        app.include_router(importlib.import_module(module_name).router)
+    app.state.routers_loaded = True
+
+
+class LazyRouterMiddleware:
+    """Incluye los routers en la aplicación justo antes de la primera petición."""
+
+    def __init__(self, app, fastapi_app: FastAPI):
+        self.app = app
+        self.fastapi_app = fastapi_app
+        self.lock = anyio.Lock()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] in ("http", "websocket") and not self.fastapi_app.state.routers_loaded:
+            async with self.lock:
+                if not self.fastapi_app.state.routers_loaded:
+                    await anyio.to_thread.run_sync(include_routers, self.fastapi_app)
+        await self.app(scope, receive, send)
 
 
 app = FastAPI()
+app.state.routers_loaded = False
+
+# La más interna: guarda la respuesta sin comprimir y antes de las cabeceras CORS.
+app.add_middleware(IdempotencyMiddleware)
 
 origins = [
     "http://localhost:8080",
@@ -32,19 +83,18 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-SQLModel.metadata.create_all(engine)
-
-app.include_router(auth_router)
-app.include_router(users_router)
-app.include_router(dashboard_router)
-app.include_router(history.router)
-app.include_router(goals_router)
-app.include_router(profile.router)
-app.include_router(income_router)
-app.include_router(expense_router)
-app.include_router(saving_router)
-app.include_router(investment_router)
-app.include_router(import_data.router)
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=1024,
+    gzip_level=6,
+    brotli_quality=4,
+    offload_size=64 * 1024,
+)
+
+if LAZY_STARTUP:
+    app.add_middleware(LazyRouterMiddleware, fastapi_app=app)
+else:
+    include_routers(app)
 
 
 @app.get("/")
@@ -0,0 +1,24 @@
+# app/migrate.py
+"""
+Aplica las migraciones pendientes. Se ejecuta una vez por despliegue, antes de
+arrancar los workers, que ya no hacen ningún DDL al importar app.main:
+
+    python -m app.migrate            # hasta la última revisión
+    python -m app.migrate 0002       # hasta una revisión concreta
+"""
+
+import sys
+from pathlib import Path
+
+from alembic import command
+from alembic.config import Config
+
+ALEMBIC_INI = Path(__file__).resolve().parent.parent / "alembic.ini"
+
+
+def migrate(revision: str = "head") -> None:
+    command.upgrade(Config(str(ALEMBIC_INI)), revision)
+
+
+if __name__ == "__main__":
+    migrate(sys.argv[1] if len(sys.argv) > 1 else "head")
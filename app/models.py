@@ -1,10 +1,10 @@
 # app/models.py
 
 from typing import Optional
-from datetime import date as pydate
+from datetime import date as pydate, datetime
 from decimal import Decimal
 from sqlmodel import SQLModel, Field, Relationship
-from sqlalchemy import Numeric, Column, String, Integer, Date
+from sqlalchemy import BigInteger, Numeric, Column, String, Integer, Date, DateTime, Index, JSON, LargeBinary
 
 # ─── Users ────────────────────────────────────────────────────────────────────
 class UserBase(SQLModel):
@@ -22,47 +22,87 @@ class UserRead(UserBase):
 class UserCreate(UserBase):
     password: str
 
+class UserShard(SQLModel, table=True):
+    # Directorio de sharding: en qué shard viven los datos de cada usuario.
+    __tablename__ = "user_shards"
+    user_id: int = Field(foreign_key="users.id", primary_key=True)
+    shard: str = Field(max_length=50)
+
 
 
 class Income(SQLModel, table=True):
+    __table_args__ = (Index("ix_income_user_date", "user_id", "date"), {"sqlite_autoincrement": True})
     id: Optional[int] = Field(default=None, primary_key=True)
     date: pydate
     user_id: int = Field(foreign_key="users.id")
-    amount: Decimal = Field(sa_column=Column(Numeric(10, 2), nullable=False))
+    amount: Decimal = Field(sa_column=Column(Numeric(14, 2), nullable=False))
+    # Código ISO 4217 del importe; app/fx.py lo convierte a la moneda mostrada.
+    currency: str = Field(default="EUR", sa_column=Column("currency", String(3), nullable=False, server_default="EUR"))
 
 class Expense(SQLModel, table=True):
     __tablename__ = "expenses"
+    __table_args__ = (
+        Index("ix_expenses_user_date", "user_id", "date"),
+        Index("ix_expenses_user_category", "user_id", "category", "date", "amount"),
+        Index("ux_expenses_content_hash", "user_id", "content_hash", "date", unique=True),
+        {"sqlite_autoincrement": True},
+    )
     id: Optional[int] = Field(default=None, primary_key=True) 
     date: pydate
     user_id: int = Field(foreign_key="users.id")
-    amount: Decimal = Field(sa_column=Column("amount", Numeric(10, 2), nullable=False))
+    amount: Decimal = Field(sa_column=Column("amount", Numeric(14, 2), nullable=False))
+    currency: str = Field(default="EUR", sa_column=Column("currency", String(3), nullable=False, server_default="EUR"))
     category: str = Field(sa_column=Column("category", String(100), nullable=False))
+    # Texto libre del usuario; indexado para /search (trigramas en Postgres, FTS5 en SQLite).
+    notes: Optional[str] = Field(default=None, sa_column=Column("notes", String(500), nullable=True))
+    # Huella de las filas importadas por CSV (app/csv_import.py); NULL en las creadas por la API.
+    content_hash: Optional[str] = Field(default=None, sa_column=Column("content_hash", String(32), nullable=True))
 
 class Saving(SQLModel, table=True):
     __tablename__ = "savings"
+    __table_args__ = (
+        Index("ix_savings_user_date", "user_id", "date"),
+        Index("ix_savings_user_category", "user_id", "category", "date", "amount"),
+        Index("ux_savings_content_hash", "user_id", "content_hash", "date", unique=True),
+        {"sqlite_autoincrement": True},
+    )
     id: Optional[int] = Field(default=None, primary_key=True)
     date: pydate
     user_id: int = Field(foreign_key="users.id")
-    amount: Decimal = Field(sa_column=Column("amount", Numeric(10, 2), nullable=False))
+    amount: Decimal = Field(sa_column=Column("amount", Numeric(14, 2), nullable=False))
+    currency: str = Field(default="EUR", sa_column=Column("currency", String(3), nullable=False, server_default="EUR"))
     category: str = Field(sa_column=Column("category", String(100), nullable=False))
+    notes: Optional[str] = Field(default=None, sa_column=Column("notes", String(500), nullable=True))
+    content_hash: Optional[str] = Field(default=None, sa_column=Column("content_hash", String(32), nullable=True))
 
 class Investment(SQLModel, table=True):
     __tablename__ = "investments"
+    __table_args__ = (
+        Index("ix_investments_user_date", "user_id", "date"),
+        Index("ix_investments_user_category", "user_id", "category", "date", "amount"),
+        Index("ux_investments_content_hash", "user_id", "content_hash", "date", unique=True),
+        {"sqlite_autoincrement": True},
+    )
     id: Optional[int] = Field(default=None, primary_key=True)
     date: pydate
     user_id: int = Field(foreign_key="users.id")
-    amount: Decimal = Field(sa_column=Column("amount", Numeric(10, 2), nullable=False))
+    amount: Decimal = Field(sa_column=Column("amount", Numeric(14, 2), nullable=False))
+    currency: str = Field(default="EUR", sa_column=Column("currency", String(3), nullable=False, server_default="EUR"))
     category: str = Field(sa_column=Column("category", String(100), nullable=False))
+    notes: Optional[str] = Field(default=None, sa_column=Column("notes", String(500), nullable=True))
+    content_hash: Optional[str] = Field(default=None, sa_column=Column("content_hash", String(32), nullable=True))
 
 
 class ExpenseGoal(SQLModel, table=True):
     __tablename__ = "expensegoals"
+    __table_args__ = (Index("ix_expensegoals_userid_date", "userid", "date"),)
     date: pydate = Field(sa_column=Column("date", Date, primary_key=True))
     user_id: int = Field(sa_column=Column("userid", Integer, primary_key=True))
     value: Decimal = Field(sa_column=Column("value", Numeric(5, 2), nullable=False))
 
 class SavingGoal(SQLModel, table=True):
     __tablename__ = "savinggoals"
+    __table_args__ = (Index("ix_savinggoals_userid_date", "userid", "date"),)
     date: pydate = Field(sa_column=Column("date", Date, primary_key=True))
     user_id: int = Field(sa_column=Column("userid", Integer, primary_key=True))
     value: Decimal = Field(sa_column=Column("value", Numeric(5, 2), nullable=False))
@@ -70,6 +110,150 @@ class SavingGoal(SQLModel, table=True):
 
 class InvestmentGoal(SQLModel, table=True):
     __tablename__ = "investmentgoals"
+    __table_args__ = (Index("ix_investmentgoals_userid_date", "userid", "date"),)
     date: pydate = Field(sa_column=Column("date", Date, primary_key=True))
     user_id: int = Field(sa_column=Column("userid", Integer, primary_key=True))
     value: Decimal = Field(sa_column=Column("value", Numeric(5, 2), nullable=False))
+
+
+class GoalStatus(SQLModel, table=True):
+    # Estado precalculado de cada meta por usuario y mes (app/goal_status.py).
+    __tablename__ = "goal_status"
+    user_id: int = Field(foreign_key="users.id", primary_key=True)
+    month: pydate = Field(primary_key=True)
+    goal_type: str = Field(sa_column=Column("goal_type", String(20), primary_key=True))
+    goal_percentage: Decimal = Field(sa_column=Column("goal_percentage", Numeric(5, 2), nullable=False))
+    goal_value: Decimal = Field(sa_column=Column("goal_value", Numeric(14, 2), nullable=False))
+    actual_value: Decimal = Field(sa_column=Column("actual_value", Numeric(14, 2), nullable=False))
+    met: bool
+
+
+class YearReport(SQLModel, table=True):
+    # Resumen anual precalculado de cada usuario (app/year_reports.py).
+    __tablename__ = "year_reports"
+    user_id: int = Field(foreign_key="users.id", primary_key=True)
+    year: int = Field(primary_key=True)
+    # Componentes de cada mes ("1".."12"), de los que se recalcula el resumen.
+    months: dict = Field(sa_column=Column("months", JSON, nullable=False))
+    # Lo que devuelve /reports/{year}.
+    report: dict = Field(sa_column=Column("report", JSON, nullable=False))
+    # Bit m - 1 a 1: el mes m cambió desde el último cálculo.
+    stale_months: int = Field(default=0)
+    # Sube con cada cambio marcado; un recálculo sólo se guarda si no cambió entretanto.
+    version: int = Field(default=0)
+    built_at: Optional[datetime] = Field(default=None, sa_column=Column("built_at", DateTime(timezone=True)))
+
+
+class CohortSketch(SQLModel, table=True):
+    # Distribución entre usuarios del total mensual por categoría
+    # (t-digest de app/sketch.py, calculado por app/jobs/cohorts.py).
+    __tablename__ = "cohort_sketches"
+    month: pydate = Field(primary_key=True)
+    kind: str = Field(sa_column=Column("kind", String(20), primary_key=True))
+    category: str = Field(sa_column=Column("category", String(100), primary_key=True))
+    user_count: int
+    sketch: dict = Field(sa_column=Column("sketch", JSON, nullable=False))
+    computed_at: datetime = Field(sa_column=Column("computed_at", DateTime(timezone=True), nullable=False))
+
+
+class ExpenseStat(SQLModel, table=True):
+    # Ventana de los últimos gastos de cada usuario y categoría con su mediana
+    # y MAD, actualizada en cada escritura (app/anomalies.py).
+    __tablename__ = "expense_stats"
+    user_id: int = Field(foreign_key="users.id", primary_key=True)
+    category: str = Field(sa_column=Column("category", String(100), primary_key=True))
+    samples: list = Field(sa_column=Column("samples", JSON, nullable=False))
+    sample_count: int
+    median: Decimal = Field(sa_column=Column("median", Numeric(14, 2), nullable=False))
+    mad: Decimal = Field(sa_column=Column("mad", Numeric(14, 2), nullable=False))
+
+
+class ExpenseFlag(SQLModel, table=True):
+    # Gastos muy por encima de lo habitual en su categoría (app/anomalies.py).
+    __tablename__ = "expense_flags"
+    __table_args__ = (Index("ix_expense_flags_user_id", "user_id"),)
+    # Sin FK a expenses: con el esquema particionado su clave es (id, date).
+    # Las marcas de los gastos borrados las quita app/anomalies.py.
+    expense_id: int = Field(primary_key=True)
+    user_id: int = Field(foreign_key="users.id")
+    category: str = Field(sa_column=Column("category", String(100), nullable=False))
+    amount: Decimal = Field(sa_column=Column("amount", Numeric(14, 2), nullable=False))
+    median: Decimal = Field(sa_column=Column("median", Numeric(14, 2), nullable=False))
+    mad: Decimal = Field(sa_column=Column("mad", Numeric(14, 2), nullable=False))
+    score: Decimal = Field(sa_column=Column("score", Numeric(10, 2), nullable=False))
+    flagged_at: datetime = Field(sa_column=Column("flagged_at", DateTime(timezone=True), nullable=False))
+
+
+class RecurringTemplate(SQLModel, table=True):
+    # Movimiento que se repite cada mes o cada semana desde start_date
+    # (materializado por app/jobs/recurring.py).
+    __tablename__ = "recurring_templates"
+    __table_args__ = (
+        Index("ix_recurring_templates_next_run", "next_run"),
+        Index("ix_recurring_templates_user_id", "user_id"),
+        {"sqlite_autoincrement": True},
+    )
+    id: Optional[int] = Field(default=None, primary_key=True)
+    user_id: int = Field(foreign_key="users.id")
+    ledger: str = Field(sa_column=Column("ledger", String(20), nullable=False))
+    frequency: str = Field(sa_column=Column("frequency", String(10), nullable=False))
+    amount: Decimal = Field(sa_column=Column("amount", Numeric(14, 2), nullable=False))
+    currency: str = Field(default="EUR", sa_column=Column("currency", String(3), nullable=False, server_default="EUR"))
+    category: Optional[str] = Field(default=None, sa_column=Column("category", String(100), nullable=True))
+    start_date: pydate
+    end_date: Optional[pydate] = None
+    # Próxima ocurrencia todavía sin materializar; NULL cuando ya no quedan.
+    next_run: Optional[pydate] = None
+
+
+class RecurringRun(SQLModel, table=True):
+    # Ocurrencias ya materializadas: la clave primaria impide duplicarlas.
+    __tablename__ = "recurring_runs"
+    template_id: int = Field(foreign_key="recurring_templates.id", primary_key=True)
+    period: pydate = Field(primary_key=True)
+    user_id: int = Field(foreign_key="users.id")
+
+
+class IdempotencyKey(SQLModel, table=True):
+    # Respuestas guardadas por Idempotency-Key (app/idempotency.py).
+    # status_code NULL: la primera petición con esa clave sigue en curso.
+    __tablename__ = "idempotency_keys"
+    __table_args__ = (Index("ix_idempotency_keys_expires_at", "expires_at"),)
+    key: str = Field(sa_column=Column("key", String(255), primary_key=True))
+    request_hash: str = Field(sa_column=Column("request_hash", String(64), nullable=False))
+    status_code: Optional[int] = None
+    response_headers: Optional[list] = Field(default=None, sa_column=Column("response_headers", JSON, nullable=True))
+    response_body: Optional[bytes] = Field(default=None, sa_column=Column("response_body", LargeBinary, nullable=True))
+    created_at: datetime = Field(sa_column=Column("created_at", DateTime(timezone=True), nullable=False))
+    expires_at: datetime = Field(sa_column=Column("expires_at", DateTime(timezone=True), nullable=False))
+
+
+class FxRate(SQLModel, table=True):
+    # Tipos de cambio diarios: unidades de ``currency`` por 1 EUR, como los
+    # publica el BCE (cargados con python -m app.jobs.fx_rates).
+    __tablename__ = "fx_rates"
+    date: pydate = Field(sa_column=Column("date", Date, primary_key=True))
+    currency: str = Field(sa_column=Column("currency", String(3), primary_key=True))
+    rate: Decimal = Field(sa_column=Column("rate", Numeric(18, 8), nullable=False))
+
+
+class Change(SQLModel, table=True):
+    # Registro append-only de cada alta, modificación o baja de movimientos y
+    # metas (app/changes.py), escrito en la misma transacción. ``seq`` crece
+    # en el orden de los commits; cada base de datos (o shard) tiene el suyo.
+    # Sin foreign key a users: el registro sobrevive a las filas que describe.
+    __tablename__ = "changes"
+    __table_args__ = (Index("ix_changes_user_seq", "user_id", "seq"), {"sqlite_autoincrement": True})
+    seq: Optional[int] = Field(
+        default=None,
+        sa_column=Column("seq", BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True),
+    )
+    user_id: int = Field(sa_column=Column("user_id", Integer, nullable=False))
+    # income, expenses, savings, investments, expense_goals, saving_goals o investment_goals.
+    entity: str = Field(sa_column=Column("entity", String(20), nullable=False))
+    # id del movimiento, o el mes (AAAA-MM-01) de la meta.
+    key: str = Field(sa_column=Column("key", String(20), nullable=False))
+    op: str = Field(sa_column=Column("op", String(6), nullable=False))  # insert, update o delete
+    # Fila tras el cambio; en las bajas, la última versión de la fila borrada.
+    data: dict = Field(sa_column=Column("data", JSON, nullable=False))
+    changed_at: datetime = Field(sa_column=Column("changed_at", DateTime(timezone=True), nullable=False))
@@ -0,0 +1,224 @@
+# app/ratelimit.py
+"""
+Límite de peticiones (token bucket) y de peticiones simultáneas por usuario y
+ruta, para los endpoints caros (/history, /import):
+
+    @router.get("/", dependencies=[Depends(ratelimit.limit("history", rate=1, burst=10, concurrent=2))])
+
+- Cada usuario tiene, por ruta, un cubo de ``burst`` fichas que se rellena a
+  ``rate`` fichas por segundo; cada petición gasta una.
+- Como mucho ``concurrent`` peticiones del mismo usuario a la vez en esa ruta.
+- Si no hay ficha o hueco, 429 con ``Retry-After`` antes de abrir la sesión de
+  base de datos: el usuario se identifica por el ``user_id`` de la ruta o el
+  ``email`` de la query o del formulario, sin buscarlo en ``users`` (sin
+  ninguno de los dos, por la IP).
+
+Los valores del código se pueden cambiar por ruta con
+``RATE_LIMIT_<RUTA>="rate,burst,concurrent"`` (p. ej. RATE_LIMIT_HISTORY="2,20,4").
+
+Backend según RATE_LIMIT_BACKEND:
+
+- ``memory`` (por defecto): en el proceso. Con varios workers, cada uno
+  aplica el límite por su cuenta.
+- ``redis``: compartido entre procesos y máquinas (RATE_LIMIT_REDIS_URL;
+  necesita el paquete ``redis``). Cada comprobación es un script Lua atómico
+  con la hora del servidor de Redis. Si Redis no responde, la petición pasa:
+  el límite protege la base de datos, no debe tumbar la API.
+- ``off``: sin límites.
+
+Los endpoints sin ``limit`` no pasan por nada de esto.
+"""
+
+import logging
+import math
+import os
+import threading
+import time
+import uuid
+from functools import lru_cache
+from typing import Optional
+
+from fastapi import HTTPException, Request
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # pragma: no cover - dependencia opcional
+    aioredis = None
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL", "redis://localhost:6379/0")
+# Un hueco de concurrencia que nadie liberó (el proceso cayó) caduca a los
+# SLOT_TTL_SECONDS en Redis. En memoria muere con el proceso.
+SLOT_TTL_SECONDS = int(os.getenv("RATE_LIMIT_SLOT_TTL_SECONDS", "600"))
+# Cubos en memoria a partir de los cuales se descartan los que ya están llenos.
+MAX_MEMORY_BUCKETS = 100_000
+
+
+class MemoryBackend:
+    def __init__(self):
+        # clave -> [fichas, última actualización, momento en que vuelve a estar lleno]
+        self._buckets = {}
+        self._active = {}
+        self._lock = threading.Lock()
+
+    async def take(self, key: str, rate: float, burst: int) -> float:
+        """0 si había ficha (y la gasta); si no, segundos hasta la siguiente."""
+        now = time.monotonic()
+        with self._lock:
+            if len(self._buckets) >= MAX_MEMORY_BUCKETS:
+                self._buckets = {k: v for k, v in self._buckets.items() if v[2] > now}
+            tokens, updated, _ = self._buckets.get(key, (burst, now, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / rate
+            self._buckets[key] = (tokens, now, now + (burst - tokens) / rate)
+        return wait
+
+    async def acquire(self, key: str, limit: int) -> Optional[str]:
+        """Ocupa un hueco y devuelve con qué liberarlo, o None si no quedan."""
+        with self._lock:
+            active = self._active.get(key, 0)
+            if active >= limit:
+                return None
+            self._active[key] = active + 1
+        return key
+
+    async def release(self, key: str, slot: str) -> None:
+        with self._lock:
+            active = self._active.get(key, 1) - 1
+            if active > 0:
+                self._active[key] = active
+            else:
+                self._active.pop(key, None)
+
+
+_TAKE_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or burst
+local updated = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + (now - updated) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil((burst - tokens) / rate * 1000) + 1000)
+return tostring(wait)
+"""
+
+# Un ZSET por usuario y ruta: miembro = petición en curso, score = cuándo empezó.
+_ACQUIRE_SCRIPT = """
+local clock = redis.call('TIME')
+local now = tonumber(clock[1])
+local ttl = tonumber(ARGV[3])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - ttl)
+if redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[1]) then
+    return 0
+end
+redis.call('ZADD', KEYS[1], now, ARGV[2])
+redis.call('EXPIRE', KEYS[1], ttl)
+return 1
+"""
+
+
+class RedisBackend:
+    def __init__(self, url: str):
+        if aioredis is None:
+            raise RuntimeError("RATE_LIMIT_BACKEND=redis requires the 'redis' package")
+        self._client = aioredis.from_url(url)
+        self._take = self._client.register_script(_TAKE_SCRIPT)
+        self._acquire = self._client.register_script(_ACQUIRE_SCRIPT)
+
+    async def take(self, key: str, rate: float, burst: int) -> float:
+        try:
+            return float(await self._take(keys=[f"ratelimit:{key}"], args=[rate, burst]))
+        except (aioredis.RedisError, OSError):
+            logger.warning("Redis no responde; petición sin límite de ritmo", exc_info=True)
+            return 0.0
+
+    async def acquire(self, key: str, limit: int) -> Optional[str]:
+        slot = uuid.uuid4().hex
+        try:
+            acquired = await self._acquire(keys=[f"concurrency:{key}"], args=[limit, slot, SLOT_TTL_SECONDS])
+        except (aioredis.RedisError, OSError):
+            logger.warning("Redis no responde; petición sin límite de concurrencia", exc_info=True)
+            return ""
+        return slot if acquired else None
+
+    async def release(self, key: str, slot: str) -> None:
+        if not slot:
+            return
+        try:
+            await self._client.zrem(f"concurrency:{key}", slot)
+        except (aioredis.RedisError, OSError):
+            logger.warning("No se pudo liberar un hueco de concurrencia en Redis", exc_info=True)
+
+
+@lru_cache
+def get_backend():
+    if RATE_LIMIT_BACKEND == "off":
+        return None
+    if RATE_LIMIT_BACKEND == "redis":
+        return RedisBackend(RATE_LIMIT_REDIS_URL)
+    return MemoryBackend()
+
+
+async def _client_key(request: Request) -> str:
+    user = request.path_params.get("user_id") or request.query_params.get("email")
+    content_type = request.headers.get("content-type", "")
+    if user is None and content_type.startswith(("multipart/form-data", "application/x-www-form-urlencoded")):
+        # FastAPI ya leyó el formulario para el endpoint; aquí sale de la caché.
+        user = (await request.form()).get("email")
+    if isinstance(user, str) and user:
+        return f"user:{user.strip().lower()}"
+    return f"ip:{request.client.host if request.client else '-'}"
+
+
+def limit(name: str, rate: float, burst: int, concurrent: Optional[int] = None):
+    """
+    Dependencia que limita la ruta ``name`` a ``rate`` peticiones por segundo
+    (con ráfagas de ``burst``) y ``concurrent`` simultáneas por usuario.
+    """
+    override = os.getenv(f"RATE_LIMIT_{name.upper()}")
+    if override:
+        values = override.split(",")
+        rate, burst = float(values[0]), int(values[1])
+        if len(values) > 2:
+            concurrent = int(values[2])
+
+    async def dependency(request: Request):
+        backend = get_backend()
+        if backend is None:
+            yield
+            return
+        key = f"{name}:{await _client_key(request)}"
+        wait = await backend.take(key, rate, burst)
+        if wait > 0:
+            raise HTTPException(
+                status_code=429, detail="Too many requests", headers={"Retry-After": str(math.ceil(wait))}
+            )
+        if concurrent is None:
+            yield
+            return
+        slot = await backend.acquire(key, concurrent)
+        if slot is None:
+            raise HTTPException(
+                status_code=429, detail="Too many concurrent requests", headers={"Retry-After": "1"}
+            )
+        try:
+            yield
+        finally:
+            await backend.release(key, slot)
+
+    return dependency
@@ -0,0 +1,205 @@
+# app/rebalance.py
+"""
+Herramienta de administración de shards (ver app/sharding.py).
+
+    python -m app.rebalance init-ids         # rango de ids propio por shard
+    python -m app.rebalance plan             # usuarios fuera de su shard
+    python -m app.rebalance move [--limit N] # mueve esos usuarios
+
+Tras añadir una URL a SHARD_DATABASE_URLS (y migrar el shard nuevo con
+DATABASE_URL=<url> python -m app.migrate), ``plan`` lista los usuarios cuyo
+shard según el anillo ya no coincide con el del directorio y ``move`` los
+copia, cambia el directorio y borra los datos del shard de origen.
+"""
+
+import argparse
+import sys
+import time
+from typing import Optional, Tuple
+
+from sqlalchemy import delete, select, text, update
+from sqlmodel import Session, SQLModel
+
+from app import sharding
+from app.database import get_engine
+from app.models import Change, User, UserShard
+
+# Tablas con datos por usuario que viven en los shards: (tabla, columna usuario).
+USER_TABLES = (
+    ("income", "user_id"),
+    ("expenses", "user_id"),
+    ("savings", "user_id"),
+    ("investments", "user_id"),
+    ("expensegoals", "userid"),
+    ("savinggoals", "userid"),
+    ("investmentgoals", "userid"),
+    ("goal_status", "user_id"),
+    ("expense_stats", "user_id"),
+    ("expense_flags", "user_id"),
+    ("recurring_templates", "user_id"),
+    ("recurring_runs", "user_id"),
+    ("year_reports", "user_id"),
+)
+SEQUENCE_TABLES = ("income", "expenses", "savings", "investments", "recurring_templates")
+# El registro de cambios (app/changes.py) se copia aparte: en el destino sus
+# filas toman seq nuevos, en el mismo orden, porque cada base de datos tiene
+# su propio contador. Los cursores del origen dejan de valer (/changes y
+# /sync devuelven reset).
+CHANGES_COLUMNS = ("user_id", "entity", "key", "op", "data", "changed_at")
+
+
+def init_ids() -> None:
+    """Hace que el shard k genere ids a partir de k * ID_RANGE + 1."""
+    engines = sharding.get_shard_engines()
+    for index, shard_id in enumerate(sharding.SHARD_IDS):
+        start = index * sharding.ID_RANGE
+        if start == 0:
+            continue
+        engine = engines[shard_id]
+        with engine.begin() as conn:
+            for table in SEQUENCE_TABLES:
+                current = conn.execute(text(f"SELECT COALESCE(MAX(id), 0) FROM {table}")).scalar()
+                value = max(current, start)
+                if engine.dialect.name == "postgresql":
+                    conn.execute(
+                        text("SELECT setval(pg_get_serial_sequence(:table, 'id'), :value)"),
+                        {"table": table, "value": value},
+                    )
+                else:
+                    updated = conn.execute(
+                        text("UPDATE sqlite_sequence SET seq = :value WHERE name = :table AND seq < :value"),
+                        {"table": table, "value": value},
+                    ).rowcount
+                    exists = conn.execute(
+                        text("SELECT 1 FROM sqlite_sequence WHERE name = :table"), {"table": table}
+                    ).first()
+                    if not updated and not exists:
+                        conn.execute(
+                            text("INSERT INTO sqlite_sequence (name, seq) VALUES (:table, :value)"),
+                            {"table": table, "value": value},
+                        )
+        print(f"{shard_id}: ids desde {start + 1}")
+
+
+def plan() -> list:
+    """[(user_id, shard actual, shard según el anillo)] para los usuarios a mover."""
+    ring = sharding.get_ring()
+    with Session(get_engine()) as session:
+        placements = session.exec(select(UserShard.user_id, UserShard.shard)).all()
+    return [
+        (user_id, shard_id, ring.node_for(user_id))
+        for user_id, shard_id in placements
+        if ring.node_for(user_id) != shard_id
+    ]
+
+
+def _copy_rows(source_conn, target_conn, user_id: int) -> int:
+    """Sustituye en el destino las filas del usuario por las del origen."""
+    copied = 0
+    for table_name, user_column in USER_TABLES:
+        table = SQLModel.metadata.tables[table_name]
+        rows = source_conn.execute(select(table).where(table.c[user_column] == user_id)).mappings().all()
+        target_conn.execute(delete(table).where(table.c[user_column] == user_id))
+        if rows:
+            target_conn.execute(table.insert(), [dict(row) for row in rows])
+            copied += len(rows)
+    return copied
+
+
+def _copy_changes(source_conn, target_conn, user_id: int, after: Optional[int]) -> Tuple[int, int]:
+    """
+    Copia los cambios del usuario con seq del origen > ``after`` (todos, y
+    sustituyendo los del destino, si es None). Devuelve (filas copiadas,
+    último seq copiado del origen).
+    """
+    table = Change.__table__
+    statement = select(table.c.seq, *(table.c[name] for name in CHANGES_COLUMNS)).where(table.c.user_id == user_id)
+    if after is None:
+        target_conn.execute(delete(table).where(table.c.user_id == user_id))
+    else:
+        statement = statement.where(table.c.seq > after)
+    rows = source_conn.execute(statement.order_by(table.c.seq)).all()
+    if not rows:
+        return 0, after or 0
+    # Un INSERT con varias filas las numera en orden.
+    target_conn.execute(table.insert(), [dict(zip(CHANGES_COLUMNS, row[1:])) for row in rows])
+    return len(rows), rows[-1].seq
+
+
+def move_users(moves: list, wait_seconds: float) -> None:
+    """
+    Mueve un lote de usuarios en cuatro fases: copia, cambio de directorio,
+    espera a que caduque la caché de directorio de los workers (una sola vez
+    por lote) y nueva copia completa con lo escrito entretanto, y borrado
+    del origen.
+    """
+    engines = sharding.get_shard_engines()
+    copied = {}
+    copied_seq = {}
+
+    # 1) Copia inicial (idempotente: reemplaza lo que hubiera en destino).
+    for user_id, source, target in moves:
+        with Session(get_engine()) as session:
+            sharding.mirror_user(session.get(User, user_id), target)
+        with engines[source].connect() as source_conn, engines[target].begin() as target_conn:
+            _copy_rows(source_conn, target_conn, user_id)
+            copied[user_id], copied_seq[user_id] = _copy_changes(source_conn, target_conn, user_id, after=None)
+
+    # 2) El directorio apunta ya al destino.
+    with get_engine().begin() as conn:
+        for user_id, _, target in moves:
+            conn.execute(update(UserShard.__table__).where(UserShard.user_id == user_id).values(shard=target))
+    for user_id, _, _ in moves:
+        sharding.forget_placement(user_id)
+
+    # 3) Volver a copiar entero lo del usuario: en el origen se ha podido
+    #    insertar, editar o borrar antes de que los workers vieran el cambio
+    #    de directorio. Del registro de cambios basta con lo nuevo. Lo que
+    #    en esa ventana se escriba ya en el destino se sustituye: conviene
+    #    mover en horas de poca actividad.
+    time.sleep(wait_seconds)
+    for user_id, source, target in moves:
+        with engines[source].connect() as source_conn, engines[target].begin() as target_conn:
+            rows = _copy_rows(source_conn, target_conn, user_id)
+            changes, _ = _copy_changes(source_conn, target_conn, user_id, after=copied_seq[user_id])
+            copied[user_id] += rows + changes
+
+    # 4) Borrar el origen.
+    for user_id, source, target in moves:
+        with engines[source].begin() as conn:
+            for table_name, user_column in USER_TABLES:
+                table = SQLModel.metadata.tables[table_name]
+                conn.execute(delete(table).where(table.c[user_column] == user_id))
+            conn.execute(delete(Change.__table__).where(Change.user_id == user_id))
+            conn.execute(delete(User.__table__).where(User.id == user_id))
+        print(f"usuario {user_id}: {source} -> {target} ({copied[user_id]} filas)")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("init-ids")
+    sub.add_parser("plan")
+    move = sub.add_parser("move")
+    move.add_argument("--limit", type=int, default=None)
+    move.add_argument("--wait-seconds", type=float, default=sharding.DIRECTORY_TTL_SECONDS)
+    args = parser.parse_args()
+
+    if not sharding.SHARD_DATABASE_URLS:
+        print("SHARD_DATABASE_URLS no está definido")
+        return 1
+
+    if args.command == "init-ids":
+        init_ids()
+    elif args.command == "plan":
+        moves = plan()
+        for user_id, source, target in moves:
+            print(f"usuario {user_id}: {source} -> {target}")
+        print(f"{len(moves)} usuarios a mover")
+    else:
+        move_users(plan()[: args.limit], args.wait_seconds)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
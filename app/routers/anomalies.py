@@ -0,0 +1,91 @@
+# app/routers/anomalies.py
+"""Gastos marcados como anómalos para su categoría (ver app/anomalies.py)."""
+
+from datetime import date as pydate, datetime
+from typing import List, Optional
+
+from dateutil.relativedelta import relativedelta
+from fastapi import APIRouter, Depends, HTTPException, Query
+from pydantic import BaseModel
+from sqlalchemy import desc
+from sqlmodel import Session, select
+
+from app.database import get_read_session
+from app.models import User, Expense, ExpenseFlag
+from app.routers.dashboard import MAX_YEAR
+from app.routers.expense import ExpenseCategory
+
+router = APIRouter(
+    prefix="/anomalies",
+    tags=["anomalies"],
+)
+
+
+# ─── Modelos de respuesta ────────────────────────────────────────────────────────
+
+class AnomalyEntry(BaseModel):
+    expense_id: int
+    date: pydate
+    category: str
+    amount: float
+    median: float
+    mad: float
+    score: float
+    flagged_at: datetime
+
+
+class AnomalyResponse(BaseModel):
+    entries: List[AnomalyEntry]
+
+
+# ─── Ruta GET /anomalies/ ────────────────────────────────────────────────────────
+
+@router.get("/", response_model=AnomalyResponse)
+def get_anomalies(
+    *,
+    email: str = Query(..., description="Correo del usuario"),
+    year: Optional[int] = Query(None, ge=1, le=MAX_YEAR, description="Año (opcional, junto con 'month')"),
+    month: Optional[int] = Query(None, ge=1, le=12, description="Mes 1-12 (opcional, junto con 'year')"),
+    category: Optional[ExpenseCategory] = Query(None, description="Sólo esta categoría"),
+    limit: int = Query(100, ge=1, le=1000),
+    session: Session = Depends(get_read_session),
+):
+    """
+    Gastos muy por encima de lo habitual del usuario en su categoría, del más
+    reciente al más antiguo.
+
+    Ejemplo de llamada:
+      GET /anomalies/?email=usuario@correo.com&year=2024&month=5
+    """
+    user_id = session.exec(select(User.id).where(User.email == email)).one_or_none()
+    if user_id is None:
+        raise HTTPException(status_code=404, detail="Usuario no encontrado")
+
+    statement = (
+        select(ExpenseFlag, Expense.date)
+        .join(Expense, Expense.id == ExpenseFlag.expense_id)
+        .where(ExpenseFlag.user_id == user_id)
+    )
+    if year is not None and month is not None:
+        month_start = pydate(year, month, 1)
+        statement = statement.where(
+            Expense.date >= month_start,
+            Expense.date < month_start + relativedelta(months=1),
+        )
+    if category is not None:
+        statement = statement.where(ExpenseFlag.category == category.value)
+
+    rows = session.exec(statement.order_by(desc(Expense.date), desc(ExpenseFlag.expense_id)).limit(limit)).all()
+    return AnomalyResponse(entries=[
+        AnomalyEntry(
+            expense_id=flag.expense_id,
+            date=expense_date,
+            category=flag.category,
+            amount=float(flag.amount),
+            median=float(flag.median),
+            mad=float(flag.mad),
+            score=float(flag.score),
+            flagged_at=flag.flagged_at,
+        )
+        for flag, expense_date in rows
+    ])
@@ -0,0 +1,118 @@
+# app/routers/benchmarks.py
+"""
+Comparación anónima del gasto y el ahorro de un usuario con el resto.
+
+Lee las distribuciones precalculadas de cohort_sketches (app/jobs/cohorts.py),
+así que cada petición sólo consulta los totales del propio usuario.
+"""
+
+from datetime import date as pydate, datetime
+from typing import List, Literal, Optional
+
+from dateutil.relativedelta import relativedelta
+from fastapi import APIRouter, Depends, HTTPException, Query
+from pydantic import BaseModel
+from sqlmodel import Session, select
+
+from app import fx
+from app.database import get_read_session
+from app.jobs.cohorts import KINDS
+from app.models import User, CohortSketch
+from app.routers.dashboard import MAX_YEAR
+from app.sketch import TDigest
+
+router = APIRouter(
+    prefix="/benchmarks",
+    tags=["benchmarks"],
+)
+
+
+# ─── Modelos de respuesta ────────────────────────────────────────────────────────
+
+class CategoryBenchmark(BaseModel):
+    kind: str
+    category: str
+    user_value: float
+    # None si el usuario no tuvo movimientos en la categoría ese mes.
+    percentile: Optional[float]
+    p25: float
+    median: float
+    p75: float
+    user_count: int
+
+
+class BenchmarkResponse(BaseModel):
+    year: int
+    month: int
+    computed_at: Optional[datetime]
+    categories: List[CategoryBenchmark]
+
+
+# ─── Ruta GET /benchmarks/ ───────────────────────────────────────────────────────
+
+@router.get("/", response_model=BenchmarkResponse)
+def get_benchmarks(
+    *,
+    email: str = Query(..., description="Correo del usuario"),
+    year: Optional[int] = Query(None, ge=1, le=MAX_YEAR, description="Año (por defecto, el del mes anterior)"),
+    month: Optional[int] = Query(None, ge=1, le=12, description="Mes 1-12 (por defecto, el mes anterior)"),
+    kind: Optional[Literal["expense", "saving"]] = Query(None, description="Sólo gastos o sólo ahorros"),
+    session: Session = Depends(get_read_session),
+):
+    """
+    Percentil del total mensual del usuario en cada categoría frente a los
+    usuarios con movimientos en esa categoría, más la mediana y los cuartiles.
+
+    Ejemplo de llamada:
+      GET /benchmarks/?email=usuario@correo.com&year=2024&month=5&kind=expense
+    """
+    user_id = session.exec(select(User.id).where(User.email == email)).one_or_none()
+    if user_id is None:
+        raise HTTPException(status_code=404, detail="Usuario no encontrado")
+
+    # Por defecto el último mes completo, que es el que el job ya cerró.
+    if year is None or month is None:
+        previous = pydate.today().replace(day=1) - relativedelta(months=1)
+        year, month = previous.year, previous.month
+    month_start = pydate(year, month, 1)
+    next_month_start = month_start + relativedelta(months=1)
+
+    statement = select(CohortSketch).where(CohortSketch.month == month_start)
+    if kind is not None:
+        statement = statement.where(CohortSketch.kind == kind)
+    sketches = session.exec(statement.order_by(CohortSketch.kind, CohortSketch.category)).all()
+
+    # En EUR, como las distribuciones de app/jobs/cohorts.py.
+    user_totals = {}
+    for sketch_kind in {sketch.kind for sketch in sketches}:
+        Model, _ = KINDS[sketch_kind]
+        totals = fx.converted_totals(
+            session,
+            Model,
+            (Model.user_id == user_id, Model.date >= month_start, Model.date < next_month_start),
+            keys=(Model.category,),
+        )
+        for (category,), total in totals.items():
+            user_totals[(sketch_kind, category)] = total
+
+    categories = []
+    for sketch in sketches:
+        digest = TDigest.from_dict(sketch.sketch)
+        user_value = user_totals.get((sketch.kind, sketch.category))
+        categories.append(CategoryBenchmark(
+            kind=sketch.kind,
+            category=sketch.category,
+            user_value=round(user_value or 0.0, 2),
+            percentile=round(digest.cdf(user_value) * 100, 1) if user_value is not None else None,
+            p25=round(digest.quantile(0.25), 2),
+            median=round(digest.quantile(0.5), 2),
+            p75=round(digest.quantile(0.75), 2),
+            user_count=sketch.user_count,
+        ))
+
+    return BenchmarkResponse(
+        year=year,
+        month=month,
+        computed_at=max((sketch.computed_at for sketch in sketches), default=None),
+        categories=categories,
+    )
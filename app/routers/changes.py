@@ -0,0 +1,79 @@
+# app/routers/changes.py
+"""
+Cambios de movimientos y metas de un usuario desde un ``seq`` dado (ver
+app/changes.py), para sincronizar de forma incremental:
+
+    GET /changes/?email=usuario@correo.com&cursor=main:1234&limit=500
+
+El cliente guarda ``cursor`` y lo manda en la siguiente llamada; mientras
+``has_more`` sea true hay más cambios esperando. Las bajas llegan como
+``op="delete"`` con la última versión de la fila.
+
+El cursor es el de /sync: ``"{base de datos}:{seq}"``. Sin cursor, con uno
+inválido, de otra base de datos (el usuario se movió de shard y sus cambios
+tienen ahora los seq del shard nuevo) o por delante del último cambio (la
+base de datos se restauró), los cambios empiezan desde el principio con
+``reset: true``: el cliente descarta lo que tenía.
+"""
+
+from datetime import datetime
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from pydantic import BaseModel
+from sqlmodel import Session, select
+
+from app.changes import database_id, parse_cursor, read_changes
+from app.database import get_read_session
+from app.models import User
+
+router = APIRouter(
+    prefix="/changes",
+    tags=["changes"],
+)
+
+
+class ChangeEntry(BaseModel):
+    seq: int
+    entity: str
+    key: str
+    op: str
+    data: dict
+    changed_at: datetime
+
+
+class ChangesResponse(BaseModel):
+    changes: List[ChangeEntry]
+    cursor: str
+    reset: bool
+    has_more: bool
+
+
+@router.get("/", response_model=ChangesResponse)
+def list_changes(
+    *,
+    email: str = Query(..., description="Correo del usuario"),
+    cursor: Optional[str] = Query(None, description="Cursor de la respuesta anterior"),
+    limit: int = Query(500, ge=1, le=5000),
+    session: Session = Depends(get_read_session),
+):
+    user_id = session.exec(select(User.id).where(User.email == email)).one_or_none()
+    if user_id is None:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    database = database_id(user_id)
+    since = parse_cursor(session, cursor, database, user_id)
+    # Uno de más para saber si queda algo sin pedir otra página vacía.
+    rows = read_changes(session, since or 0, limit + 1, user_id=user_id)
+    page = rows[:limit]
+    return ChangesResponse(
+        changes=[
+            ChangeEntry(
+                seq=row.seq, entity=row.entity, key=row.key, op=row.op, data=row.data, changed_at=row.changed_at,
+            )
+            for row in page
+        ],
+        cursor=f"{database}:{page[-1].seq if page else since or 0}",
+        reset=since is None,
+        has_more=len(rows) > limit,
+    )
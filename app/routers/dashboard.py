@@ -1,14 +1,18 @@
 # app/routers/dashboard.py
 
+import asyncio
+import json
 from datetime import date as pydate
-from typing import Optional
+from typing import Dict, Optional
 
+import anyio
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy import func, extract
+from fastapi.responses import StreamingResponse
 from sqlmodel import Session, select
 from pydantic import BaseModel
 
-from app.database import get_session
+from app import fx, live, singleflight
+from app.database import get_read_session, new_session
 from app.models import (
     User,
     Income,
@@ -18,6 +22,8 @@ from app.models import (
     ExpenseGoal,
     SavingGoal,
     InvestmentGoal,
+    GoalStatus,
+    ExpenseFlag,
 )
 
 router = APIRouter(
@@ -26,21 +32,43 @@ router = APIRouter(
 )
 
 
+# El fin del rango de diciembre es el 1 de enero siguiente: con 9999 no
+# cabría en un date.
+MAX_YEAR = 9998
+
+
 def _get_year_month(target_date: pydate) -> (int, int):
     return target_date.year, target_date.month
 
 
+def _month_bounds(year: int, month: int) -> (pydate, pydate):
+    """
+    Rango [inicio, inicio del mes siguiente). Filtrar por rango sobre la
+    columna 'date' (en vez de extract()) permite usar índices y que Postgres
+    descarte particiones mensuales (partition pruning).
+    """
+    start = pydate(year, month, 1)
+    if month == 12:
+        return start, pydate(year + 1, 1, 1)
+    return start, pydate(year, month + 1, 1)
+
+
 @router.get("/", response_model=dict)
+@singleflight.coalesce("dashboard")
 def get_dashboard_data_by_query(
     *,
     email: str = Query(..., description="Correo del usuario"),
-    year: Optional[int] = Query(None, description="Año deseado (opcional)"),
-    month: Optional[int] = Query(None, description="Mes deseado (1-12, opcional)"),
-    session: Session = Depends(get_session),
+    year: Optional[int] = Query(None, ge=1, le=MAX_YEAR, description="Año deseado (opcional)"),
+    month: Optional[int] = Query(None, ge=1, le=12, description="Mes deseado (1-12, opcional)"),
+    anomalies: bool = Query(False, description="Añadir a cada gasto su marca de anomalía (o null)"),
+    currency: str = Query(fx.BASE_CURRENCY, description="Moneda en la que se muestran totales y distribuciones"),
+    session: Session = Depends(get_read_session),
 ):
     """
     Devuelve datos de finanzas para el usuario identificado por 'email' en el mes y año indicados.
     Si 'year' o 'month' no se proporcionan, usa el mes y año actuales.
+    Totales y distribuciones se convierten a 'currency'; cada movimiento se
+    lista en su moneda original y goalStatus se expresa en EUR.
 
     Ejemplo de llamada:
       GET /dashboard/?email=usuario@correo.com&year=2023&month=5
@@ -56,58 +84,27 @@ def get_dashboard_data_by_query(
     if year is None or month is None:
         today = pydate.today()
         year, month = _get_year_month(today)
+    month_start, next_month_start = _month_bounds(year, month)
+    if not fx.is_supported(session, currency):
+        raise HTTPException(status_code=422, detail=f"Unsupported currency: {currency}")
 
-    # 3) Ingreso mensual total
-    stmt_income = (
-        select(func.coalesce(func.sum(Income.amount), 0))
-        .where(
-            Income.user_id == user_id,
-            extract("year", Income.date) == year,
-            extract("month", Income.date) == month,
-        )
-    )
-    income_total = session.exec(stmt_income).one()
-
-    # 4) Gasto mensual total
-    stmt_expense = (
-        select(func.coalesce(func.sum(Expense.amount), 0))
-        .where(
-            Expense.user_id == user_id,
-            extract("year", Expense.date) == year,
-            extract("month", Expense.date) == month,
-        )
-    )
-    expense_total = session.exec(stmt_expense).one()
+    def month_filter(Model):
+        return (Model.user_id == user_id, Model.date >= month_start, Model.date < next_month_start)
 
-    # 5) Ahorro mensual total
-    stmt_saving = (
-        select(func.coalesce(func.sum(Saving.amount), 0))
-        .where(
-            Saving.user_id == user_id,
-            extract("year", Saving.date) == year,
-            extract("month", Saving.date) == month,
-        )
-    )
-    saving_total = session.exec(stmt_saving).one()
-
-    # 6) Inversión mensual total
-    stmt_invest = (
-        select(func.coalesce(func.sum(Investment.amount), 0))
-        .where(
-            Investment.user_id == user_id,
-            extract("year", Investment.date) == year,
-            extract("month", Investment.date) == month,
-        )
-    )
-    investment_total = session.exec(stmt_invest).one()
+    # 3-6) Totales mensuales de ingresos, gastos, ahorros e inversiones,
+    # convertidos a 'currency' (app/fx.py)
+    income_total = fx.converted_totals(session, Income, month_filter(Income), target=currency)[()]
+    expense_total = fx.converted_totals(session, Expense, month_filter(Expense), target=currency)[()]
+    saving_total = fx.converted_totals(session, Saving, month_filter(Saving), target=currency)[()]
+    investment_total = fx.converted_totals(session, Investment, month_filter(Investment), target=currency)[()]
 
     # 7) Porcentaje meta de gasto
     stmt_expense_goal = (
         select(ExpenseGoal.value)
         .where(
             ExpenseGoal.user_id == user_id,
-            extract("year", ExpenseGoal.date) == year,
-            extract("month", ExpenseGoal.date) == month,
+            ExpenseGoal.date >= month_start,
+            ExpenseGoal.date < next_month_start,
         )
     )
     result_expense_goal = session.exec(stmt_expense_goal).one_or_none()
@@ -118,8 +115,8 @@ def get_dashboard_data_by_query(
         select(SavingGoal.value)
         .where(
             SavingGoal.user_id == user_id,
-            extract("year", SavingGoal.date) == year,
-            extract("month", SavingGoal.date) == month,
+            SavingGoal.date >= month_start,
+            SavingGoal.date < next_month_start,
         )
     )
     result_saving_goal = session.exec(stmt_saving_goal).one_or_none()
@@ -130,40 +127,73 @@ def get_dashboard_data_by_query(
         select(InvestmentGoal.value)
         .where(
             InvestmentGoal.user_id == user_id,
-            extract("year", InvestmentGoal.date) == year,
-            extract("month", InvestmentGoal.date) == month,
+            InvestmentGoal.date >= month_start,
+            InvestmentGoal.date < next_month_start,
         )
     )
     result_invest_goal = session.exec(stmt_invest_goal).one_or_none()
     investment_goal_percent = float(result_invest_goal) if result_invest_goal else 0.0
 
+    # 9b) Estado precalculado de las metas del mes (app/goal_status.py)
+    stmt_goal_status = (
+        select(GoalStatus)
+        .where(
+            GoalStatus.user_id == user_id,
+            GoalStatus.month == month_start,
+        )
+    )
+    goal_status = {
+        row.goal_type: {
+            "goalValue": float(row.goal_value),
+            "actualValue": float(row.actual_value),
+            "met": row.met,
+        }
+        for row in session.exec(stmt_goal_status).all()
+    }
+
     # 10) Listado de gastos individuales
     stmt_expenses_list = (
         select(Expense)
         .where(
             Expense.user_id == user_id,
-            extract("year", Expense.date) == year,
-            extract("month", Expense.date) == month,
+            Expense.date >= month_start,
+            Expense.date < next_month_start,
         )
     )
     expenses_rows = session.exec(stmt_expenses_list).all()
     expenses_list = [
-        {"id": e.id, "date": e.date.isoformat(), "amount": float(e.amount), "category": e.category} # Añadir "id": e.id
+        {"id": e.id, "date": e.date.isoformat(), "amount": float(e.amount), "currency": e.currency, "category": e.category, "notes": e.notes} # Añadir "id": e.id
         for e in expenses_rows
     ]
 
+    # 10b) Marca de anomalía de cada gasto (app/anomalies.py), si se pide
+    if anomalies:
+        stmt_flags = (
+            select(ExpenseFlag)
+            .where(
+                ExpenseFlag.user_id == user_id,
+                ExpenseFlag.expense_id.in_([e.id for e in expenses_rows]),
+            )
+        )
+        flags = {flag.expense_id: flag for flag in session.exec(stmt_flags).all()}
+        for row in expenses_list:
+            flag = flags.get(row["id"])
+            row["anomaly"] = (
+                {"score": float(flag.score), "median": float(flag.median)} if flag else None
+            )
+
     # 11) Listado de ahorros individuales
     stmt_savings_list = (
         select(Saving)
         .where(
             Saving.user_id == user_id,
-            extract("year", Saving.date) == year,
-            extract("month", Saving.date) == month,
+            Saving.date >= month_start,
+            Saving.date < next_month_start,
         )
     )
     savings_rows = session.exec(stmt_savings_list).all()
     savings_list = [
-        {"id": s.id, "date": s.date.isoformat(), "amount": float(s.amount), "category": s.category} # Añadir "id": s.id
+        {"id": s.id, "date": s.date.isoformat(), "amount": float(s.amount), "currency": s.currency, "category": s.category, "notes": s.notes} # Añadir "id": s.id
         for s in savings_rows
     ]
 
@@ -173,73 +203,44 @@ def get_dashboard_data_by_query(
         select(Investment)
         .where(
             Investment.user_id == user_id,
-            extract("year", Investment.date) == year,
-            extract("month", Investment.date) == month,
+            Investment.date >= month_start,
+            Investment.date < next_month_start,
         )
     )
     investments_rows = session.exec(stmt_investments_list).all()
     investments_list = [
-        {"id": i.id, "date": i.date.isoformat(), "amount": float(i.amount), "category": i.category} # Añadir "id": i.id
+        {"id": i.id, "date": i.date.isoformat(), "amount": float(i.amount), "currency": i.currency, "category": i.category, "notes": i.notes} # Añadir "id": i.id
         for i in investments_rows
     ]
 
 
     # 13) Distribución de gastos por categoría
-    stmt_cat_expenses = (
-        select(
-            Expense.category,
-            func.coalesce(func.sum(Expense.amount), 0).label("total"),
-        )
-        .where(
-            Expense.user_id == user_id,
-            extract("year", Expense.date) == year,
-            extract("month", Expense.date) == month,
-        )
-        .group_by(Expense.category)
-    )
-    cat_expenses_rows = session.exec(stmt_cat_expenses).all()
     category_expenses = [
-        {"category": row.category, "total": float(row.total)} for row in cat_expenses_rows
+        {"category": category, "total": total}
+        for (category,), total in fx.converted_totals(
+            session, Expense, month_filter(Expense), keys=(Expense.category,), target=currency
+        ).items()
     ]
 
     # 14) Distribución de ahorros por categoría
-    stmt_cat_savings = (
-        select(
-            Saving.category,
-            func.coalesce(func.sum(Saving.amount), 0).label("total"),
-        )
-        .where(
-            Saving.user_id == user_id,
-            extract("year", Saving.date) == year,
-            extract("month", Saving.date) == month,
-        )
-        .group_by(Saving.category)
-    )
-    cat_savings_rows = session.exec(stmt_cat_savings).all()
     category_savings = [
-        {"category": row.category, "total": float(row.total)} for row in cat_savings_rows
+        {"category": category, "total": total}
+        for (category,), total in fx.converted_totals(
+            session, Saving, month_filter(Saving), keys=(Saving.category,), target=currency
+        ).items()
     ]
 
     # 15) Distribución de inversiones por categoría
-    stmt_cat_invests = (
-        select(
-            Investment.category,
-            func.coalesce(func.sum(Investment.amount), 0).label("total"),
-        )
-        .where(
-            Investment.user_id == user_id,
-            extract("year", Investment.date) == year,
-            extract("month", Investment.date) == month,
-        )
-        .group_by(Investment.category)
-    )
-    cat_invests_rows = session.exec(stmt_cat_invests).all()
     category_investments = [
-        {"category": row.category, "total": float(row.total)} for row in cat_invests_rows
+        {"category": category, "total": total}
+        for (category,), total in fx.converted_totals(
+            session, Investment, month_filter(Investment), keys=(Investment.category,), target=currency
+        ).items()
     ]
 
     # 16) Armar payload final
     dashboard_payload = {
+        "currency": currency,
         "incomeTotal": float(income_total),
         "expenseTotal": float(expense_total),
         "savingTotal": float(saving_total),
@@ -247,6 +248,7 @@ def get_dashboard_data_by_query(
         "expenseGoalPercent": expense_goal_percent,
         "savingGoalPercent": saving_goal_percent,
         "investmentGoalPercent": investment_goal_percent,
+        "goalStatus": goal_status,
         "expenses": expenses_list,
         "savings": savings_list,
         "investments": investments_list,
@@ -257,3 +259,170 @@ def get_dashboard_data_by_query(
 
     return dashboard_payload
 
+
+
+# ─── Ruta GET /dashboard/stream (SSE) ───────────────────────────────────────────
+
+STREAM_LEDGERS = {
+    "income": Income,
+    "expenses": Expense,
+    "savings": Saving,
+    "investments": Investment,
+}
+# Intervalo de comentarios keep-alive para que proxies y balanceadores no
+# cierren la conexión inactiva.
+KEEPALIVE_SECONDS = 15
+# Espera tras el primer aviso para juntar los que llegan del mismo commit.
+COALESCE_SECONDS = 0.05
+
+
+def _month_totals(session: Session, user_id: int, month_start: pydate, next_month_start: pydate, currency: str) -> dict:
+    totals = {}
+    for key, Model in (
+        ("incomeTotal", Income),
+        ("expenseTotal", Expense),
+        ("savingTotal", Saving),
+        ("investmentTotal", Investment),
+    ):
+        totals[key] = fx.converted_totals(
+            session,
+            Model,
+            (Model.user_id == user_id, Model.date >= month_start, Model.date < next_month_start),
+            target=currency,
+        )[()]
+    totals["goalStatus"] = {
+        row.goal_type: {
+            "goalValue": float(row.goal_value),
+            "actualValue": float(row.actual_value),
+            "met": row.met,
+        }
+        for row in session.exec(
+            select(GoalStatus).where(GoalStatus.user_id == user_id, GoalStatus.month == month_start)
+        ).all()
+    }
+    return totals
+
+
+def _row_changes(session: Session, user_id: int, rows: Dict[str, list], month_start: pydate, next_month_start: pydate) -> dict:
+    """Filas cambiadas del mes (con el formato de /dashboard/) y ids a quitar."""
+    upserted, deleted = {}, {}
+    for ledger, ids in rows.items():
+        Model = STREAM_LEDGERS[ledger]
+        ids = sorted(ids)
+        current = session.exec(select(Model).where(Model.user_id == user_id, Model.id.in_(ids))).all()
+        in_month = [row for row in current if month_start <= row.date < next_month_start]
+        if in_month:
+            upserted[ledger] = [
+                {
+                    "id": row.id,
+                    "date": row.date.isoformat(),
+                    "amount": float(row.amount),
+                    "currency": row.currency,
+                    **({"category": row.category, "notes": row.notes} if ledger != "income" else {}),
+                }
+                for row in in_month
+            ]
+        # Borradas o movidas a otro mes.
+        gone = set(ids) - {row.id for row in in_month}
+        if gone:
+            deleted[ledger] = sorted(gone)
+    return {"upserted": upserted, "deleted": deleted}
+
+
+def _compute_update(user_id: int, rows: Optional[dict], month_start: pydate, next_month_start: pydate, currency: str):
+    # Sesión corta en el primario: el aviso llega justo tras el commit y una
+    # réplica podría no tenerlo todavía.
+    with new_session() as session:
+        changes = _row_changes(session, user_id, rows, month_start, next_month_start) if rows else None
+        return changes, _month_totals(session, user_id, month_start, next_month_start, currency)
+
+
+def _lookup_user(email: str, currency: str) -> Optional[int]:
+    with new_session() as session:
+        user_id = session.exec(select(User.id).where(User.email == email)).one_or_none()
+        if user_id is not None and not fx.is_supported(session, currency):
+            raise HTTPException(status_code=422, detail=f"Unsupported currency: {currency}")
+        return user_id
+
+
+def _sse(event: str, data: dict, event_id: int) -> str:
+    return f"id: {event_id}\nevent: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+def _merge_rows(pending: Optional[dict], rows: Optional[dict]) -> Optional[dict]:
+    if pending is None or rows is None:
+        return None
+    for ledger, ids in rows.items():
+        pending.setdefault(ledger, set()).update(ids)
+    return pending
+
+
+@router.get("/stream")
+async def stream_dashboard(
+    *,
+    email: str = Query(..., description="Correo del usuario"),
+    year: Optional[int] = Query(None, ge=1, le=MAX_YEAR, description="Año (por defecto, el actual)"),
+    month: Optional[int] = Query(None, ge=1, le=12, description="Mes 1-12 (por defecto, el actual)"),
+    currency: str = Query(fx.BASE_CURRENCY, description="Moneda de los totales"),
+):
+    """
+    Server-sent events con los cambios del mes indicado, en vez de consultar
+    /dashboard/ periódicamente. Eventos:
+
+    - ``totals``: totales del mes y goalStatus; al conectar y cada vez que cambian.
+    - ``delta``: {"upserted": {"expenses": [filas], ...}, "deleted": {"expenses": [ids], ...}}
+      con el mismo formato de fila que /dashboard/.
+    - ``refresh``: demasiados cambios a la vez (p. ej. una importación grande);
+      el cliente debe volver a pedir /dashboard/.
+
+    Ejemplo de llamada:
+      GET /dashboard/stream?email=usuario@correo.com&year=2024&month=5
+    """
+    user_id = await anyio.to_thread.run_sync(_lookup_user, email, currency)
+    if user_id is None:
+        raise HTTPException(status_code=404, detail="Usuario no encontrado")
+    if year is None or month is None:
+        year, month = _get_year_month(pydate.today())
+    month_start, next_month_start = _month_bounds(year, month)
+
+    async def events():
+        subscription = live.subscribe(user_id)
+        event_id = 0
+        try:
+            yield "retry: 3000\n\n"
+            _, totals = await anyio.to_thread.run_sync(_compute_update, user_id, {}, month_start, next_month_start, currency)
+            event_id += 1
+            yield _sse("totals", totals, event_id)
+
+            while True:
+                try:
+                    rows = await asyncio.wait_for(subscription.queue.get(), KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                await asyncio.sleep(COALESCE_SECONDS)
+                pending = _merge_rows({}, rows)
+                while not subscription.queue.empty():
+                    pending = _merge_rows(pending, subscription.queue.get_nowait())
+
+                changes, new_totals = await anyio.to_thread.run_sync(
+                    _compute_update, user_id, pending, month_start, next_month_start, currency
+                )
+                if pending is None:
+                    event_id += 1
+                    yield _sse("refresh", {}, event_id)
+                elif changes and (changes["upserted"] or changes["deleted"]):
+                    event_id += 1
+                    yield _sse("delta", changes, event_id)
+                if new_totals != totals:
+                    totals = new_totals
+                    event_id += 1
+                    yield _sse("totals", totals, event_id)
+        finally:
+            live.unsubscribe(subscription)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,11 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlmodel import Session
-from pydantic import BaseModel, validator
+from pydantic import BaseModel, Field, validator
 from decimal import Decimal
 from datetime import date as pydate, datetime
 from enum import Enum
 from typing import Optional
 
+from app import fx
 from app.database import get_session
 from app.models import Expense, User
 
@@ -24,11 +25,15 @@ class ExpenseCreate(BaseModel):
     date: pydate
     amount: Decimal
     category: ExpenseCategory
+    currency: str = fx.BASE_CURRENCY
+    notes: Optional[str] = Field(None, max_length=500)
 
 class ExpenseUpdate(BaseModel):
     date: Optional[pydate] = None
     amount: Optional[Decimal] = None
     category: Optional[ExpenseCategory] = None
+    currency: Optional[str] = None
+    notes: Optional[str] = Field(None, max_length=500)
 
     @validator('amount')
     def amount_must_be_positive(cls, v):
@@ -53,6 +58,9 @@ def create_expense(expense_in: ExpenseCreate, session: Session = Depends(get_ses
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
     
+    if not fx.is_supported(session, expense_in.currency):
+        raise HTTPException(status_code=422, detail=f"Unsupported currency: {expense_in.currency}")
+
     db_expense = Expense.from_orm(expense_in)
     session.add(db_expense)
     session.commit()
@@ -68,6 +76,8 @@ def update_expense(expense_id: int, expense_in: ExpenseUpdate, session: Session
     
     # El modelo Pydantic ya maneja la conversión de la fecha, por lo que el bucle se simplifica.
     expense_data = expense_in.dict(exclude_unset=True)
+    if "currency" in expense_data and not fx.is_supported(session, expense_data["currency"]):
+        raise HTTPException(status_code=422, detail=f"Unsupported currency: {expense_data['currency']}")
     for key, value in expense_data.items():
         setattr(db_expense, key, value)
 
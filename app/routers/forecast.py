@@ -0,0 +1,263 @@
+# app/routers/forecast.py
+"""
+Proyección de flujo de caja sobre los totales mensuales de history.py.
+
+Modelos (vectorizados con NumPy sobre las cuatro series a la vez):
+- seasonal_naive: repite el mismo mes del año anterior.
+- exponential_smoothing: suavizado exponencial simple; el alpha de cada serie
+  se elige minimizando el error a un paso sobre una rejilla de valores.
+- linear_trend: recta por mínimos cuadrados, sin bajar de cero.
+
+Las series empiezan en el primer mes con movimientos del usuario (no en el
+principio de ``history``): los meses anteriores no son ceros, son meses sin
+datos. Con menos meses de los que necesita el modelo (12 para
+seasonal_naive, 2 para linear_trend) se proyecta la media.
+
+Los resultados se cachean por usuario y se invalidan en cuanto ese usuario
+escribe algo (app/signals.py), así que el dashboard puede llamarlo en cada carga.
+"""
+
+import threading
+import time
+from datetime import date as pydate
+from typing import Dict, List, Literal, Optional
+
+import numpy as np
+from dateutil.relativedelta import relativedelta
+from fastapi import APIRouter, Depends, HTTPException, Query
+from pydantic import BaseModel
+from sqlalchemy import desc
+from sqlmodel import Session, select
+
+from app import signals
+from app.database import get_read_session
+from app.goal_status import GOAL_TYPES
+from app.models import User, Income, Expense, Saving, Investment
+from app.routers.history import monthly_totals
+
+router = APIRouter(
+    prefix="/forecast",
+    tags=["forecast"],
+)
+
+SERIES = (
+    ("income", Income),
+    ("expenses", Expense),
+    ("savings", Saving),
+    ("investments", Investment),
+)
+# Serie real con la que se compara cada tipo de meta.
+GOAL_SERIES = {"expense": "expenses", "saving": "savings", "investment": "investments"}
+
+ALPHAS = np.linspace(0.05, 0.95, 19)
+
+
+# ─── Modelos de respuesta ────────────────────────────────────────────────────────
+
+class ForecastEntry(BaseModel):
+    year: int
+    month: int
+    income: float
+    expenses: float
+    savings: float
+    investments: float
+
+
+class GoalProjection(BaseModel):
+    year: int
+    month: int
+    goal_type: str
+    goal_percentage: float
+    goal_value: float
+    projected_value: float
+    met: bool
+
+
+class ForecastResponse(BaseModel):
+    model: str
+    history_months: int
+    entries: List[ForecastEntry]
+    goals: List[GoalProjection]
+
+
+# ─── Modelos de proyección ───────────────────────────────────────────────────────
+
+def mean_forecast(series: np.ndarray, horizon: int) -> np.ndarray:
+    n_series, length = series.shape
+    if length == 0:
+        return np.zeros((n_series, horizon))
+    return np.repeat(series.mean(axis=1, keepdims=True), horizon, axis=1)
+
+
+def seasonal_naive(series: np.ndarray, horizon: int) -> np.ndarray:
+    length = series.shape[1]
+    if length < 12:
+        return mean_forecast(series, horizon)
+    steps = np.arange(horizon)
+    return series[:, length - 12 + steps % 12]
+
+
+def exponential_smoothing(series: np.ndarray, horizon: int) -> np.ndarray:
+    n_series, length = series.shape
+    if length == 0:
+        return np.zeros((n_series, horizon))
+    # level[s, a]: nivel de la serie s con el alpha a; se recorren los meses
+    # una sola vez para todas las series y todos los alphas.
+    level = np.repeat(series[:, :1], len(ALPHAS), axis=1)
+    sse = np.zeros_like(level)
+    for t in range(1, length):
+        error = series[:, t:t + 1] - level
+        sse += error ** 2
+        level = level + ALPHAS * error
+    best = np.argmin(sse, axis=1)
+    final_level = level[np.arange(n_series), best]
+    return np.repeat(final_level[:, None], horizon, axis=1)
+
+
+def linear_trend(series: np.ndarray, horizon: int) -> np.ndarray:
+    n_series, length = series.shape
+    if length < 2:
+        return mean_forecast(series, horizon)
+    slope, intercept = np.polyfit(np.arange(length), series.T, 1)
+    future = np.arange(length, length + horizon)[:, None]
+    return np.clip(intercept + slope * future, 0, None).T
+
+
+MODELS = {
+    "seasonal_naive": seasonal_naive,
+    "exponential_smoothing": exponential_smoothing,
+    "linear_trend": linear_trend,
+}
+
+
+# ─── Caché por usuario ───────────────────────────────────────────────────────────
+
+CACHE_TTL_SECONDS = 600
+CACHE_MAX_ENTRIES = 10_000
+
+_cache: Dict[tuple, tuple] = {}
+# Contador de escrituras por usuario: evita guardar un resultado calculado
+# antes de una escritura que se confirmó mientras se calculaba.
+_generations: Dict[int, int] = {}
+_cache_lock = threading.Lock()
+
+
+@signals.on_commit
+def _invalidate_cache(user_ids):
+    with _cache_lock:
+        for user_id in user_ids:
+            _generations[user_id] = _generations.get(user_id, 0) + 1
+        for key in [key for key in _cache if key[0] in user_ids]:
+            del _cache[key]
+
+
+def _cache_get(key: tuple) -> Optional[ForecastResponse]:
+    cached = _cache.get(key)
+    if cached is None or time.monotonic() - cached[0] > CACHE_TTL_SECONDS:
+        return None
+    return cached[1]
+
+
+def _cache_put(key: tuple, value: ForecastResponse, generation: int) -> None:
+    with _cache_lock:
+        if _generations.get(key[0], 0) != generation:
+            return
+        if len(_cache) >= CACHE_MAX_ENTRIES:
+            _cache.clear()
+        _cache[key] = (time.monotonic(), value)
+
+
+# ─── Cálculo ─────────────────────────────────────────────────────────────────────
+
+def _monthly_matrix(session: Session, user_id: int, start: pydate, end: pydate) -> np.ndarray:
+    """
+    Matriz (4 series x meses) desde el primer mes con movimientos, con ceros
+    en los meses sin movimientos a partir de ahí.
+    """
+    n_months = (end.year - start.year) * 12 + end.month - start.month
+    matrix = np.zeros((len(SERIES), n_months))
+    for row_index, (_, Model) in enumerate(SERIES):
+        for r in monthly_totals(session, Model, user_id, start):
+            offset = (int(r.year) - start.year) * 12 + int(r.month) - start.month
+            if 0 <= offset < n_months:
+                matrix[row_index, offset] = float(r.total)
+    active = np.flatnonzero(matrix.any(axis=0))
+    return matrix[:, active[0]:] if active.size else matrix[:, :0]
+
+
+def _current_goal_percentages(session: Session, user_id: int) -> Dict[str, float]:
+    percentages = {}
+    for goal_type, (GoalModel, _) in GOAL_TYPES.items():
+        value = session.exec(
+            select(GoalModel.value)
+            .where(GoalModel.user_id == user_id)
+            .order_by(desc(GoalModel.date))
+        ).first()
+        if value is not None:
+            percentages[goal_type] = float(value)
+    return percentages
+
+
+def compute_forecast(session: Session, user_id: int, horizon: int, model: str, history_months: int) -> ForecastResponse:
+    current_month = pydate.today().replace(day=1)
+    start = current_month - relativedelta(months=history_months)
+    # Sólo meses completos: el mes en curso es el primero que se proyecta.
+    history = _monthly_matrix(session, user_id, start, current_month)
+    projected = np.round(MODELS[model](history, horizon), 2)
+
+    months = [current_month + relativedelta(months=i) for i in range(horizon)]
+    by_name = {name: projected[i] for i, (name, _) in enumerate(SERIES)}
+    entries = [
+        ForecastEntry(
+            year=month.year,
+            month=month.month,
+            **{name: float(values[i]) for name, values in by_name.items()},
+        )
+        for i, month in enumerate(months)
+    ]
+
+    goals = []
+    for goal_type, percentage in _current_goal_percentages(session, user_id).items():
+        goal_values = np.round(by_name["income"] * percentage / 100, 2)
+        actual_values = by_name[GOAL_SERIES[goal_type]]
+        for i, month in enumerate(months):
+            goals.append(GoalProjection(
+                year=month.year,
+                month=month.month,
+                goal_type=goal_type,
+                goal_percentage=percentage,
+                goal_value=float(goal_values[i]),
+                projected_value=float(actual_values[i]),
+                met=bool(actual_values[i] >= goal_values[i]),
+            ))
+
+    return ForecastResponse(model=model, history_months=history_months, entries=entries, goals=goals)
+
+
+# ─── Ruta GET /forecast/ ─────────────────────────────────────────────────────────
+
+@router.get("/", response_model=ForecastResponse)
+def get_forecast(
+    *,
+    email: str = Query(..., description="Correo del usuario"),
+    horizon: int = Query(6, ge=1, le=24, description="Meses a proyectar (1-24)"),
+    model: Literal["seasonal_naive", "exponential_smoothing", "linear_trend"] = Query(
+        "exponential_smoothing",
+        description="Modelo de proyección",
+    ),
+    history: int = Query(36, ge=1, le=60, description="Meses de histórico usados para ajustar el modelo"),
+    session: Session = Depends(get_read_session),
+):
+    user_id = session.exec(select(User.id).where(User.email == email)).one_or_none()
+    if user_id is None:
+        raise HTTPException(status_code=404, detail="Usuario no encontrado")
+
+    key = (user_id, horizon, model, history)
+    cached = _cache_get(key)
+    if cached is not None:
+        return cached
+
+    generation = _generations.get(user_id, 0)
+    result = compute_forecast(session, user_id, horizon, model, history)
+    _cache_put(key, result, generation)
+    return result
@@ -1,22 +1,21 @@
 from datetime import date as pydate
 from dateutil.relativedelta import relativedelta
-from typing import List, Literal, Union
+from typing import List, Literal, NamedTuple, Union
 
 from fastapi import APIRouter, Depends, HTTPException, Query
 from pydantic import BaseModel
-from sqlalchemy import func, extract
+from sqlalchemy import extract
 from sqlmodel import Session, select
 
-from app.database import get_session
+from app import analytics, fx, ratelimit, singleflight
+from app.database import get_read_session
 from app.models import (
     User,
     Income,
     Expense,
     Saving,
     Investment,
-    ExpenseGoal,
-    SavingGoal,
-    InvestmentGoal,
+    GoalStatus,
 )
 
 router = APIRouter(
@@ -37,6 +36,7 @@ class SimpleHistoryResponse(BaseModel):
     entries: List[SimpleHistoryEntry]
     total_sum: float
     average: float
+    currency: str = fx.BASE_CURRENCY
 
 
 class GoalHistoryEntry(BaseModel):
@@ -61,12 +61,35 @@ def _compute_start_date(period_months):
     return pydate(year=start.year, month=start.month, day=1)
 
 
+class MonthTotal(NamedTuple):
+    year: int
+    month: int
+    total: float
+
+
+def monthly_totals(session: Session, Model, user_id: int, start_date: pydate, currency: str = fx.BASE_CURRENCY):
+    """Totales mensuales (year, month, total) de un usuario desde start_date, en ``currency``."""
+    if analytics.enabled():
+        totals = analytics.converted_totals(session, Model, user_id, start_date, by=("year", "month"), target=currency)
+        return sorted(MonthTotal(int(year), int(month), total) for (year, month), total in totals.items())
+    totals = fx.converted_totals(
+        session,
+        Model,
+        (Model.user_id == user_id, Model.date >= start_date),
+        keys=(extract("year", Model.date), extract("month", Model.date)),
+        target=currency,
+    )
+    return sorted(MonthTotal(int(year), int(month), total) for (year, month), total in totals.items())
+
+
 # ─── Ruta GET /history/ ──────────────────────────────────────────────────────────
 
 @router.get(
     "/",
-    response_model=Union[SimpleHistoryResponse, GoalHistoryResponse]
+    response_model=Union[SimpleHistoryResponse, GoalHistoryResponse],
+    dependencies=[Depends(ratelimit.limit("history", rate=1, burst=10, concurrent=2))],
 )
+@singleflight.coalesce("history")
 def get_history(
     *,
     email: str = Query(..., description="Correo del usuario"),
@@ -82,14 +105,19 @@ def get_history(
         description="Tipo de datos: 'income', 'expenses', 'savings', 'investments', "
                     "'expense_goals', 'saving_goals' o 'investment_goals'."
     ),
-    session: Session = Depends(get_session),
+    currency: str = Query(fx.BASE_CURRENCY, description="Moneda de los totales (sólo movimientos)"),
+    session: Session = Depends(get_read_session),
 ):
     stmt_user = select(User).where(User.email == email)
     user = session.exec(stmt_user).one_or_none()
     if not user:
         raise HTTPException(status_code=404, detail="Usuario no encontrado")
     user_id = user.id
+    if not fx.is_supported(session, currency):
+        raise HTTPException(status_code=422, detail=f"Unsupported currency: {currency}")
 
+    # Filtrar con 'date >= start_date' (y no con extract()) permite que Postgres
+    # descarte las particiones mensuales anteriores al periodo.
     start_date: pydate = _compute_start_date(period)
 
     if data_type in {"income", "expenses", "savings", "investments"}:
@@ -101,26 +129,7 @@ def get_history(
         }
         Model = model_map[data_type]
 
-        stmt = (
-            select(
-                extract("year", Model.date).label("year"),
-                extract("month", Model.date).label("month"),
-                func.coalesce(func.sum(Model.amount), 0).label("total"),
-            )
-            .where(
-                Model.user_id == user_id,
-                Model.date >= start_date
-            )
-            .group_by(
-                extract("year", Model.date),
-                extract("month", Model.date)
-            )
-            .order_by(
-                extract("year", Model.date),
-                extract("month", Model.date)
-            )
-        )
-        rows = session.exec(stmt).all()
+        rows = monthly_totals(session, Model, user_id, start_date, currency)
 
         entries = [
             SimpleHistoryEntry(
@@ -141,82 +150,41 @@ def get_history(
         return SimpleHistoryResponse(
             entries=entries,
             total_sum=total_sum,
-            average=average
+            average=average,
+            currency=currency,
         )
 
     else:
-        goal_map = {
-            "expense_goals": (ExpenseGoal, Expense),
-            "saving_goals": (SavingGoal, Saving),
-            "investment_goals": (InvestmentGoal, Investment),
-        }
-        GoalModel, ActualModel = goal_map[data_type]
-
-        stmt_goals = (
-            select(
-                extract("year", GoalModel.date).label("year"),
-                extract("month", GoalModel.date).label("month"),
-                GoalModel.value.label("goal_percentage"),
-            )
+        goal_type = {
+            "expense_goals": "expense",
+            "saving_goals": "saving",
+            "investment_goals": "investment",
+        }[data_type]
+
+        # goal_status se mantiene al día en cada escritura (app/goal_status.py),
+        # así que aquí basta con leer el estado guardado.
+        stmt_status = (
+            select(GoalStatus)
             .where(
-                GoalModel.user_id == user_id,
-                GoalModel.date >= start_date
+                GoalStatus.user_id == user_id,
+                GoalStatus.goal_type == goal_type,
+                GoalStatus.month >= start_date
             )
-            .order_by(extract("year", GoalModel.date), extract("month", GoalModel.date))
+            .order_by(GoalStatus.month)
         )
-        goals_rows = session.exec(stmt_goals).all()
+        status_rows = session.exec(stmt_status).all()
 
-        stmt_incomes = (
-            select(
-                extract("year", Income.date).label("year"),
-                extract("month", Income.date).label("month"),
-                func.coalesce(func.sum(Income.amount), 0).label("income"),
-            )
-            .where(
-                Income.user_id == user_id,
-                Income.date >= start_date
-            )
-            .group_by(extract("year", Income.date), extract("month", Income.date))
-        )
-        income_rows = session.exec(stmt_incomes).all()
-
-        stmt_actuals = (
-            select(
-                extract("year", ActualModel.date).label("year"),
-                extract("month", ActualModel.date).label("month"),
-                func.coalesce(func.sum(ActualModel.amount), 0).label("actual_sum"),
-            )
-            .where(
-                ActualModel.user_id == user_id,
-                ActualModel.date >= start_date
+        entries = [
+            GoalHistoryEntry(
+                year=row.month.year,
+                month=row.month.month,
+                goal_value=float(row.goal_value),
+                actual_value=float(row.actual_value),
+                met=row.met
             )
-            .group_by(extract("year", ActualModel.date), extract("month", ActualModel.date))
-        )
-        actual_rows = session.exec(stmt_actuals).all()
-
-        income_map = {(int(r.year), int(r.month)): float(r.income) for r in income_rows}
-        actual_map = {(int(r.year), int(r.month)): float(r.actual_sum) for r in actual_rows}
-
-        entries = []
-        met_count = 0
-
-        for row in goals_rows:
-            yr = int(row.year)
-            mo = int(row.month)
-            percentage = float(row.goal_percentage) / 100
-            income = income_map.get((yr, mo), 0.0)
-            goal_value = round(income * percentage, 2)
-            actual_value = actual_map.get((yr, mo), 0.0)
-            met_flag = actual_value >= goal_value
-            if met_flag:
-                met_count += 1
-            entries.append(GoalHistoryEntry(
-                year=yr,
-                month=mo,
-                goal_value=goal_value,
-                actual_value=actual_value,
-                met=met_flag
-            ))
+            for row in status_rows
+        ]
+        met_count = sum(1 for e in entries if e.met)
 
         total_goal_value = round(sum(e.goal_value for e in entries), 2)
         average_goal_value = round(total_goal_value / len(entries), 2) if entries else 0.0
@@ -1,135 +1,232 @@
 import csv
 import io
-from datetime import datetime
-from decimal import Decimal, InvalidOperation
-
-from fastapi import APIRouter, Depends, HTTPException, File, UploadFile, Form
+import logging
+import os
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, wait
+from typing import List, Literal
+
+import anyio
+from fastapi import APIRouter, Depends, HTTPException, File, UploadFile, Form, Query
+from pydantic import BaseModel
 from sqlmodel import Session, select
-from sqlalchemy import extract
 
-from app.database import get_session
-from app.models import (
-    User, Income, Expense, Saving, Investment,
-    ExpenseGoal, SavingGoal, InvestmentGoal
+from app import ratelimit
+from app.csv_import import (
+    DATA_TYPES, IMPORT_WORKERS, CSVFileError, diff_file, get_pool, parse_csv, unsupported_currencies, write_files,
 )
+from app.database import get_session, new_session
+from app.models import User
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(
     prefix="/import",
     tags=["import"],
 )
 
-# Función auxiliar para 'upsert' de metas
-def _upsert_goal(session: Session, Model, user_id: int, date: datetime.date, value: Decimal):
-    year = date.year
-    month = date.month
-    
-    existing = session.exec(
-        select(Model)
-        .where(
-            Model.user_id == user_id,
-            extract("year", Model.date) == year,
-            extract("month", Model.date) == month
-        )
-    ).first()
-
-    if existing:
-        existing.value = value
-        session.add(existing)
-    else:
-        goal = Model(user_id=user_id, date=date, value=value)
-        session.add(goal)
-
-# Función auxiliar para 'upsert' de ingresos
-def _upsert_income(session: Session, user_id: int, date: datetime.date, amount: Decimal):
-    year = date.year
-    month = date.month
-    
-    # Busca si ya existe una entrada para ese mes y usuario
-    existing_income = session.exec(
-        select(Income).where(
-            Income.user_id == user_id,
-            extract("year", Income.date) == year,
-            extract("month", Income.date) == month,
-        )
-    ).first()
-
-    if existing_income:
-        # Si existe, la actualiza
-        existing_income.date = date
-        existing_income.amount = amount
-        session.add(existing_income)
-    else:
-        # Si no existe, crea una nueva
-        new_income = Income(user_id=user_id, date=date, amount=amount)
-        session.add(new_income)
-
-
-
-@router.post("/csv")
+# Límites del zip de /import/bulk (tamaño descomprimido y número de ficheros),
+# comprobados con el índice del zip antes de descomprimir nada.
+IMPORT_MAX_FILES = int(os.getenv("IMPORT_MAX_FILES", "2000"))
+IMPORT_MAX_BYTES = int(os.getenv("IMPORT_MAX_BYTES", str(1024 * 1024 * 1024)))
+# Filas validadas que el escritor junta antes de cada transacción.
+IMPORT_WRITE_BATCH_ROWS = int(os.getenv("IMPORT_WRITE_BATCH_ROWS", "50000"))
+MANIFEST_NAME = "manifest.csv"
+
+
+@router.post("/csv", dependencies=[Depends(ratelimit.limit("import_csv", rate=0.2, burst=5, concurrent=1))])
 async def import_csv_data(
     *,
     email: str = Form(...),
     data_type: str = Form(...),
     file: UploadFile = File(...),
+    mode: Literal["commit", "dry_run"] = Query("commit", description="dry_run: sólo calcula qué cambiaría"),
     session: Session = Depends(get_session),
 ):
+    """
+    Importa un CSV de un usuario. En movimientos, las filas que ya se
+    importaron antes (misma huella) se omiten y se cuentan en
+    ``duplicate_rows``. Con ``mode=dry_run`` no escribe nada y devuelve
+    cuántas filas serían nuevas o duplicadas (movimientos) o cuántos meses
+    se crearían o sobrescribirían (ingresos y metas).
+    """
     user = session.exec(select(User).where(User.email == email)).one_or_none()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
+    if data_type not in DATA_TYPES:
+        raise HTTPException(status_code=400, detail=f"Invalid data type: {data_type}")
 
     content = await file.read()
+    # Parseo fuera del event loop; si hay errores no se escribe nada.
+    try:
+        parsed = await anyio.to_thread.run_sync(parse_csv, data_type, content)
+    except CSVFileError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if parsed.errors:
+        raise HTTPException(status_code=422, detail=parsed.errors)
+    unsupported = unsupported_currencies(session, parsed)
+    if unsupported:
+        raise HTTPException(status_code=422, detail=f"Unsupported currency: {', '.join(unsupported)}")
+
+    if mode == "dry_run":
+        counts = await anyio.to_thread.run_sync(diff_file, user.id, parsed)
+        return {"mode": mode, "data_type": data_type, **counts}
+
     try:
-        decoded_content = content.decode('utf-8')
+        [written] = await anyio.to_thread.run_sync(write_files, [(user.id, parsed)])
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {e}")
+
+    return {
+        "message": f"{data_type.replace('_', ' ').capitalize()} imported successfully",
+        "rows": written,
+        "duplicate_rows": len(parsed.days) - written,
+    }
+
+
+# ─── Importación en bloque (zip) ─────────────────────────────────────────────────
+
+class BulkFileResult(BaseModel):
+    file: str
+    email: str
+    data_type: str
+    rows: int = 0
+    duplicate_rows: int = 0
+    errors: List[str] = []
+
+
+class BulkImportResponse(BaseModel):
+    imported_files: int
+    failed_files: int
+    imported_rows: int
+    duplicate_rows: int
+    files: List[BulkFileResult]
+
+
+def _read_manifest(archive: zipfile.ZipFile) -> List[BulkFileResult]:
+    try:
+        text = archive.read(MANIFEST_NAME).decode("utf-8-sig")
+    except KeyError:
+        raise HTTPException(status_code=400, detail=f"{MANIFEST_NAME} not found in zip.")
     except UnicodeDecodeError:
         raise HTTPException(status_code=400, detail="Invalid file encoding. Please use UTF-8.")
 
-    csv_reader = csv.reader(io.StringIO(decoded_content))
-    
-    # Omitir el encabezado
+    reader = csv.DictReader(io.StringIO(text))
+    missing = {"file", "email", "data_type"} - set(reader.fieldnames or ())
+    if missing:
+        raise HTTPException(status_code=400, detail=f"{MANIFEST_NAME} is missing columns: {', '.join(sorted(missing))}")
+    entries = [
+        BulkFileResult(file=row["file"].strip(), email=row["email"].strip(), data_type=row["data_type"].strip())
+        for row in reader if row["file"] and row["file"].strip()
+    ]
+    if len(entries) > IMPORT_MAX_FILES:
+        raise HTTPException(status_code=413, detail=f"Too many files: {len(entries)} (max {IMPORT_MAX_FILES}).")
+    return entries
+
+
+@router.post(
+    "/bulk",
+    response_model=BulkImportResponse,
+    dependencies=[Depends(ratelimit.limit("import_bulk", rate=1 / 60, burst=2, concurrent=1))],
+)
+def import_bulk(*, file: UploadFile = File(...)):
+    """
+    Importa un zip con muchos CSV, de uno o varios usuarios. El zip incluye
+    un ``manifest.csv`` con una línea por fichero:
+
+        file,email,data_type
+        ana/gastos.csv,ana@correo.com,expenses
+        luis/ingresos.csv,luis@correo.com,income
+
+    Los ficheros se parsean y validan en paralelo en un pool de procesos
+    (IMPORT_WORKERS) y un único escritor agrupa los ya validados en
+    inserciones en bloque de hasta IMPORT_WRITE_BATCH_ROWS filas, mientras
+    los procesos siguen con los siguientes. Cada fichero entra entero o no
+    entra: los que tienen errores se omiten y se devuelven en ``files``. Como
+    en /import/csv, los movimientos ya importados se omiten y se cuentan en
+    ``duplicate_rows``.
+    """
     try:
-        next(csv_reader)
-    except StopIteration:
-        raise HTTPException(status_code=400, detail="CSV file is empty.")
-
-    records_to_add = []
-    
+        archive = zipfile.ZipFile(file.file)
+    except zipfile.BadZipFile:
+        raise HTTPException(status_code=400, detail="Invalid zip file.")
+
+    with archive, new_session() as session:
+        entries = _read_manifest(archive)
+        infos = {info.filename: info for info in archive.infolist()}
+        total_size = sum(infos[entry.file].file_size for entry in entries if entry.file in infos)
+        if total_size > IMPORT_MAX_BYTES:
+            raise HTTPException(status_code=413, detail=f"Uncompressed size exceeds {IMPORT_MAX_BYTES} bytes.")
+
+        emails = {entry.email for entry in entries}
+        user_ids = dict(session.exec(select(User.email, User.id).where(User.email.in_(emails))).all())
+
+        queue = []
+        for index, entry in enumerate(entries):
+            if entry.file not in infos:
+                entry.errors.append("File not found in zip")
+            elif entry.email not in user_ids:
+                entry.errors.append("User not found")
+            elif entry.data_type not in DATA_TYPES:
+                entry.errors.append(f"Invalid data type: {entry.data_type}")
+            else:
+                queue.append(index)
+
+        # Como mucho dos ficheros por proceso en vuelo: el zip se descomprime
+        # a medida que se parsea y no entero en memoria.
+        pool = get_pool()
+        pending = {}
+        queue.reverse()
+
+        def submit_more():
+            while queue and len(pending) < 2 * IMPORT_WORKERS:
+                index = queue.pop()
+                entry = entries[index]
+                pending[pool.submit(parse_csv, entry.data_type, archive.read(entry.file))] = index
+
+        batch, batch_rows = [], 0
+        submit_more()
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                entry = entries[pending.pop(future)]
+                try:
+                    parsed = future.result()
+                except CSVFileError as e:
+                    entry.errors.append(str(e))
+                    continue
+                entry.errors.extend(parsed.errors)
+                unsupported = unsupported_currencies(session, parsed)
+                if unsupported:
+                    entry.errors.append(f"Unsupported currency: {', '.join(unsupported)}")
+                if entry.errors:
+                    continue
+                batch.append((entry, parsed))
+                batch_rows += len(parsed.days)
+            # Los procesos siguen parseando mientras se escribe el lote.
+            submit_more()
+            if batch and (batch_rows >= IMPORT_WRITE_BATCH_ROWS or not pending):
+                _write_bulk(batch, user_ids)
+                batch, batch_rows = [], 0
+
+    failed = sum(1 for entry in entries if entry.errors)
+    return BulkImportResponse(
+        imported_files=len(entries) - failed,
+        failed_files=failed,
+        imported_rows=sum(entry.rows for entry in entries),
+        duplicate_rows=sum(entry.duplicate_rows for entry in entries),
+        files=entries,
+    )
+
+
+def _write_bulk(batch: list, user_ids: dict) -> None:
     try:
-        if data_type in ["expenses", "savings", "investments"]:
-            Model = {"expenses": Expense, "savings": Saving, "investments": Investment}[data_type]
-            for i, row in enumerate(csv_reader, 2):
-                if len(row) != 3:
-                    raise HTTPException(400, f"Row {i}: Expected 3 columns, found {len(row)}")
-                date_obj = datetime.strptime(row[0], "%Y-%m-%d").date()
-                amount_val = Decimal(row[1])
-                records_to_add.append(Model(user_id=user.id, date=date_obj, amount=amount_val, category=row[2]))
-            session.add_all(records_to_add)
-
-        elif data_type in ["expense_goals", "saving_goals", "investment_goals"]:
-            Model = {"expense_goals": ExpenseGoal, "saving_goals": SavingGoal, "investment_goals": InvestmentGoal}[data_type]
-            for i, row in enumerate(csv_reader, 2):
-                if len(row) != 2:
-                    raise HTTPException(400, f"Row {i}: Expected 2 columns, found {len(row)}")
-                date_obj = datetime.strptime(row[0], "%Y-%m-%d").date()
-                value_val = Decimal(row[1])
-                _upsert_goal(session, Model, user.id, date_obj, value_val)
-        
-        elif data_type == "income":
-            for i, row in enumerate(csv_reader, 2):
-                if len(row) != 2:
-                    raise HTTPException(400, f"Row {i}: Expected 2 columns, found {len(row)}")
-                date_obj = datetime.strptime(row[0], "%Y-%m-%d").date()
-                amount_val = Decimal(row[1])
-                _upsert_income(session, user.id, date_obj, amount_val)
-
-        else:
-            raise HTTPException(status_code=400, detail=f"Invalid data type: {data_type}")
-        
-        session.commit()
-
-    except (ValueError, InvalidOperation) as e:
-        raise HTTPException(status_code=422, detail=f"Data format error in CSV: {e}")
+        written = write_files([(user_ids[entry.email], parsed) for entry, parsed in batch])
     except Exception as e:
-        session.rollback()
-        raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {e}")
-
-    return {"message": f"{data_type.replace('_', ' ').capitalize()} imported successfully"}
\ No newline at end of file
+        logger.exception("Fallo al escribir un lote de /import/bulk")
+        for entry, _ in batch:
+            entry.errors.append(f"An unexpected error occurred: {e}")
+        return
+    for (entry, parsed), rows in zip(batch, written):
+        entry.rows = rows
+        entry.duplicate_rows = len(parsed.days) - rows
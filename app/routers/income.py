@@ -5,6 +5,7 @@ from pydantic import BaseModel, validator
 from decimal import Decimal
 from datetime import date as pydate, datetime # Added datetime
 
+from app import fx
 from app.database import get_session
 from app.models import Income, User #
 
@@ -15,6 +16,7 @@ class IncomeCreateBody(BaseModel):
     user_id: int
     date: str
     amount: Decimal
+    currency: str = fx.BASE_CURRENCY
 
     @validator('amount')
     def amount_must_be_non_negative(cls, value_from_payload): # Renamed 'value' to avoid clash
@@ -34,6 +36,7 @@ class IncomeRead(BaseModel): # Keep this for consistent response structure
     user_id: int
     date: pydate
     amount: Decimal
+    currency: str
 
 # Ensure the router is defined before use, or use the one from your existing income.py
 # If this is a continuation of the income.py file I provided, this router instance is already defined.
@@ -60,12 +63,15 @@ def create_income( # Renombrado para mayor claridad
         parsed_date = datetime.strptime(income_payload.date, "%Y-%m-%d").date()
     except ValueError:
         raise HTTPException(status_code=422, detail="Invalid date format. Use YYYY-MM-DD.")
+    if not fx.is_supported(session, income_payload.currency):
+        raise HTTPException(status_code=422, detail=f"Unsupported currency: {income_payload.currency}")
 
     # La lógica de buscar y actualizar se elimina. Siempre creamos uno nuevo.
     db_income = Income(
         user_id=income_payload.user_id,
         date=parsed_date,
-        amount=income_payload.amount
+        amount=income_payload.amount,
+        currency=income_payload.currency,
     )
     
     session.add(db_income)
@@ -73,4 +79,4 @@ def create_income( # Renombrado para mayor claridad
     session.refresh(db_income)
     
     # Asegúrate de que IncomeRead no espere un id que no tiene
-    return IncomeRead(user_id=db_income.user_id, date=db_income.date, amount=db_income.amount)
\ No newline at end of file
+    return IncomeRead(user_id=db_income.user_id, date=db_income.date, amount=db_income.amount, currency=db_income.currency)
\ No newline at end of file
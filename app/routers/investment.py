@@ -1,11 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlmodel import Session
-from pydantic import BaseModel, validator
+from pydantic import BaseModel, Field, validator
 from decimal import Decimal
 from datetime import date as pydate, datetime
 from enum import Enum
 from typing import Optional
 
+from app import fx
 from app.database import get_session
 from app.models import Investment, User
 
@@ -22,12 +23,16 @@ class InvestmentCreate(BaseModel):
     date: pydate
     amount: Decimal
     category: InvestmentCategory
+    currency: str = fx.BASE_CURRENCY
+    notes: Optional[str] = Field(None, max_length=500)
 
 # Modelo para la actualización
 class InvestmentUpdate(BaseModel):
     date: Optional[pydate] = None
     amount: Optional[Decimal] = None
     category: Optional[InvestmentCategory] = None
+    currency: Optional[str] = None
+    notes: Optional[str] = Field(None, max_length=500)
 
     @validator('amount')
     def amount_must_be_positive(cls, v):
@@ -43,6 +48,9 @@ def create_investment(investment_in: InvestmentCreate, session: Session = Depend
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
     
+    if not fx.is_supported(session, investment_in.currency):
+        raise HTTPException(status_code=422, detail=f"Unsupported currency: {investment_in.currency}")
+
     db_investment = Investment.from_orm(investment_in)
     session.add(db_investment)
     session.commit()
@@ -56,6 +64,8 @@ def update_investment(investment_id: int, investment_in: InvestmentUpdate, sessi
         raise HTTPException(status_code=404, detail="Investment not found")
     
     investment_data = investment_in.dict(exclude_unset=True)
+    if "currency" in investment_data and not fx.is_supported(session, investment_data["currency"]):
+        raise HTTPException(status_code=422, detail=f"Unsupported currency: {investment_data['currency']}")
     for key, value in investment_data.items():
         setattr(db_investment, key, value)
 
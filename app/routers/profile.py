@@ -6,7 +6,7 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from sqlmodel import SQLModel, Field, select, Session
 from sqlalchemy import desc
 
-from app.database import get_session
+from app.database import get_session, get_read_session
 from app.models import User, ExpenseGoal, SavingGoal, InvestmentGoal
 
 router = APIRouter(prefix="/profile", tags=["profile"])
@@ -28,7 +28,7 @@ class ProfileResponse(SQLModel):
 
 
 @router.get("/{user_id}", response_model=ProfileResponse)
-def read_profile(user_id: int, session: Session = Depends(get_session)):
+def read_profile(user_id: int, session: Session = Depends(get_read_session)):
     user = session.get(User, user_id)
     if not user:
         raise HTTPException(
@@ -0,0 +1,154 @@
+# app/routers/recurring.py
+"""
+Plantillas de movimientos recurrentes (alquiler, nómina, transferencias de
+ahorro...). Las ocurrencias las crea ``python -m app.jobs.recurring``.
+"""
+
+from datetime import date as pydate
+from decimal import Decimal
+from typing import List, Literal, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from pydantic import BaseModel, validator
+from sqlalchemy import delete, func
+from sqlmodel import Session, select
+
+from app import fx
+from app.database import get_read_session, get_session
+from app.jobs.recurring import next_occurrence
+from app.models import RecurringTemplate, RecurringRun, User
+from app.routers.expense import ExpenseCategory
+from app.routers.investment import InvestmentCategory
+from app.routers.saving import SavingCategory
+
+router = APIRouter(prefix="/recurring", tags=["recurring"])
+
+CATEGORIES = {
+    "expense": {category.value for category in ExpenseCategory},
+    "saving": {category.value for category in SavingCategory},
+    "investment": {category.value for category in InvestmentCategory},
+}
+
+
+def _check_category(ledger: str, category: Optional[str]) -> None:
+    if ledger == "income":
+        if category is not None:
+            raise HTTPException(status_code=422, detail="Income templates have no category")
+    elif category not in CATEGORIES[ledger]:
+        raise HTTPException(status_code=422, detail=f"Invalid category for {ledger}: {category}")
+
+
+class RecurringCreate(BaseModel):
+    user_id: int
+    ledger: Literal["income", "expense", "saving", "investment"]
+    frequency: Literal["monthly", "weekly"]
+    amount: Decimal
+    currency: str = fx.BASE_CURRENCY
+    category: Optional[str] = None
+    start_date: pydate
+    end_date: Optional[pydate] = None
+
+    @validator('amount')
+    def amount_must_be_positive(cls, v):
+        if v < 0:
+            raise ValueError('Amount cannot be negative')
+        return v
+
+
+class RecurringUpdate(BaseModel):
+    amount: Optional[Decimal] = None
+    category: Optional[str] = None
+    end_date: Optional[pydate] = None
+
+    @validator('amount')
+    def amount_must_be_positive(cls, v):
+        if v is not None and v < 0:
+            raise ValueError('Amount cannot be negative')
+        return v
+
+
+def _pending_run(session: Session, template: RecurringTemplate) -> Optional[pydate]:
+    """Primera ocurrencia sin materializar, o None si ya pasó end_date."""
+    last_period = None
+    if template.id is not None:
+        last_period = session.exec(
+            select(func.max(RecurringRun.period))
+            .where(RecurringRun.user_id == template.user_id, RecurringRun.template_id == template.id)
+        ).one()
+    if last_period is None:
+        run = template.start_date
+    else:
+        run = next_occurrence(template.start_date, template.frequency, last_period)
+    if template.end_date is not None and run > template.end_date:
+        return None
+    return run
+
+
+@router.post("/", response_model=RecurringTemplate, status_code=status.HTTP_201_CREATED)
+def create_template(template_in: RecurringCreate, session: Session = Depends(get_session)):
+    if not session.get(User, template_in.user_id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+    _check_category(template_in.ledger, template_in.category)
+    if not fx.is_supported(session, template_in.currency):
+        raise HTTPException(status_code=422, detail=f"Unsupported currency: {template_in.currency}")
+    if template_in.end_date is not None and template_in.end_date < template_in.start_date:
+        raise HTTPException(status_code=422, detail="end_date must not be before start_date")
+
+    template = RecurringTemplate(**template_in.dict())
+    template.next_run = _pending_run(session, template)
+    session.add(template)
+    session.commit()
+    session.refresh(template)
+    return template
+
+
+@router.get("/", response_model=List[RecurringTemplate])
+def list_templates(
+    *,
+    email: str = Query(..., description="Correo del usuario"),
+    session: Session = Depends(get_read_session),
+):
+    user_id = session.exec(select(User.id).where(User.email == email)).one_or_none()
+    if user_id is None:
+        raise HTTPException(status_code=404, detail="Usuario no encontrado")
+    return session.exec(
+        select(RecurringTemplate)
+        .where(RecurringTemplate.user_id == user_id)
+        .order_by(RecurringTemplate.id)
+    ).all()
+
+
+@router.put("/{template_id}", response_model=RecurringTemplate)
+def update_template(template_id: int, template_in: RecurringUpdate, session: Session = Depends(get_session)):
+    template = session.get(RecurringTemplate, template_id)
+    if not template:
+        raise HTTPException(status_code=404, detail="Recurring template not found")
+
+    data = template_in.dict(exclude_unset=True)
+    if "category" in data:
+        _check_category(template.ledger, data["category"])
+    for key, value in data.items():
+        setattr(template, key, value)
+    # Los cambios sólo afectan a ocurrencias futuras; con otra fecha de fin
+    # puede que ya no quede ninguna pendiente (o que vuelva a haberla).
+    if "end_date" in data:
+        template.next_run = _pending_run(session, template)
+
+    session.add(template)
+    session.commit()
+    session.refresh(template)
+    return template
+
+
+@router.delete("/{template_id}", status_code=status.HTTP_204_NO_CONTENT)
+def delete_template(template_id: int, session: Session = Depends(get_session)):
+    """Borra la plantilla; los movimientos ya creados se conservan."""
+    template = session.get(RecurringTemplate, template_id)
+    if not template:
+        raise HTTPException(status_code=404, detail="Recurring template not found")
+    session.exec(delete(RecurringRun).where(
+        RecurringRun.user_id == template.user_id, RecurringRun.template_id == template.id
+    ))
+    session.delete(template)
+    session.commit()
+    return
@@ -0,0 +1,35 @@
+# app/routers/reports.py
+"""
+Resumen anual de un usuario, precalculado (ver app/year_reports.py):
+
+    GET /reports/2024?email=usuario@correo.com
+
+Devuelve totales por tipo de movimiento, categorías, metas cumplidas por tipo,
+los 12 meses y el mejor y el peor mes, en EUR. Sólo se recalculan los meses
+que cambiaron desde la última vez.
+"""
+
+from fastapi import APIRouter, Depends, HTTPException, Path, Query
+from sqlmodel import Session, select
+
+from app import year_reports
+from app.database import get_session
+from app.models import User
+
+router = APIRouter(
+    prefix="/reports",
+    tags=["reports"],
+)
+
+
+@router.get("/{year}", response_model=dict)
+def get_year_report(
+    *,
+    year: int = Path(..., ge=1900, le=2100, description="Año del resumen"),
+    email: str = Query(..., description="Correo del usuario"),
+    session: Session = Depends(get_session),
+):
+    user_id = session.exec(select(User.id).where(User.email == email)).one_or_none()
+    if user_id is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return year_reports.get_report(session, user_id, year)
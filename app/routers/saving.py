@@ -1,11 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlmodel import Session
-from pydantic import BaseModel, validator
+from pydantic import BaseModel, Field, validator
 from decimal import Decimal
 from datetime import date as pydate, datetime
 from enum import Enum
 from typing import Optional
 
+from app import fx
 from app.database import get_session
 from app.models import Saving, User
 
@@ -21,12 +22,16 @@ class SavingCreate(BaseModel):
     date: pydate
     amount: Decimal
     category: SavingCategory
+    currency: str = fx.BASE_CURRENCY
+    notes: Optional[str] = Field(None, max_length=500)
 
 # Modelo para la actualización, con campos opcionales
 class SavingUpdate(BaseModel):
     date: Optional[pydate] = None
     amount: Optional[Decimal] = None
     category: Optional[SavingCategory] = None
+    currency: Optional[str] = None
+    notes: Optional[str] = Field(None, max_length=500)
 
     @validator('amount')
     def amount_must_be_positive(cls, v):
@@ -42,6 +47,9 @@ def create_saving(saving_in: SavingCreate, session: Session = Depends(get_sessio
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
     
+    if not fx.is_supported(session, saving_in.currency):
+        raise HTTPException(status_code=422, detail=f"Unsupported currency: {saving_in.currency}")
+
     db_saving = Saving.from_orm(saving_in)
     session.add(db_saving)
     session.commit()
@@ -55,6 +63,8 @@ def update_saving(saving_id: int, saving_in: SavingUpdate, session: Session = De
         raise HTTPException(status_code=404, detail="Saving not found")
     
     saving_data = saving_in.dict(exclude_unset=True)
+    if "currency" in saving_data and not fx.is_supported(session, saving_data["currency"]):
+        raise HTTPException(status_code=422, detail=f"Unsupported currency: {saving_data['currency']}")
     for key, value in saving_data.items():
         setattr(db_saving, key, value)
 
@@ -0,0 +1,205 @@
+# app/routers/search.py
+"""
+Búsqueda de gastos, ahorros e inversiones de un usuario por importe, fecha,
+categoría y texto libre en las notas.
+
+Los resultados salen de un UNION ALL de las tres tablas en el que cada rama
+ya viene ordenada por fecha y recortada a offset + limit, de modo que cada
+una recorre el índice (user_id, date) y se detiene pronto. Los facets (número
+de movimientos por tipo y categoría) salen de una única consulta: el UNION
+ALL de los recuentos por categoría de cada tabla, sin el filtro de
+categoría, para que el cliente vea también cuántos hay en las demás. El total
+de la búsqueda es la suma de los facets seleccionados, así que no hace falta
+un COUNT aparte.
+
+El texto se busca con ILIKE '%palabra%' sobre los índices de trigramas en
+Postgres y con MATCH sobre las tablas FTS5 en SQLite (prefijos de palabra);
+ver la migración 0010. Los importes se filtran en la moneda de cada
+movimiento.
+"""
+
+from datetime import date as pydate
+from typing import List, Literal, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from pydantic import BaseModel
+from sqlalchemy import column, desc, func, literal, literal_column, table, union_all
+from sqlmodel import Session, select
+
+from app.database import get_engine, get_read_session
+from app.models import User, Expense, Saving, Investment
+
+router = APIRouter(
+    prefix="/search",
+    tags=["search"],
+)
+
+SEARCH_LEDGERS = {
+    "expenses": Expense,
+    "savings": Saving,
+    "investments": Investment,
+}
+
+
+# ─── Modelos de respuesta ────────────────────────────────────────────────────────
+
+class SearchResult(BaseModel):
+    kind: str
+    id: int
+    date: pydate
+    amount: float
+    currency: str
+    category: str
+    notes: Optional[str]
+
+
+class FacetCount(BaseModel):
+    kind: str
+    category: str
+    count: int
+
+
+class SearchResponse(BaseModel):
+    total: int
+    results: List[SearchResult]
+    facets: List[FacetCount]
+
+
+# ─── Construcción de la consulta ─────────────────────────────────────────────────
+
+def _text_conditions(Model, user_id: int, text: str) -> list:
+    words = text.split()
+    if not words:
+        return []
+    if get_engine().dialect.name == "sqlite":
+        fts_name = f"{Model.__tablename__}_fts"
+        fts = table(fts_name, column("rowid"))
+        # Cada palabra entre comillas (sin operadores FTS5) y como prefijo; el
+        # user_id indexado limita el recorrido a los movimientos del usuario.
+        match = " AND ".join(
+            [f'user_id:"{int(user_id)}"'] + ['notes:"' + word.replace('"', '""') + '"*' for word in words]
+        )
+        return [Model.id.in_(select(fts.c.rowid).where(literal_column(fts_name).op("MATCH")(match)))]
+    escaped = [word.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") for word in words]
+    return [Model.notes.ilike(f"%{word}%", escape="\\") for word in escaped]
+
+
+def _facet_select(kind: str, Model, conditions: list):
+    # user_id (constante) en la salida para poder filtrarlo fuera del UNION.
+    return (
+        select(
+            literal(kind).label("kind"),
+            Model.user_id.label("user_id"),
+            Model.category.label("category"),
+            func.count().label("count"),
+        )
+        .where(*conditions)
+        .group_by(Model.user_id, Model.category)
+    )
+
+
+def _ledger_select(kind: str, Model, conditions: list, categories: Optional[List[str]], top: int):
+    statement = select(
+        literal(kind).label("kind"),
+        Model.id.label("id"),
+        Model.user_id.label("user_id"),
+        Model.date.label("date"),
+        Model.amount.label("amount"),
+        Model.currency.label("currency"),
+        Model.category.label("category"),
+        Model.notes.label("notes"),
+    ).where(*conditions)
+    if categories:
+        statement = statement.where(Model.category.in_(categories))
+    # SQLite no admite ORDER BY/LIMIT en una rama de UNION: va en subconsulta.
+    ranked = statement.order_by(desc(Model.date), desc(Model.id)).limit(top).subquery()
+    return select(*ranked.c)
+
+
+# ─── Ruta GET /search/ ───────────────────────────────────────────────────────────
+
+@router.get("/", response_model=SearchResponse)
+def search_transactions(
+    *,
+    email: str = Query(..., description="Correo del usuario"),
+    q: Optional[str] = Query(None, max_length=200, description="Texto a buscar en las notas"),
+    kind: Optional[List[Literal["expenses", "savings", "investments"]]] = Query(
+        None, description="Tipos de movimiento (por defecto, los tres)"
+    ),
+    category: Optional[List[str]] = Query(None, description="Categorías (se puede repetir)"),
+    min_amount: Optional[float] = Query(None, ge=0),
+    max_amount: Optional[float] = Query(None, ge=0),
+    date_from: Optional[pydate] = Query(None, description="Desde esta fecha (incluida)"),
+    date_to: Optional[pydate] = Query(None, description="Hasta esta fecha (incluida)"),
+    limit: int = Query(50, ge=1, le=500),
+    offset: int = Query(0, ge=0),
+    session: Session = Depends(get_read_session),
+):
+    """
+    Movimientos del usuario que cumplen los filtros, del más reciente al más
+    antiguo, con el total y los facets por tipo y categoría.
+
+    Ejemplo de llamada:
+      GET /search/?email=usuario@correo.com&q=cena&category=alimentación&min_amount=20
+    """
+    user_id = session.exec(select(User.id).where(User.email == email)).one_or_none()
+    if user_id is None:
+        raise HTTPException(status_code=404, detail="Usuario no encontrado")
+
+    kinds = kind or list(SEARCH_LEDGERS)
+    per_ledger = {}
+    for name in kinds:
+        Model = SEARCH_LEDGERS[name]
+        conditions = [Model.user_id == user_id]
+        if min_amount is not None:
+            conditions.append(Model.amount >= min_amount)
+        if max_amount is not None:
+            conditions.append(Model.amount <= max_amount)
+        if date_from is not None:
+            conditions.append(Model.date >= date_from)
+        if date_to is not None:
+            conditions.append(Model.date <= date_to)
+        if q:
+            conditions.extend(_text_conditions(Model, user_id, q))
+        per_ledger[name] = conditions
+
+    # El filtro user_id también fuera del UNION: así el enrutado por shard
+    # (app/sharding.py) lo encuentra en el WHERE de la consulta exterior.
+    facets_union = union_all(*(
+        _facet_select(name, SEARCH_LEDGERS[name], conditions) for name, conditions in per_ledger.items()
+    )).subquery("facets")
+    facet_rows = session.exec(
+        select(facets_union.c.kind, facets_union.c.category, facets_union.c.count)
+        .where(facets_union.c.user_id == user_id)
+        .order_by(facets_union.c.kind, facets_union.c.category)
+    ).all()
+    facets = [FacetCount(kind=k, category=c, count=n) for k, c, n in facet_rows]
+    total = sum(f.count for f in facets if not category or f.category in category)
+
+    results = []
+    if total > offset:
+        results_union = union_all(*(
+            _ledger_select(name, SEARCH_LEDGERS[name], conditions, category, offset + limit)
+            for name, conditions in per_ledger.items()
+        )).subquery("matches")
+        rows = session.exec(
+            select(*results_union.c)
+            .where(results_union.c.user_id == user_id)
+            .order_by(desc(results_union.c.date), results_union.c.kind, desc(results_union.c.id))
+            .limit(limit)
+            .offset(offset)
+        ).all()
+        results = [
+            SearchResult(
+                kind=row.kind,
+                id=row.id,
+                date=row.date,
+                amount=float(row.amount),
+                currency=row.currency,
+                category=row.category,
+                notes=row.notes,
+            )
+            for row in rows
+        ]
+
+    return SearchResponse(total=total, results=results, facets=facets)
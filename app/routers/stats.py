@@ -0,0 +1,20 @@
+# app/routers/stats.py
+"""Contadores del proceso para operación (no dependen de la base de datos)."""
+
+from fastapi import APIRouter
+
+from app import singleflight
+
+router = APIRouter(
+    prefix="/stats",
+    tags=["stats"],
+)
+
+
+@router.get("/")
+def get_stats():
+    """
+    ``singleflight``: por endpoint, cálculos hechos, peticiones que esperaron
+    el resultado de otra idéntica y cálculos en curso (ver app/singleflight.py).
+    """
+    return {"singleflight": singleflight.stats()}
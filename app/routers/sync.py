@@ -0,0 +1,309 @@
+# app/routers/sync.py
+"""
+Sincronización incremental para clientes móviles que trabajan sin conexión.
+
+    POST /sync/
+    {"email": "usuario@correo.com", "token": "main:1234", "changes": [...]}
+
+El cliente manda el ``token`` de su última sincronización y, en la misma
+petición, lo que cambió en local. Recibe sólo lo que cambió en el servidor
+desde ese token (leído del registro de app/changes.py, sin recorrer las
+tablas) y un token nuevo:
+
+    {"token": "main:1301", "reset": false, "has_more": false,
+     "entities": {"expenses": {"fields": ["date", "amount", "currency", "category", "notes"],
+                               "upserts": [["812", "2024-05-02", "12.50", "EUR", "ocio", null]],
+                               "deletes": ["790"]}},
+     "results": [{"index": 0, "status": "applied", "key": "813", "client_id": "tmp-1"}]}
+
+- Cada fila va como ``[clave, valores en el orden de fields]``. La clave es
+  el id del movimiento, o el mes (``YYYY-MM-01``) en las metas.
+- Varios cambios de una misma fila llegan compactados en su último estado; una
+  fila creada y borrada desde el token no llega.
+- Con ``has_more`` quedan cambios: se vuelve a llamar con el token nuevo.
+- Sin token, con uno inválido, de otra base de datos (el usuario se movió de
+  shard) o por delante del servidor (la base de datos se restauró), llega el
+  estado completo con ``reset: true``: el cliente sustituye sus datos locales.
+
+Cambios del cliente (``changes``): ``{"entity", "op": "upsert"|"delete",
+"key", "client_id", "data"}``. Un upsert sin ``key`` crea la fila, y su
+``client_id`` vuelve en ``results`` con la clave asignada. Las metas se
+identifican por el mes de ``data.date``. Si la fila cambió en el servidor
+después del token del cliente, gana el servidor: el cambio vuelve como
+``conflict`` y la versión del servidor llega en ``entities``. Los cambios del
+propio cliente no vuelven en ``entities``.
+"""
+
+import os
+from datetime import date as pydate
+from decimal import Decimal
+from typing import Dict, List, Literal, Optional, Tuple
+
+from dateutil.relativedelta import relativedelta
+from fastapi import APIRouter, Depends, HTTPException
+from pydantic import BaseModel, Field, ValidationError
+from sqlmodel import Session, select
+
+from app import changes, fx
+from app.database import get_session
+from app.models import Change, User
+from app.routers.expense import ExpenseCategory
+from app.routers.investment import InvestmentCategory
+from app.routers.saving import SavingCategory
+
+router = APIRouter(
+    prefix="/sync",
+    tags=["sync"],
+)
+
+# Cambios del registro por respuesta y cambios del cliente por petición.
+SYNC_BATCH_SIZE = int(os.getenv("SYNC_BATCH_SIZE", "5000"))
+SYNC_MAX_CLIENT_CHANGES = int(os.getenv("SYNC_MAX_CLIENT_CHANGES", "1000"))
+
+MODELS = {entity: Model for Model, (entity, _) in changes.ENTITIES.items()}
+CATEGORIES = {
+    "expenses": {category.value for category in ExpenseCategory},
+    "savings": {category.value for category in SavingCategory},
+    "investments": {category.value for category in InvestmentCategory},
+}
+
+
+class LedgerData(BaseModel):
+    date: pydate
+    amount: Decimal = Field(..., ge=0)
+    currency: str = fx.BASE_CURRENCY
+    category: str
+    notes: Optional[str] = Field(None, max_length=500)
+
+
+class IncomeData(BaseModel):
+    date: pydate
+    amount: Decimal = Field(..., ge=0)
+    currency: str = fx.BASE_CURRENCY
+
+
+class GoalData(BaseModel):
+    date: pydate
+    value: Decimal = Field(..., ge=0, max_digits=5, decimal_places=2)
+
+
+class ClientChange(BaseModel):
+    entity: Literal[
+        "income", "expenses", "savings", "investments", "expense_goals", "saving_goals", "investment_goals",
+    ]
+    op: Literal["upsert", "delete"]
+    key: Optional[str] = None
+    client_id: Optional[str] = None
+    data: Optional[dict] = None
+
+
+class SyncRequest(BaseModel):
+    email: str
+    token: Optional[str] = None
+    changes: List[ClientChange] = []
+
+
+class ChangeResult(BaseModel):
+    index: int
+    status: Literal["applied", "conflict", "rejected"]
+    key: Optional[str] = None
+    client_id: Optional[str] = None
+    detail: Optional[str] = None
+
+
+class EntityBatch(BaseModel):
+    fields: List[str]
+    upserts: List[list] = []
+    deletes: List[str] = []
+
+
+class SyncResponse(BaseModel):
+    token: str
+    reset: bool
+    has_more: bool
+    entities: Dict[str, EntityBatch]
+    results: List[ChangeResult]
+
+
+# ─── Cambios del cliente ─────────────────────────────────────────────────────────
+
+def _validate(session: Session, change: ClientChange):
+    """Datos validados de un upsert; ValueError con el motivo si no valen."""
+    Model = MODELS[change.entity]
+    if Model in changes.GOAL_MODELS:
+        Data = GoalData
+    elif change.entity == "income":
+        Data = IncomeData
+    else:
+        Data = LedgerData
+    try:
+        data = Data(**(change.data or {}))
+    except ValidationError as e:
+        raise ValueError("; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors()))
+    if change.entity in CATEGORIES and data.category not in CATEGORIES[change.entity]:
+        raise ValueError(f"Invalid category: {data.category}")
+    if hasattr(data, "currency") and not fx.is_supported(session, data.currency):
+        raise ValueError(f"Unsupported currency: {data.currency}")
+    return data
+
+
+def _target_key(change: ClientChange, data) -> Optional[str]:
+    if MODELS[change.entity] in changes.GOAL_MODELS:
+        if data is not None:
+            return data.date.isoformat()[:7] + "-01"
+        return change.key and change.key[:7] + "-01"
+    return change.key
+
+
+def _changed_since(session: Session, user_id: int, since: int, targets: List[Tuple[str, str]]) -> set:
+    """(entidad, clave) de ``targets`` que cambiaron en el servidor después de ``since``."""
+    keys = {key for _, key in targets}
+    if not keys:
+        return set()
+    rows = session.exec(
+        select(Change.entity, Change.key)
+        .where(Change.user_id == user_id, Change.seq > since, Change.key.in_(keys))
+    ).all()
+    return {tuple(row) for row in rows} & set(targets)
+
+
+def _find(session: Session, Model, user_id: int, key: str):
+    if Model in changes.GOAL_MODELS:
+        # Por rango sobre date, como _month_bounds en dashboard.py: usa los
+        # índices (y las particiones). Tras diciembre de 9999 no hay mes.
+        month = pydate.fromisoformat(key)
+        where = [Model.user_id == user_id, Model.date >= month]
+        if month < pydate.max.replace(day=1):
+            where.append(Model.date < month + relativedelta(months=1))
+        return session.exec(select(Model).where(*where)).first()
+    obj = session.get(Model, int(key)) if key.isdigit() else None
+    return obj if obj is not None and obj.user_id == user_id else None
+
+
+def _apply_changes(session: Session, user_id: int, since: Optional[int], client_changes: List[ClientChange]):
+    results, validated, created = [], [], []
+    for index, change in enumerate(client_changes):
+        result = ChangeResult(index=index, status="applied", client_id=change.client_id)
+        data = None
+        try:
+            if change.op == "upsert":
+                data = _validate(session, change)
+            elif _target_key(change, None) is None:
+                raise ValueError("key is required to delete")
+            if change.key is not None and MODELS[change.entity] in changes.GOAL_MODELS:
+                try:
+                    pydate.fromisoformat(change.key[:7] + "-01")
+                except ValueError:
+                    raise ValueError(f"Invalid key: {change.key}")
+                if data is not None and _target_key(change, data) != change.key[:7] + "-01":
+                    raise ValueError("Goal date does not match its key")
+        except ValueError as e:
+            result.status, result.detail = "rejected", str(e)
+        result.key = _target_key(change, data)
+        results.append(result)
+        validated.append(data)
+
+    targets = [
+        (change.entity, result.key)
+        for change, result in zip(client_changes, results)
+        if result.status == "applied" and result.key is not None
+    ]
+    conflicts = _changed_since(session, user_id, since, targets) if since is not None else set()
+
+    for change, result, data in zip(client_changes, results, validated):
+        if result.status != "applied":
+            continue
+        Model = MODELS[change.entity]
+        existing = _find(session, Model, user_id, result.key) if result.key is not None else None
+        # Sin token no se sabe qué versión vio el cliente: gana el servidor.
+        if (change.entity, result.key) in conflicts or (since is None and existing is not None):
+            result.status, result.detail = "conflict", "Changed on the server since the last sync"
+            continue
+        if change.op == "delete":
+            if existing is None and Model not in changes.GOAL_MODELS:
+                result.status, result.detail = "rejected", "Not found"
+            elif existing is not None:
+                session.delete(existing)
+            continue
+        if existing is None and change.key is not None and Model not in changes.GOAL_MODELS:
+            result.status, result.detail = "rejected", "Not found"
+            continue
+        obj = existing if existing is not None else Model(user_id=user_id)
+        for name, value in data.dict().items():
+            setattr(obj, name, value)
+        session.add(obj)
+        if existing is None and Model not in changes.GOAL_MODELS:
+            created.append((result, obj))
+
+    # Los seq de lo escrito aquí, para no devolvérselo al propio cliente.
+    own_seqs = set(changes.write_pending(session, returning=True))
+    session.commit()
+    for result, obj in created:
+        result.key = str(obj.id)
+    return results, own_seqs
+
+
+# ─── Cambios del servidor ────────────────────────────────────────────────────────
+
+def _batches() -> Dict[str, EntityBatch]:
+    return {entity: EntityBatch(fields=list(fields)) for entity, fields in changes.ENTITIES.values()}
+
+
+def _snapshot(session: Session, user_id: int) -> Tuple[int, Dict[str, EntityBatch]]:
+    # El seq antes que las filas: lo confirmado después quizá ya esté en las
+    # filas y volverá en el siguiente delta, pero volver a aplicarlo no cambia nada.
+    seq = changes.last_seq(session, user_id)
+    batches = _batches()
+    for Model, (entity, _) in changes.ENTITIES.items():
+        batches[entity].upserts = [[key, *values] for key, values in changes.current_rows(session, Model, user_id)]
+    return seq, batches
+
+
+def _delta(session: Session, user_id: int, since: int, own_seqs: set) -> Tuple[int, bool, Dict[str, EntityBatch]]:
+    rows = changes.read_changes(session, since, SYNC_BATCH_SIZE + 1, user_id=user_id)
+    page = rows[:SYNC_BATCH_SIZE]
+
+    # Último estado de cada fila; ``created`` si el cliente no la conocía.
+    latest: Dict[Tuple[str, str], Tuple[bool, Optional[dict]]] = {}
+    for row in page:
+        if row.seq in own_seqs:
+            continue
+        created = latest[(row.entity, row.key)][0] if (row.entity, row.key) in latest else row.op == "insert"
+        latest[(row.entity, row.key)] = (created, None if row.op == "delete" else row.data)
+
+    batches = _batches()
+    for (entity, key), (created, data) in latest.items():
+        batch = batches[entity]
+        if data is not None:
+            batch.upserts.append([key, *(data[name] for name in batch.fields)])
+        elif not created:
+            batch.deletes.append(key)
+    return (page[-1].seq if page else since), len(rows) > SYNC_BATCH_SIZE, batches
+
+
+@router.post("/", response_model=SyncResponse, response_model_exclude_defaults=True)
+def sync(payload: SyncRequest, session: Session = Depends(get_session)):
+    user_id = session.exec(select(User.id).where(User.email == payload.email)).one_or_none()
+    if user_id is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    if len(payload.changes) > SYNC_MAX_CLIENT_CHANGES:
+        raise HTTPException(
+            status_code=413, detail=f"Too many changes: {len(payload.changes)} (max {SYNC_MAX_CLIENT_CHANGES})."
+        )
+
+    database_id = changes.database_id(user_id)
+    since = changes.parse_cursor(session, payload.token, database_id, user_id)
+    results, own_seqs = _apply_changes(session, user_id, since, payload.changes) if payload.changes else ([], set())
+
+    if since is None:
+        seq, batches = _snapshot(session, user_id)
+        has_more = False
+    else:
+        seq, has_more, batches = _delta(session, user_id, since, own_seqs)
+    return SyncResponse(
+        token=f"{database_id}:{seq}",
+        reset=since is None,
+        has_more=has_more,
+        entities={entity: batch for entity, batch in batches.items() if batch.upserts or batch.deletes},
+        results=results,
+    )
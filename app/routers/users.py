@@ -1,6 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlmodel import select, Session
 
+from app import sharding
 from app.database import get_session
 from app.models import User, UserRead, UserCreate
 
@@ -30,6 +31,8 @@ def register_user(
     session.add(user)
     session.commit()
     session.refresh(user)
+    if sharding.SHARD_DATABASE_URLS:
+        sharding.register_user(session, user)
     return user
 
 
@@ -0,0 +1,214 @@
+# app/sharding.py
+"""
+Sharding horizontal de los datos de cada usuario.
+
+Con ``SHARD_DATABASE_URLS`` (URLs separadas por comas) los movimientos y metas
+de cada usuario viven en uno de N shards, y ``DATABASE_URL`` pasa a ser el
+directorio: tabla ``users`` (registro, login y búsqueda por email) y
+``user_shards`` (en qué shard está cada usuario).
+
+- Un usuario nuevo se asigna con un hash consistente sobre su id, de modo que
+  añadir un shard sólo mueve ~1/N de los usuarios (``python -m app.rebalance``).
+- ``ShardedSQLModelSession`` decide el shard de cada consulta a partir de la
+  comparación ``user_id == ...`` del WHERE, así que los routers no cambian.
+- Las búsquedas por id de movimiento (PUT/DELETE /expense/{id}...) prueban los
+  shards en orden; por eso cada shard usa un rango de ids propio
+  (``python -m app.rebalance init-ids``).
+- Cada shard guarda una copia de la fila de ``users`` para las foreign keys.
+- Las tablas que no son de un usuario (``DIRECTORY_MODELS``) viven sólo en
+  el directorio.
+"""
+
+import bisect
+import hashlib
+import os
+import threading
+import time
+from functools import lru_cache
+from typing import Dict, List
+
+from sqlalchemy import insert
+from sqlalchemy.ext.horizontal_shard import ShardedSession
+from sqlalchemy.sql import operators, visitors
+from sqlalchemy.sql.elements import BinaryExpression, BindParameter
+from sqlmodel import Session, select
+
+from app.database import get_engine, make_engine
+from app.models import User, UserShard, CohortSketch, IdempotencyKey, FxRate
+
+SHARD_DATABASE_URLS = [
+    url.strip() for url in os.getenv("SHARD_DATABASE_URLS", "").split(",") if url.strip()
+]
+SHARD_IDS = [f"shard{i}" for i in range(len(SHARD_DATABASE_URLS))]
+DIRECTORY = "directory"
+
+# Ids de cada shard: shard k usa [k * ID_RANGE + 1, (k + 1) * ID_RANGE].
+# Cabe en el INTEGER de 32 bits de las tablas con hasta 21 shards.
+ID_RANGE = 100_000_000
+
+# Tiempo que un worker confía en su copia del directorio. El rebalanceo espera
+# al menos esto entre cambiar el directorio y borrar los datos del shard viejo.
+DIRECTORY_TTL_SECONDS = float(os.getenv("SHARD_DIRECTORY_TTL_SECONDS", "30"))
+
+USER_ID_COLUMNS = ("user_id", "userid")
+
+DIRECTORY_MODELS = (User, UserShard, CohortSketch, IdempotencyKey, FxRate)
+DIRECTORY_TABLES = {Model.__tablename__ for Model in DIRECTORY_MODELS}
+
+
+class HashRing:
+    """Anillo de hash consistente con nodos virtuales."""
+
+    def __init__(self, nodes: List[str], vnodes: int = 64):
+        self._ring = sorted(
+            (self._hash(f"{node}#{i}"), node) for node in nodes for i in range(vnodes)
+        )
+        self._keys = [h for h, _ in self._ring]
+
+    @staticmethod
+    def _hash(key: str) -> int:
+        return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], "big")
+
+    def node_for(self, key) -> str:
+        index = bisect.bisect(self._keys, self._hash(str(key))) % len(self._keys)
+        return self._ring[index][1]
+
+
+@lru_cache(maxsize=None)
+def get_ring() -> HashRing:
+    return HashRing(SHARD_IDS)
+
+
+@lru_cache(maxsize=None)
+def get_shard_engines() -> Dict[str, object]:
+    engines = {
+        shard_id: make_engine(url)
+        for shard_id, url in zip(SHARD_IDS, SHARD_DATABASE_URLS)
+    }
+    engines[DIRECTORY] = get_engine()
+    return engines
+
+
+# ─── Directorio ───────────────────────────────────────────────────────────────
+
+_placements = {}
+_placements_lock = threading.Lock()
+
+
+def shard_for_user(user_id: int) -> str:
+    """Shard del usuario según el directorio (cacheado) o, si no consta, el anillo."""
+    cached = _placements.get(user_id)
+    if cached is not None and time.monotonic() - cached[1] < DIRECTORY_TTL_SECONDS:
+        return cached[0]
+    with Session(get_engine()) as session:
+        placement = session.get(UserShard, user_id)
+    shard_id = placement.shard if placement else get_ring().node_for(user_id)
+    with _placements_lock:
+        _placements[user_id] = (shard_id, time.monotonic())
+    return shard_id
+
+
+def register_user(session: Session, user: User) -> str:
+    """
+    Asigna shard a un usuario recién creado en el directorio y copia su fila
+    de ``users`` al shard. Se llama después del commit del registro.
+    """
+    shard_id = get_ring().node_for(user.id)
+    session.add(UserShard(user_id=user.id, shard=shard_id))
+    session.commit()
+    mirror_user(user, shard_id)
+    return shard_id
+
+
+def mirror_user(user: User, shard_id: str) -> None:
+    values = {"id": user.id, "email": user.email, "username": user.username, "password": user.password}
+    with get_shard_engines()[shard_id].begin() as conn:
+        if conn.execute(select(User.id).where(User.id == user.id)).first() is None:
+            conn.execute(insert(User.__table__).values(**values))
+
+
+def forget_placement(user_id: int) -> None:
+    with _placements_lock:
+        _placements.pop(user_id, None)
+
+
+# ─── Elección de shard por consulta ───────────────────────────────────────────
+
+def _user_ids_in_where(statement, parameters=None) -> List[int]:
+    """
+    Valores de las comparaciones ``user_id == :valor`` del WHERE. Las cargas
+    por clave primaria (``session.get``) pasan el valor como parámetro de
+    ejecución en vez de dejarlo en el bindparam.
+    """
+    whereclause = getattr(statement, "whereclause", None)
+    if whereclause is None:
+        return []
+    parameters = parameters if isinstance(parameters, dict) else {}
+    user_ids = []
+
+    def visit_binary(binary: BinaryExpression):
+        if binary.operator is not operators.eq:
+            return
+        column, value = binary.left, binary.right
+        if isinstance(column, BindParameter):
+            column, value = value, column
+        if getattr(column, "name", None) in USER_ID_COLUMNS and isinstance(value, BindParameter):
+            user_id = parameters.get(value.key, value.effective_value)
+            if user_id is not None:
+                user_ids.append(user_id)
+
+    visitors.traverse(whereclause, {}, {"binary": visit_binary})
+    return user_ids
+
+
+def _targets_directory(statement) -> bool:
+    froms = statement.get_final_froms() if hasattr(statement, "get_final_froms") else []
+    return any(getattr(table, "name", None) in DIRECTORY_TABLES for table in froms)
+
+
+def _shard_chooser(mapper, instance, clause=None):
+    if mapper.class_ in DIRECTORY_MODELS:
+        return DIRECTORY
+    user_id = getattr(instance, "user_id", None)
+    if user_id is None:
+        raise ValueError(f"No se puede elegir shard para {mapper.class_.__name__} sin user_id")
+    return shard_for_user(user_id)
+
+
+def _identity_chooser(mapper, primary_key, *, lazy_loaded_from, execution_options, bind_arguments, **kw):
+    if mapper.class_ in DIRECTORY_MODELS:
+        return [DIRECTORY]
+    if lazy_loaded_from is not None:
+        return [lazy_loaded_from.identity_token]
+    for column, value in zip(mapper.primary_key, primary_key):
+        if column.name in USER_ID_COLUMNS:
+            return [shard_for_user(value)]
+    # Los ids son únicos entre shards: se prueba primero el shard dueño del
+    # rango y después el resto (por si la fila se movió al rebalancear).
+    home = (primary_key[0] - 1) // ID_RANGE if isinstance(primary_key[0], int) else None
+    ordered = list(SHARD_IDS)
+    if home is not None and 0 <= home < len(ordered):
+        ordered.insert(0, ordered.pop(home))
+    return ordered
+
+
+def _execute_chooser(orm_context):
+    user_ids = set(_user_ids_in_where(orm_context.statement, orm_context.parameters))
+    if user_ids:
+        return sorted({shard_for_user(user_id) for user_id in user_ids})
+    if _targets_directory(orm_context.statement):
+        return [DIRECTORY]
+    return list(SHARD_IDS)
+
+
+class ShardedSQLModelSession(ShardedSession, Session):
+    """ShardedSession de SQLAlchemy con la API ``exec()`` de SQLModel."""
+
+    def __init__(self, **kwargs):
+        super().__init__(
+            shard_chooser=_shard_chooser,
+            identity_chooser=_identity_chooser,
+            execute_chooser=_execute_chooser,
+            shards=get_shard_engines(),
+            **kwargs,
+        )
@@ -0,0 +1,169 @@
+# app/signals.py
+"""
+Ganchos sobre las escrituras hechas con cualquier sesión de la aplicación.
+
+Antes de cada flush se anotan en ``session.info`` los usuarios cuyas filas se
+insertan, modifican o borran y, para movimientos y metas, los meses afectados
+(incluido el mes anterior si cambió la fecha). Después:
+
+- ``on_before_commit(listener)``: ``listener(session, months)`` se llama dentro
+  de la misma transacción, justo antes del commit, con {(user_id, mes)}.
+- ``on_commit(listener)``: ``listener(user_ids)`` se llama tras el commit.
+- ``on_commit_rows(listener)``: ``listener(rows)`` se llama tras el commit con
+  {modelo: {(user_id, id)}} de los movimientos insertados, modificados o
+  borrados (con el usuario anterior también si cambió).
+
+Así los routers no necesitan llamar a nada explícitamente después de escribir.
+Las inserciones en bloque con Core, que el ORM no ve, se anotan con
+``record_bulk_rows`` (o ``record_bulk_users`` si la tabla no tiene id).
+"""
+
+from datetime import date as pydate
+from typing import Callable, Dict, Iterable, List, Set
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from app.models import (
+    User,
+    Income,
+    Expense,
+    Saving,
+    Investment,
+    ExpenseGoal,
+    SavingGoal,
+    InvestmentGoal,
+)
+
+LEDGER_MODELS = (Income, Expense, Saving, Investment, ExpenseGoal, SavingGoal, InvestmentGoal)
+# Movimientos con id propio, de los que on_commit_rows informa fila a fila.
+ROW_MODELS = (Income, Expense, Saving, Investment)
+
+_before_commit_listeners: List[Callable] = []
+_commit_listeners: List[Callable[[Set[int]], None]] = []
+_commit_rows_listeners: List[Callable[[Dict[type, Set[tuple]]], None]] = []
+
+
+def on_before_commit(listener: Callable) -> Callable:
+    """Registra ``listener(session, months)``; se ejecuta dentro de la transacción."""
+    _before_commit_listeners.append(listener)
+    return listener
+
+
+def on_commit(listener: Callable[[Set[int]], None]) -> Callable[[Set[int]], None]:
+    """Registra ``listener(user_ids)``; se llama tras cada commit con escrituras."""
+    _commit_listeners.append(listener)
+    return listener
+
+
+def on_commit_rows(listener: Callable[[Dict[type, Set[tuple]]], None]) -> Callable[[Dict[type, Set[tuple]]], None]:
+    """Registra ``listener(rows)``; se llama tras cada commit que toque movimientos."""
+    _commit_rows_listeners.append(listener)
+    return listener
+
+
+def record_bulk_rows(session, Model, rows: Iterable[tuple]) -> None:
+    """
+    Anota filas ``(user_id, id)`` de ``Model`` insertadas con Core para que
+    on_commit y on_commit_rows las vean. No anota meses: quien inserta en
+    bloque recalcula goal_status en bloque (reconcile_goals.reconcile_users).
+    """
+    touched = session.info.setdefault("touched_users", set())
+    touched_rows = session.info.setdefault("touched_rows", {}).setdefault(Model, set())
+    for user_id, row_id in rows:
+        touched.add(user_id)
+        touched_rows.add((user_id, row_id))
+
+
+def record_bulk_users(session, user_ids: Iterable[int]) -> None:
+    """Como record_bulk_rows, para escrituras con Core en tablas sin id (metas)."""
+    session.info.setdefault("touched_users", set()).update(user_ids)
+
+
+def month_start(value: pydate) -> pydate:
+    return pydate(value.year, value.month, 1)
+
+
+def _owner_id(obj):
+    if isinstance(obj, User):
+        return obj.id
+    return getattr(obj, "user_id", None)
+
+
+def _touched_months(obj, deleted: bool) -> Set[tuple]:
+    state = inspect(obj)
+    user_history = state.attrs.user_id.history
+    date_history = state.attrs.date.history
+    if deleted:
+        users = set(user_history.unchanged or ()) | set(user_history.deleted or ()) | {obj.user_id}
+        dates = set(date_history.unchanged or ()) | set(date_history.deleted or ()) | {obj.date}
+    else:
+        users = {obj.user_id} | set(user_history.deleted or ())
+        dates = {obj.date} | set(date_history.deleted or ())
+    return {
+        (user_id, month_start(value))
+        for user_id in users if user_id is not None
+        for value in dates if value is not None
+    }
+
+
+@event.listens_for(Session, "before_flush")
+def _collect_touched(session, flush_context, instances):
+    touched = session.info.setdefault("touched_users", set())
+    months = session.info.setdefault("touched_months", set())
+    for objects, deleted in ((session.new, False), (session.dirty, False), (session.deleted, True)):
+        for obj in list(objects):
+            user_id = _owner_id(obj)
+            if user_id is not None:
+                touched.add(user_id)
+            if isinstance(obj, LEDGER_MODELS):
+                months.update(_touched_months(obj, deleted))
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_new_users(session, flush_context):
+    # Los usuarios recién registrados y los movimientos nuevos sólo tienen id
+    # después del INSERT.
+    touched = session.info.setdefault("touched_users", set())
+    for obj in session.new:
+        if isinstance(obj, User) and obj.id is not None:
+            touched.add(obj.id)
+    if not _commit_rows_listeners:
+        return
+    rows = session.info.setdefault("touched_rows", {})
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, ROW_MODELS) and obj.id is not None:
+            user_ids = {obj.user_id} | set(inspect(obj).attrs.user_id.history.deleted or ())
+            rows.setdefault(type(obj), set()).update((user_id, obj.id) for user_id in user_ids)
+
+
+@event.listens_for(Session, "before_commit")
+def _run_before_commit(session):
+    if not _before_commit_listeners:
+        return
+    session.flush()
+    months = session.info.pop("touched_months", None)
+    if not months:
+        return
+    for listener in _before_commit_listeners:
+        listener(session, months)
+
+
+@event.listens_for(Session, "after_commit")
+def _notify_commit(session):
+    session.info.pop("touched_months", None)
+    rows = session.info.pop("touched_rows", None)
+    touched = session.info.pop("touched_users", None)
+    if touched:
+        for listener in _commit_listeners:
+            listener(touched)
+    if rows:
+        for listener in _commit_rows_listeners:
+            listener(rows)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_touched(session, previous_transaction):
+    session.info.pop("touched_users", None)
+    session.info.pop("touched_months", None)
+    session.info.pop("touched_rows", None)
@@ -0,0 +1,129 @@
+# app/singleflight.py
+"""
+Agrupa peticiones idénticas y simultáneas a los endpoints de agregados
+(/dashboard, /history): la primera calcula y las que llegan mientras tanto
+con los mismos parámetros esperan y reciben su resultado. No es una caché:
+en cuanto termina el cálculo, la siguiente petición vuelve a calcular.
+
+    @router.get("/")
+    @singleflight.coalesce("dashboard")
+    def get_dashboard(*, email: str = Query(...), ..., session: Session = Depends(...)):
+
+- La clave son el nombre y los argumentos del endpoint salvo la sesión.
+- Una petición no se une a un cálculo que empezó antes del último commit que
+  tocó a ese usuario (``signals.on_commit``): quien acaba de escribir ve su
+  escritura, como con get_read_session.
+- Si el cálculo falla, todas las peticiones que esperaban reciben el mismo
+  error.
+- ``stats()`` (GET /stats/) cuenta, por endpoint, los cálculos y las
+  peticiones que se ahorraron.
+
+Sólo para endpoints síncronos (corren en el threadpool) que no modifican lo
+que devuelven después de devolverlo.
+"""
+
+import functools
+import threading
+import time
+from typing import Dict
+
+from sqlalchemy.orm import Session
+
+from app import signals
+from app.database import user_id_for_email
+
+
+class _Flight:
+    __slots__ = ("started", "done", "result", "error")
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+_flights: Dict[tuple, _Flight] = {}
+_stats: Dict[str, Dict[str, int]] = {}
+# user_id -> último commit suyo, sólo mientras hay cálculos en curso.
+_last_write: Dict[int, float] = {}
+_lock = threading.Lock()
+
+
+@signals.on_commit
+def _note_writes(user_ids):
+    if not _flights:
+        return
+    now = time.monotonic()
+    with _lock:
+        if _flights:
+            oldest = min(flight.started for flight in _flights.values())
+            for user_id in [user_id for user_id, written_at in _last_write.items() if written_at < oldest]:
+                del _last_write[user_id]
+        for user_id in user_ids:
+            _last_write[user_id] = now
+
+
+def _writer_id(email):
+    # Sólo hace falta si hay un cálculo al que unirse y escrituras anotadas:
+    # si no, cualquier cálculo que encuentre después empezó tras la última
+    # escritura del usuario.
+    if not _flights or not _last_write or not isinstance(email, str):
+        return None
+    return user_id_for_email(email)
+
+
+def coalesce(name: str, user_param: str = "email"):
+    """Decorador: las llamadas idénticas y simultáneas a ``name`` comparten un único cálculo."""
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(**kwargs):
+            key = (name,) + tuple(sorted(
+                (param, value) for param, value in kwargs.items() if not isinstance(value, Session)
+            ))
+            # Fuera del lock: puede consultar la base de datos.
+            user_id = _writer_id(kwargs.get(user_param))
+            # Unirse o calcular se decide y se anota en un solo paso: dos
+            # peticiones idénticas simultáneas no pueden calcular las dos.
+            with _lock:
+                stats = _stats.setdefault(name, {"computed": 0, "coalesced": 0})
+                flight = _flights.get(key)
+                # Si había un cálculo anterior a una escritura, éste lo
+                # sustituye para los que lleguen después.
+                lead = flight is None or _last_write.get(user_id, 0.0) >= flight.started
+                if lead:
+                    flight = _flights[key] = _Flight()
+                    stats["computed"] += 1
+                else:
+                    stats["coalesced"] += 1
+            if not lead:
+                flight.done.wait()
+                if flight.error is not None:
+                    raise flight.error
+                return flight.result
+
+            try:
+                flight.result = fn(**kwargs)
+                return flight.result
+            except Exception as e:
+                flight.error = e
+                raise
+            finally:
+                with _lock:
+                    if _flights.get(key) is flight:
+                        del _flights[key]
+                flight.done.set()
+
+        return wrapper
+
+    return decorator
+
+
+def stats() -> Dict[str, Dict[str, int]]:
+    """Por endpoint: ``computed`` (cálculos), ``coalesced`` (peticiones que esperaron otro) e ``in_flight``."""
+    with _lock:
+        result = {name: dict(counts, in_flight=0) for name, counts in _stats.items()}
+        for key in _flights:
+            result[key[0]]["in_flight"] += 1
+    return result
@@ -0,0 +1,78 @@
+# app/startup_profile.py
+"""
+Perfil de arranque en frío: importa app.main en un proceso nuevo con
+``python -X importtime`` y muestra qué paquetes se llevan el tiempo.
+
+    python -m app.startup_profile                  # modo normal
+    python -m app.startup_profile --lazy           # WEALTHTRACK_LAZY_STARTUP=1
+    python -m app.startup_profile --lazy --budget-ms 600
+
+Con ``--budget-ms`` termina con código 1 si el import supera el presupuesto,
+para poder usarlo como comprobación en CI.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+from collections import defaultdict
+from typing import Tuple
+
+
+def profile_import(lazy: bool, module: str = "app.main") -> list:
+    """Devuelve [(módulo, self_us, cumulative_us, nivel)] en orden de import."""
+    env = dict(os.environ)
+    env["WEALTHTRACK_LAZY_STARTUP"] = "1" if lazy else "0"
+    env.setdefault("DATABASE_URL", "sqlite://")
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        level = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), int(self_us), int(cumulative_us), level))
+    return rows
+
+
+def summarize(rows: list, top: int = 15) -> Tuple[float, list]:
+    """Tiempo total (ms) y los paquetes raíz que más tiempo propio suman."""
+    total_us = sum(self_us for _, self_us, _, _ in rows)
+    by_package = defaultdict(int)
+    for name, self_us, _, _ in rows:
+        by_package[name.split(".")[0]] += self_us
+    ranking = sorted(by_package.items(), key=lambda item: item[1], reverse=True)[:top]
+    return total_us / 1000, [(name, us / 1000) for name, us in ranking]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lazy", action="store_true", help="Perfilar el modo WEALTHTRACK_LAZY_STARTUP=1")
+    parser.add_argument("--budget-ms", type=float, default=None, help="Falla si el import supera este tiempo")
+    parser.add_argument("--runs", type=int, default=3, help="Repeticiones; se toma la mediana")
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    profiles = [summarize(profile_import(args.lazy), args.top) for _ in range(args.runs)]
+    profiles.sort(key=lambda p: p[0])
+    total_ms, ranking = profiles[len(profiles) // 2]
+
+    mode = "lazy" if args.lazy else "eager"
+    print(f"import app.main ({mode}): {total_ms:.1f} ms (mediana de {args.runs})")
+    for name, ms in ranking:
+        print(f"  {name:30} {ms:8.1f} ms")
+
+    if args.budget_ms is not None and total_ms > args.budget_ms:
+        print(f"Presupuesto de arranque superado: {total_ms:.1f} ms > {args.budget_ms:.1f} ms")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,226 @@
+# app/year_reports.py
+"""
+Resumen anual precalculado de cada usuario (tabla ``year_reports``), servido
+por /reports/{year}: totales por tipo de movimiento, desglose por categoría,
+porcentaje de metas cumplidas por tipo y mejor y peor mes. Los importes van
+en EUR (fx.BASE_CURRENCY), como /history.
+
+Cada fila guarda los componentes de cada mes (totales, categorías y
+goal_status) y el resumen calculado a partir de ellos. Las escrituras no
+recalculan nada: marcan el mes como desactualizado (``stale_months``), en la
+misma transacción:
+
+- ORM: con ``signals.on_before_commit`` (incluido el mes anterior si cambió la
+  fecha).
+- Escrituras en bloque con Core (app/csv_import.py, app/jobs/recurring.py):
+  quien escribe llama a ``mark_stale``, como a reconcile_users.
+
+Al leer, o con ``python -m app.jobs.year_reports``, se recalculan sólo los
+meses marcados y se vuelve a sumar el resumen. Marcar es un upsert atómico que
+sube ``version``; el recálculo sólo se guarda si ``version`` no cambió
+mientras leía, así que una escritura concurrente nunca se pierde.
+
+Los cambios de tipos de cambio (app/jobs/fx_rates.py) no marcan nada: tras
+corregir tipos pasados, ``python -m app.jobs.year_reports --full``.
+"""
+
+from collections import defaultdict
+from datetime import date as pydate, datetime, timezone
+from typing import Dict, Iterable, List, Tuple
+
+from sqlalchemy import extract, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.horizontal_shard import ShardedSession
+from sqlmodel import Session, select
+
+from app import fx, signals
+from app.goal_status import GOAL_TYPES
+from app.models import Income, Expense, Saving, Investment, GoalStatus, YearReport
+
+LEDGERS = {"income": Income, "expenses": Expense, "savings": Saving, "investments": Investment}
+CATEGORIZED = ("expenses", "savings", "investments")
+ALL_MONTHS = (1 << 12) - 1
+
+
+def _connection(session, user_id: int):
+    # Las sentencias Core no pasan por el shard_chooser: con sharding, la
+    # conexión del shard del usuario.
+    if isinstance(session, ShardedSession):
+        from app.sharding import shard_for_user
+
+        return session.connection(bind_arguments={"shard_id": shard_for_user(user_id)})
+    return session.connection()
+
+
+def mark_stale(session, months: Iterable[Tuple[int, pydate]]) -> None:
+    """Marca como desactualizados los meses de ``(user_id, fecha)`` en sus resúmenes anuales."""
+    masks: Dict[Tuple[int, int], int] = defaultdict(int)
+    for user_id, day in months:
+        masks[(user_id, day.year)] |= 1 << (day.month - 1)
+    if not masks:
+        return
+    table = YearReport.__table__
+    by_user = defaultdict(list)
+    for (user_id, year), mask in masks.items():
+        by_user[user_id].append({"user_id": user_id, "year": year, "months": {}, "report": {},
+                                 "stale_months": mask, "version": 1})
+    for user_id, rows in sorted(by_user.items()):
+        conn = _connection(session, user_id)
+        dialect = postgresql if conn.dialect.name == "postgresql" else sqlite
+        insert = dialect.insert(table)
+        # Si no hay resumen, queda una fila vacía con los meses marcados: la
+        # primera lectura la completa.
+        conn.execute(
+            insert.on_conflict_do_update(
+                index_elements=[table.c.user_id, table.c.year],
+                set_={
+                    "stale_months": table.c.stale_months.op("|")(insert.excluded.stale_months),
+                    "version": table.c.version + 1,
+                },
+            ),
+            rows,
+        )
+
+
+@signals.on_before_commit
+def _mark_touched_months(session, months):
+    mark_stale(session, months)
+
+
+# ─── Cálculo ────────────────────────────────────────────────────────────────────
+
+def _totals(session: Session, Model, user_id: int, start: pydate, end: pydate, by: Tuple[str, ...]) -> dict:
+    # Con ANALYTICS_DUCKDB_PATH, en la copia de DuckDB (import aquí: app.analytics
+    # importa app.database, que importa este módulo).
+    from app import analytics
+
+    if analytics.enabled():
+        return analytics.converted_totals(session, Model, user_id, start, end, by=by)
+    keys = {"month": extract("month", Model.date), "category": getattr(Model, "category", None)}
+    where = (Model.user_id == user_id, Model.date >= start, Model.date < end)
+    return fx.converted_totals(session, Model, where, keys=tuple(keys[name] for name in by))
+
+
+def _month_components(session: Session, user_id: int, year: int, months: List[int]) -> Dict[str, dict]:
+    start = pydate(year, min(months), 1)
+    end = pydate(year + 1, 1, 1) if max(months) == 12 else pydate(year, max(months) + 1, 1)
+    components = {
+        str(month): {
+            **{ledger: 0.0 for ledger in LEDGERS},
+            "categories": {ledger: {} for ledger in CATEGORIZED},
+            "goals": {},
+        }
+        for month in months
+    }
+
+    for ledger, Model in LEDGERS.items():
+        if ledger not in CATEGORIZED:
+            totals = _totals(session, Model, user_id, start, end, ("month",))
+            for (month,), total in totals.items():
+                if str(int(month)) in components:
+                    components[str(int(month))][ledger] = total
+            continue
+        totals = _totals(session, Model, user_id, start, end, ("month", "category"))
+        for (month, category), total in totals.items():
+            component = components.get(str(int(month)))
+            if component is not None:
+                component["categories"][ledger][category] = total
+                component[ledger] = round(component[ledger] + total, 2)
+
+    statuses = session.exec(
+        select(GoalStatus).where(GoalStatus.user_id == user_id, GoalStatus.month >= start, GoalStatus.month < end)
+    ).all()
+    for status in statuses:
+        component = components.get(str(status.month.month))
+        if component is not None:
+            component["goals"][status.goal_type] = [float(status.goal_value), float(status.actual_value), status.met]
+    return components
+
+
+def summarize(year: int, months: Dict[str, dict]) -> dict:
+    """Resumen anual a partir de los componentes de los 12 meses."""
+    ordered = [months[str(month)] for month in range(1, 13)]
+    categories = {ledger: defaultdict(float) for ledger in CATEGORIZED}
+    for component in ordered:
+        for ledger in CATEGORIZED:
+            for category, total in component["categories"][ledger].items():
+                categories[ledger][category] += total
+
+    goals = {}
+    for goal_type in GOAL_TYPES:
+        entries = [component["goals"][goal_type] for component in ordered if goal_type in component["goals"]]
+        met = sum(1 for entry in entries if entry[2])
+        goals[goal_type] = {
+            "months": len(entries),
+            "met": met,
+            "goal_met_percentage": round(met / len(entries) * 100, 1) if entries else 0.0,
+        }
+
+    # Balance del mes: ingresos menos gastos (ahorro e inversión son destinos
+    # del dinero, no gasto). Mejor y peor mes, entre los que tuvieron movimientos.
+    monthly = [
+        {"month": month, **{ledger: component[ledger] for ledger in LEDGERS},
+         "net": round(component["income"] - component["expenses"], 2)}
+        for month, component in enumerate(ordered, start=1)
+    ]
+    active = [entry for entry in monthly if any(entry[ledger] for ledger in LEDGERS)]
+    best = max(active, key=lambda entry: entry["net"]) if active else None
+    worst = min(active, key=lambda entry: entry["net"]) if active else None
+
+    return {
+        "year": year,
+        "currency": fx.BASE_CURRENCY,
+        "totals": {ledger: round(sum(entry[ledger] for entry in monthly), 2) for ledger in LEDGERS},
+        "categories": {
+            ledger: {category: round(total, 2) for category, total in sorted(totals.items())}
+            for ledger, totals in categories.items()
+        },
+        "goals": goals,
+        "months": monthly,
+        "best_month": {"month": best["month"], "net": best["net"]} if best else None,
+        "worst_month": {"month": worst["month"], "net": worst["net"]} if worst else None,
+    }
+
+
+def refresh(session: Session, user_id: int, year: int, full: bool = False) -> dict:
+    """Recalcula los meses desactualizados (o todos) del resumen y lo guarda; hace commit."""
+    table = YearReport.__table__
+    conn = _connection(session, user_id)
+    # La versión antes que los datos: si algo cambia mientras se leen, el
+    # UPDATE no encuentra la versión y el mes sigue marcado.
+    stored = conn.execute(
+        select(table.c.months, table.c.stale_months, table.c.version)
+        .where(table.c.user_id == user_id, table.c.year == year)
+    ).first()
+    months = dict(stored.months) if stored is not None and not full else {}
+    stale = stored.stale_months if stored is not None and not full else ALL_MONTHS
+    rebuild = [month for month in range(1, 13) if stale & (1 << (month - 1)) or str(month) not in months]
+    if rebuild:
+        months.update(_month_components(session, user_id, year, rebuild))
+    report = summarize(year, months)
+
+    values = {"months": months, "report": report, "stale_months": 0, "built_at": datetime.now(timezone.utc)}
+    if stored is None:
+        dialect = postgresql if conn.dialect.name == "postgresql" else sqlite
+        conn.execute(
+            dialect.insert(table).values(user_id=user_id, year=year, version=0, **values).on_conflict_do_nothing()
+        )
+    else:
+        conn.execute(
+            update(table)
+            .where(table.c.user_id == user_id, table.c.year == year, table.c.version == stored.version)
+            .values(**values)
+        )
+    session.commit()
+    return report
+
+
+def get_report(session: Session, user_id: int, year: int) -> dict:
+    """El resumen guardado, recalculando antes lo que haya cambiado."""
+    table = YearReport.__table__
+    stored = _connection(session, user_id).execute(
+        select(table.c.report, table.c.stale_months).where(table.c.user_id == user_id, table.c.year == year)
+    ).first()
+    if stored is not None and not stored.stale_months:
+        return stored.report
+    return refresh(session, user_id, year)
@@ -0,0 +1,150 @@
+"""
+Mide /import/bulk con un zip de muchos CSV de muchos usuarios.
+
+    python benchmarks/bulk_import.py [--files 200] [--rows-per-file 5000] [--workers 1 2 4]
+
+Sin --database-url usa un SQLite temporal migrado con ``python -m app.migrate``.
+Primero mide sólo el parseo de todos los ficheros (en el proceso, y con
+ProcessPoolExecutor para cada número de --workers) y después la petición
+completa (zip -> pool -> escritor único), con IMPORT_WORKERS = el mayor,
+y otra vez con el mismo zip, en el que todas las filas ya están importadas.
+
+Resultado en SQLite, 200 ficheros x 5000 filas (1.000.000 de gastos, 200
+usuarios), en una máquina de 1 núcleo:
+    parseo en el proceso       1,3 s
+    parseo, 1 worker           1,5 s
+    parseo, 2 workers          1,6 s
+    /import/bulk              24,1 s   (~41.000 filas/s)
+    las mismas filas con el /import/csv anterior, fichero a fichero
+    (strptime y un objeto ORM por fila): 35,7 s
+
+Con la deduplicación por content_hash (migración 0011):
+    /import/bulk              28,5 s   (~35.000 filas/s)
+    mismo zip otra vez        13,5 s   (1.000.000 duplicadas, 0 escritas)
+Sólo el escritor, medido aparte con la misma carga: 26,2 s sin huellas y
+24,4 s con ellas (el ruido de la máquina es mayor que la diferencia). Con el
+índice único empezando por content_hash eran 44,8 s: cada lote de 50.000
+filas ensuciaba casi todas las hojas del índice. Con (user_id, content_hash,
+date) las filas de un fichero caen juntas. Calcular las huellas son ~2,5 s
+por millón de filas.
+
+Con el registro de cambios (tabla changes, migración 0012), que añade una
+fila por movimiento importado en la misma transacción:
+    /import/bulk              39,3 s   (~25.000 filas/s)
+    mismo zip otra vez        11,1 s   (nada que registrar)
+Un millón de filas de changes son ~3,4 s para preparar las entradas y
+~11,7 s para el INSERT con Core (2,6 s el mismo executemany con sqlite3 a
+pelo, más ~2,2 s de json.dumps; el resto es el procesado de parámetros de
+SQLAlchemy).
+
+Con un núcleo el pool no puede escalar: sólo se ve su coste (serializar
+los resultados, ~0,2 s, ya por columnas; con un date y un Decimal por fila
+eran ~5 s). El parseo es independiente por fichero, así que con N núcleos
+se reparte entre N procesos y se solapa con el escritor. En SQLite el
+escritor es el límite (~22 s: los índices de expenses y los triggers FTS5
+de la migración 0010), y el mismo INSERT sin pasar por Core sólo ganaba
+un 35 %.
+"""
+
+import argparse
+import io
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date as pydate, timedelta
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+CATEGORIES = ["vivienda", "alimentación", "transporte", "salud", "entretenimiento", "otros"]
+
+
+def build_files(count: int, rows_per_file: int):
+    random.seed(0)
+    start_day = pydate(2021, 1, 1)
+    files = []
+    for index in range(count):
+        lines = ["date,amount,category"]
+        for _ in range(rows_per_file):
+            day = start_day + timedelta(days=random.randrange(5 * 365))
+            lines.append(f"{day.isoformat()},{random.uniform(1, 2000):.2f},{random.choice(CATEGORIES)}")
+        files.append((f"user{index}/expenses.csv", f"user{index}@example.com", ("\n".join(lines) + "\n").encode()))
+    return files
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--rows-per-file", type=int, default=5000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--database-url", default=None)
+    args = parser.parse_args()
+
+    if args.database_url is None:
+        path = Path(tempfile.mkdtemp()) / "bulk_import.db"
+        args.database_url = f"sqlite:///{path}"
+    os.environ["DATABASE_URL"] = args.database_url
+    os.environ["IMPORT_WORKERS"] = str(max(args.workers))
+    os.environ.setdefault("ANOMALY_MODE", "off")
+    subprocess.run([sys.executable, "-m", "app.migrate"], cwd=ROOT, check=True, capture_output=True)
+
+    from fastapi.testclient import TestClient
+    from sqlalchemy import insert
+
+    from app.csv_import import parse_csv, shutdown_pool
+    from app.database import get_engine
+    from app.main import app
+    from app.models import User
+
+    files = build_files(args.files, args.rows_per_file)
+    total_rows = args.files * args.rows_per_file
+
+    began = time.perf_counter()
+    for _, _, content in files:
+        parse_csv("expenses", content)
+    print(f"parseo en el proceso     {time.perf_counter() - began:5.1f} s")
+
+    for workers in args.workers:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(parse_csv, ["expenses"] * workers, [b"date,amount,category\n"] * workers))
+            began = time.perf_counter()
+            list(pool.map(parse_csv, ["expenses"] * len(files), [content for _, _, content in files]))
+            print(f"parseo, {workers} workers        {time.perf_counter() - began:5.1f} s")
+
+    with get_engine().begin() as conn:
+        conn.execute(insert(User.__table__), [
+            {"email": email, "password": "x"} for _, email, _ in files
+        ])
+
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("manifest.csv", "file,email,data_type\n" + "".join(
+            f"{name},{email},expenses\n" for name, email, _ in files
+        ))
+        for name, _, content in files:
+            archive.writestr(name, content)
+
+    client = TestClient(app)
+    began = time.perf_counter()
+    response = client.post("/import/bulk", files={"file": ("bulk.zip", buffer.getvalue(), "application/zip")})
+    elapsed = time.perf_counter() - began
+    assert response.status_code == 200, response.text
+    assert response.json()["imported_rows"] == total_rows, response.json()["failed_files"]
+    print(f"/import/bulk             {elapsed:5.1f} s   ({total_rows / elapsed:,.0f} filas/s)")
+
+    began = time.perf_counter()
+    response = client.post("/import/bulk", files={"file": ("bulk.zip", buffer.getvalue(), "application/zip")})
+    elapsed = time.perf_counter() - began
+    assert response.json()["duplicate_rows"] == total_rows, response.text[:500]
+    print(f"mismo zip otra vez       {elapsed:5.1f} s   (todas duplicadas)")
+    shutdown_pool()
+
+
+if __name__ == "__main__":
+    main()
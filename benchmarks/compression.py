@@ -0,0 +1,89 @@
+"""
+Mide tamaño y tiempo de compresión de payloads típicos de la API construidos a
+partir de db_scripts/five_year_history.sql.
+
+    python benchmarks/compression.py
+"""
+
+import gzip
+import json
+import re
+import time
+from collections import defaultdict
+from pathlib import Path
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+DATASET = Path(__file__).resolve().parent.parent / "db_scripts" / "five_year_history.sql"
+INSERT_RE = re.compile(r"INSERT INTO (\w+) \(([^)]*)\) VALUES \(([^)]*)\);")
+
+
+def load_rows():
+    tables = defaultdict(list)
+    for match in INSERT_RE.finditer(DATASET.read_text()):
+        table, columns, values = match.groups()
+        columns = [c.strip() for c in columns.split(",")]
+        values = [v.strip().strip("'") for v in values.split(",")]
+        tables[table.lower()].append(dict(zip(columns, values)))
+    return tables
+
+
+def build_payloads(tables):
+    def rows(table, month=None):
+        return [
+            {"id": i, "date": r["date"], "amount": float(r["amount"]), "category": r["category"]}
+            for i, r in enumerate(tables[table], 1)
+            if month is None or r["date"].startswith(month)
+        ]
+
+    month = max(r["date"] for r in tables["expenses"])[:7]
+    dashboard = {
+        "incomeTotal": 0.0,
+        "expenses": rows("expenses", month),
+        "savings": rows("savings", month),
+        "investments": rows("investments", month),
+    }
+    totals = defaultdict(float)
+    for r in tables["expenses"]:
+        totals[r["date"][:7]] += float(r["amount"])
+    history = {
+        "entries": [
+            {"year": int(k[:4]), "month": int(k[5:]), "total": round(v, 2)}
+            for k, v in sorted(totals.items())
+        ],
+    }
+    export = {"expenses": rows("expenses"), "savings": rows("savings"), "investments": rows("investments")}
+    return {"dashboard (1 mes)": dashboard, "history ?period=60": history, "export 5 años": export}
+
+
+def timed(fn, body, repeat=50):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        out = fn(body)
+    return out, (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    payloads = build_payloads(load_rows())
+    codecs = {
+        "gzip-1": lambda b: gzip.compress(b, compresslevel=1, mtime=0),
+        "gzip-6": lambda b: gzip.compress(b, compresslevel=6, mtime=0),
+        "gzip-9": lambda b: gzip.compress(b, compresslevel=9, mtime=0),
+    }
+    if brotli is not None:
+        codecs["br-4"] = lambda b: brotli.compress(b, quality=4)
+        codecs["br-11"] = lambda b: brotli.compress(b, quality=11)
+
+    for name, payload in payloads.items():
+        body = json.dumps(payload).encode()
+        print(f"{name}: {len(body) / 1024:.1f} KB")
+        for codec, fn in codecs.items():
+            out, ms = timed(fn, body)
+            print(f"  {codec:6} {len(out) / 1024:7.1f} KB  {len(out) / len(body):6.1%}  {ms:6.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
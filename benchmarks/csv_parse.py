@@ -0,0 +1,102 @@
+"""
+Compara los parsers de CSV de /import con un fichero de un millón de gastos.
+
+    python benchmarks/csv_parse.py [--rows 1000000] [--bad-every 100]
+
+- bucle original: csv.reader + strptime + Decimal fila a fila, como hacía
+  import_csv_data antes de app/csv_import.py (sin validar categorías y
+  parando en el primer error; aquí se le pasa el fichero sin errores).
+- fila a fila: ``_parse_rows`` (el que se usa si hay comillas).
+- por columnas: ``parse_csv`` sin comillas, fechas e importes validados
+  sobre matrices de bytes con NumPy.
+
+Los dos últimos se miden también con una fila mala de cada --bad-every
+(fecha, número de columnas o categoría) y devuelven todos los errores.
+
+Resultado (1.000.000 de filas, 29 MB; máquina de 1 núcleo, con bastante
+ruido entre ejecuciones):
+    bucle original               7,95 s
+    fila a fila                  5,85 s
+    por columnas                 1,86 s
+    fila a fila, 1/100 malas     4,81 s   (10.000 errores)
+    por columnas, 1/100 malas    1,44 s   (10.000 errores)
+
+Por columnas, la mitad del tiempo es partir el fichero en campos y
+convertirlos a matrices de bytes; los importes (una pasada por carácter)
+son ~0,3 s y las fechas ~0,1 s.
+"""
+
+import argparse
+import csv
+import io
+import random
+import sys
+import time
+from datetime import date as pydate, datetime, timedelta
+from decimal import Decimal
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+CATEGORIES = ["vivienda", "alimentación", "transporte", "salud", "entretenimiento", "otros"]
+BAD_VALUES = ["2024-02-30,10.00,otros", "2024-01-01,12,5,otros", "2024-01-01,10.00,ocio"]
+
+
+def build_file(rows: int, bad_every: int = 0) -> bytes:
+    random.seed(0)
+    start_day = pydate(2021, 1, 1)
+    lines = ["date,amount,category"]
+    for index in range(rows):
+        if bad_every and index % bad_every == bad_every - 1:
+            lines.append(BAD_VALUES[index // bad_every % len(BAD_VALUES)])
+            continue
+        day = start_day + timedelta(days=random.randrange(5 * 365))
+        lines.append(f"{day.isoformat()},{random.uniform(1, 2000):.2f},{random.choice(CATEGORIES)}")
+    return ("\n".join(lines) + "\n").encode()
+
+
+def original_loop(content: bytes) -> list:
+    reader = csv.reader(io.StringIO(content.decode("utf-8")))
+    next(reader)
+    records = []
+    for i, row in enumerate(reader, 2):
+        if len(row) not in (3, 4):
+            raise ValueError(f"Row {i}: Expected 3 or 4 columns, found {len(row)}")
+        records.append((datetime.strptime(row[0], "%Y-%m-%d").date(), Decimal(row[1]), row[2]))
+    return records
+
+
+def timed(label: str, function, *args):
+    began = time.perf_counter()
+    result = function(*args)
+    elapsed = time.perf_counter() - began
+    errors = getattr(result, "errors", None)
+    suffix = f"   ({len(errors) and errors[-1]})" if errors else ""
+    print(f"{label:28}{elapsed:5.2f} s{suffix}")
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--bad-every", type=int, default=100)
+    args = parser.parse_args()
+
+    from app.csv_import import _parse_rows, parse_csv
+
+    content = build_file(args.rows)
+    print(f"{args.rows} filas, {len(content) / 1e6:.0f} MB")
+    timed("bucle original", original_loop, content)
+    rows = timed("fila a fila", _parse_rows, "expenses", content.decode())
+    columns = timed("por columnas", parse_csv, "expenses", content)
+    assert rows.records() == columns.records()
+
+    content = build_file(args.rows, args.bad_every)
+    rows = timed(f"fila a fila, 1/{args.bad_every} malas", _parse_rows, "expenses", content.decode())
+    columns = timed(f"por columnas, 1/{args.bad_every} malas", parse_csv, "expenses", content)
+    assert rows.errors == columns.errors and rows.records() == columns.records()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+Mide el modo embebido (un solo nodo con SQLite): escrituras con y sin los
+PRAGMAs de app/database.py y /history/ en SQLite y en la copia de DuckDB
+(app/analytics.py).
+
+    python benchmarks/embedded.py [--rows 1000000] [--users 1000] [--requests 200]
+
+Usa un SQLite temporal migrado con ``python -m app.migrate`` con movimientos
+de los últimos cinco años. Pasa por la aplicación completa (TestClient):
+
+- POST /expense/ (con registro de cambios, goal_status y resúmenes anuales),
+  primero con los valores por defecto de SQLite (journal_mode=DELETE,
+  synchronous=FULL) y después con SQLITE_PRAGMAS.
+- GET /history/?period=60 de gastos de usuarios al azar, en SQLite y con
+  ANALYTICS_DUCKDB_PATH=:memory: (la copia se carga antes de medir; cada
+  petición incluye la comprobación de cambios nuevos).
+
+Objetivos: escrituras p95 < 25 ms, /history/ p95 < 50 ms.
+
+Resultado (1 CPU), 1.000.000 de filas, 1000 usuarios (~600 gastos cada uno):
+    POST /expense/ por defecto     p50   5,8 ms  p95   8,6 ms
+    POST /expense/ PRAGMAs         p50   5,1 ms  p95   7,3 ms   objetivo 25 ms: sí
+    /history/ SQLite               p50   6,5 ms  p95   8,1 ms   objetivo 50 ms: sí
+    /history/ DuckDB               p50   5,5 ms  p95   9,1 ms   objetivo 50 ms: sí
+    carga de la copia de DuckDB    6,4 s
+
+Con --users 10 (~60.000 gastos por usuario, el peor caso):
+    POST /expense/ por defecto     p50   6,2 ms  p95   8,8 ms
+    POST /expense/ PRAGMAs         p50   4,8 ms  p95   6,8 ms   objetivo 25 ms: sí
+    /history/ SQLite               p50 113,3 ms  p95 139,9 ms   objetivo 50 ms: no
+    /history/ DuckDB               p50   8,1 ms  p95   9,5 ms   objetivo 50 ms: sí
+
+Con pocos movimientos por usuario SQLite ya basta; DuckDB es para cuando
+cada usuario tiene decenas de miles. Cargar la copia con arrays de objetos
+(monedas y categorías como texto) tardaba 20 s en lugar de 6.
+"""
+
+import argparse
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date as pydate, timedelta
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+LEDGERS = (
+    ("expenses", 0.6, ["vivienda", "alimentación", "transporte", "salud", "otros"]),
+    ("savings", 0.25, ["fondo de emergencia", "jubilación", "vacaciones", "otros"]),
+    ("investments", 0.15, ["acciones", "bonos", "fondos", "criptomonedas"]),
+)
+TARGETS_MS = {"write": 25, "history": 50}
+SQLITE_DEFAULTS = (("journal_mode", "DELETE"), ("synchronous", "FULL"))
+
+
+def measure(label: str, requests: int, call, target=None) -> None:
+    timings = []
+    for _ in range(requests):
+        began = time.perf_counter()
+        call()
+        timings.append((time.perf_counter() - began) * 1000)
+    timings.sort()
+    p95 = timings[int(len(timings) * 0.95)]
+    line = f"{label:30} p50 {statistics.median(timings):5.1f} ms  p95 {p95:5.1f} ms"
+    if target is not None:
+        line += f"   objetivo {target} ms: {'sí' if p95 < target else 'no'}"
+    print(line)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+
+    path = Path(tempfile.mkdtemp()) / "embedded.db"
+    os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+    os.environ.setdefault("ANOMALY_MODE", "off")
+    os.environ["RATE_LIMIT_BACKEND"] = "off"
+    os.environ.pop("SHARD_DATABASE_URLS", None)
+    subprocess.run([sys.executable, "-m", "app.migrate"], cwd=ROOT, check=True, capture_output=True)
+
+    from fastapi.testclient import TestClient
+    from sqlalchemy import insert, select
+
+    from app import analytics, database
+    from app.main import app
+    from app.models import User, Expense, Saving, Investment
+
+    models = {"expenses": Expense, "savings": Saving, "investments": Investment}
+    random.seed(0)
+    start_day = pydate.today() - timedelta(days=5 * 365)
+    with database.get_engine().begin() as conn:
+        conn.execute(insert(User.__table__), [
+            {"email": f"user{i}@example.com", "password": "x"} for i in range(args.users)
+        ])
+        user_ids = conn.execute(select(User.id)).scalars().all()
+        for name, share, categories in LEDGERS:
+            rows = [
+                {
+                    "user_id": random.choice(user_ids),
+                    "date": start_day + timedelta(days=random.randrange(5 * 365)),
+                    "amount": round(random.uniform(1, 2000), 2),
+                    "category": random.choice(categories),
+                }
+                for _ in range(int(args.rows * share))
+            ]
+            for offset in range(0, len(rows), 50_000):
+                conn.execute(insert(models[name].__table__), rows[offset:offset + 50_000])
+
+    client = TestClient(app)
+
+    def write():
+        response = client.post("/expense/", json={
+            "user_id": random.choice(user_ids),
+            "date": (start_day + timedelta(days=random.randrange(5 * 365))).isoformat(),
+            "amount": round(random.uniform(1, 2000), 2),
+            "category": "otros",
+        })
+        assert response.status_code == 201, response.text
+
+    def history():
+        response = client.get("/history/", params={
+            "email": f"user{random.randrange(args.users)}@example.com", "period": "60", "data_type": "expenses",
+        })
+        assert response.status_code == 200, response.text
+
+    # journal_mode sólo cambia sin otras conexiones abiertas.
+    tuned = database.SQLITE_PRAGMAS
+    database.get_engine().dispose()
+    database.SQLITE_PRAGMAS = SQLITE_DEFAULTS
+    database.get_engine.cache_clear()
+    measure("POST /expense/ por defecto", args.requests, write)
+    database.get_engine().dispose()
+    database.SQLITE_PRAGMAS = tuned
+    database.get_engine.cache_clear()
+    measure("POST /expense/ PRAGMAs", args.requests, write, TARGETS_MS["write"])
+
+    measure("/history/ SQLite", args.requests, history, TARGETS_MS["history"])
+    analytics.ANALYTICS_DUCKDB_PATH = ":memory:"
+    began = time.perf_counter()
+    analytics.get_mirror().sync()
+    loaded = time.perf_counter() - began
+    measure("/history/ DuckDB", args.requests, history, TARGETS_MS["history"])
+    print(f"{'carga de la copia de DuckDB':30} {loaded:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Mide /search/ con un millón de movimientos (gastos, ahorros e inversiones).
+
+    python benchmarks/search.py [--rows 1000000] [--users 1000] [--database-url URL]
+
+Sin --database-url usa un SQLite temporal migrado con ``python -m app.migrate``
+(índices FTS5). Un 30 % de los movimientos lleva notas. Para cada consulta se
+miden 200 peticiones contra usuarios al azar, pasando por la aplicación
+completa (TestClient), y se da la mediana y el p95.
+
+Resultado en SQLite, 1.000.000 de filas, 1000 usuarios (~1000 filas cada uno):
+    sin filtros                  p50  8,7 ms  p95 12,1 ms
+    texto "cena"                 p50 16,6 ms  p95 23,0 ms
+    importe + fechas + categoría p50 11,1 ms  p95 14,5 ms
+
+Con --users 10 (~100.000 movimientos por usuario, el peor caso):
+    sin filtros                  p50 33,9 ms  p95 39,8 ms
+    texto "cena"                 p50 77,1 ms  p95 83,8 ms
+    importe + fechas + categoría p50 68,3 ms  p95 73,7 ms
+
+Antes del índice (user_id, category, date, amount) y de indexar user_id en
+FTS5, el peor caso sin filtros tardaba 251 ms (p50).
+"""
+
+import argparse
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date as pydate, timedelta
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+WORDS = ["cena", "comida", "taxi", "regalo", "viaje", "farmacia", "alquiler", "gasolina", "libros", "cine"]
+LEDGERS = (
+    ("expenses", 0.6, ["vivienda", "alimentación", "transporte", "salud", "ocio", "otros"]),
+    ("savings", 0.25, ["fondo de emergencia", "jubilación", "vacaciones", "otros"]),
+    ("investments", 0.15, ["acciones", "bonos", "fondos", "criptomonedas"]),
+)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--database-url", default=None)
+    args = parser.parse_args()
+
+    if args.database_url is None:
+        path = Path(tempfile.mkdtemp()) / "search.db"
+        args.database_url = f"sqlite:///{path}"
+    os.environ["DATABASE_URL"] = args.database_url
+    os.environ.setdefault("ANOMALY_MODE", "off")
+    subprocess.run([sys.executable, "-m", "app.migrate"], cwd=ROOT, check=True, capture_output=True)
+
+    from fastapi.testclient import TestClient
+    from sqlalchemy import insert, select
+
+    from app.database import get_engine
+    from app.main import app
+    from app.models import User, Expense, Saving, Investment
+
+    models = {"expenses": Expense, "savings": Saving, "investments": Investment}
+    engine = get_engine()
+    random.seed(0)
+    start_day = pydate(2021, 1, 1)
+    with engine.begin() as conn:
+        conn.execute(insert(User.__table__), [
+            {"email": f"user{i}@example.com", "password": "x"} for i in range(args.users)
+        ])
+        user_ids = conn.execute(select(User.id)).scalars().all()
+        for name, share, categories in LEDGERS:
+            rows = [
+                {
+                    "user_id": random.choice(user_ids),
+                    "date": start_day + timedelta(days=random.randrange(5 * 365)),
+                    "amount": round(random.uniform(1, 2000), 2),
+                    "category": random.choice(categories),
+                    "notes": " ".join(random.sample(WORDS, 2)) if random.random() < 0.3 else None,
+                }
+                for _ in range(int(args.rows * share))
+            ]
+            for offset in range(0, len(rows), 50_000):
+                conn.execute(insert(models[name].__table__), rows[offset:offset + 50_000])
+
+    client = TestClient(app)
+    queries = {
+        "sin filtros": {},
+        'texto "cena"': {"q": "cena"},
+        "importe + fechas + categoría": {
+            "min_amount": 100, "max_amount": 500, "date_from": "2023-01-01", "date_to": "2024-12-31",
+            "category": ["vivienda", "alimentación"],
+        },
+    }
+    for label, params in queries.items():
+        timings = []
+        for _ in range(args.requests):
+            user = random.randrange(args.users)
+            began = time.perf_counter()
+            response = client.get("/search/", params={"email": f"user{user}@example.com", **params})
+            timings.append((time.perf_counter() - began) * 1000)
+            assert response.status_code == 200, response.text
+        timings.sort()
+        print(f"{label:28} p50 {statistics.median(timings):5.1f} ms  p95 {timings[int(len(timings) * 0.95)]:5.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
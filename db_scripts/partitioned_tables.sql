@@ -0,0 +1,233 @@
+-- Esquema particionado (opcional) para las tablas de movimientos.
+--
+-- income, expenses, savings e investments pasan a ser tablas particionadas por
+-- rango mensual sobre "date" (Postgres >= 11). Las consultas de dashboard.py e
+-- history.py filtran con rangos sobre "date", así que el planner sólo visita
+-- las particiones del periodo pedido, y VACUUM / borrado de meses antiguos
+-- trabajan partición a partición.
+--
+-- Uso sobre una base ya creada con tables.sql (migra los datos existentes):
+--   psql "$DATABASE_URL" -f db_scripts/partitioned_tables.sql
+--
+-- Notas:
+--   * La clave primaria pasa a ser (id, date): Postgres exige que incluya la
+--     clave de partición. "id" sigue siendo único en la práctica porque sale
+--     de la misma secuencia, y la aplicación sigue buscando por "id".
+--   * Cada tabla tiene una partición DEFAULT que recoge fechas fuera de rango;
+--     create_month_partitions() crea las particiones futuras antes de que
+--     lleguen filas, de modo que la DEFAULT debería permanecer vacía. Si no
+--     lo está (fechas a más de months_ahead meses), pasa las filas de cada
+--     mes que crea de la DEFAULT a su partición.
+
+
+-- ─── Creación de particiones mensuales ──────────────────────────────────────
+
+-- Si la partición DEFAULT ya tiene filas de ese mes (p. ej. un movimiento con
+-- fecha a más de months_ahead meses), CREATE TABLE ... PARTITION OF fallaría
+-- ("updated partition constraint for default partition would be violated"):
+-- la partición se crea suelta, se le pasan esas filas y luego se adjunta.
+CREATE OR REPLACE FUNCTION create_month_partitions(
+    parent_table TEXT,
+    from_month DATE,
+    months_ahead INTEGER
+) RETURNS VOID AS $$
+DECLARE
+    month_start DATE;
+    month_end DATE;
+    partition_name TEXT;
+    default_partition REGCLASS;
+    stray_rows BOOLEAN;
+BEGIN
+    SELECT NULLIF(partdefid, 0)::REGCLASS INTO default_partition
+    FROM pg_partitioned_table
+    WHERE partrelid = parent_table::REGCLASS;
+
+    FOR i IN 0..months_ahead LOOP
+        month_start := (date_trunc('month', from_month) + make_interval(months => i))::DATE;
+        month_end := (month_start + INTERVAL '1 month')::DATE;
+        partition_name := format('%s_%s', parent_table, to_char(month_start, 'YYYY_MM'));
+        CONTINUE WHEN to_regclass(partition_name) IS NOT NULL;
+
+        stray_rows := FALSE;
+        IF default_partition IS NOT NULL THEN
+            -- Sin escrituras en la DEFAULT hasta el final de la transacción.
+            EXECUTE format('LOCK TABLE %s IN SHARE ROW EXCLUSIVE MODE', default_partition);
+            EXECUTE format('SELECT EXISTS (SELECT 1 FROM %s WHERE date >= %L AND date < %L)',
+                           default_partition, month_start, month_end)
+                INTO stray_rows;
+        END IF;
+
+        IF NOT stray_rows THEN
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+                partition_name, parent_table, month_start, month_end
+            );
+            CONTINUE;
+        END IF;
+
+        RAISE NOTICE 'Moviendo a % las filas de % en %', partition_name, month_start, default_partition;
+        EXECUTE format('CREATE TABLE %I (LIKE %I INCLUDING DEFAULTS INCLUDING CONSTRAINTS)',
+                       partition_name, parent_table);
+        EXECUTE format(
+            'WITH moved AS (DELETE FROM %s WHERE date >= %L AND date < %L RETURNING *) '
+            'INSERT INTO %I SELECT * FROM moved',
+            default_partition, month_start, month_end, partition_name
+        );
+        -- Al adjuntarla se crean sus índices y su clave primaria.
+        EXECUTE format('ALTER TABLE %I ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                       parent_table, partition_name, month_start, month_end);
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+
+-- Crea las particiones de los próximos meses para todas las tablas de
+-- movimientos. Programarla diariamente, p. ej. con pg_cron:
+--   SELECT cron.schedule('ledger-partitions', '0 3 * * *',
+--                        'SELECT ensure_ledger_partitions(3)');
+CREATE OR REPLACE FUNCTION ensure_ledger_partitions(months_ahead INTEGER DEFAULT 3)
+RETURNS VOID AS $$
+DECLARE
+    ledger TEXT;
+BEGIN
+    FOREACH ledger IN ARRAY ARRAY['income', 'expenses', 'savings', 'investments'] LOOP
+        PERFORM create_month_partitions(ledger, CURRENT_DATE, months_ahead);
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+
+-- ─── Migración desde las tablas de tables.sql ───────────────────────────────
+
+BEGIN;
+
+-- La FK de expense_flags (bases anteriores a la migración 0014) impediría
+-- borrar expenses_legacy y no se puede recrear sobre la clave (id, date).
+ALTER TABLE expense_flags DROP CONSTRAINT IF EXISTS expense_flags_expense_id_fkey;
+
+ALTER TABLE income RENAME TO income_legacy;
+ALTER TABLE expenses RENAME TO expenses_legacy;
+ALTER TABLE savings RENAME TO savings_legacy;
+ALTER TABLE investments RENAME TO investments_legacy;
+
+CREATE TABLE income (
+    id INTEGER NOT NULL DEFAULT nextval('income_id_seq'),
+    date DATE NOT NULL,
+    user_id INTEGER NOT NULL,
+    amount NUMERIC(14, 2) NOT NULL,
+    currency VARCHAR(3) NOT NULL DEFAULT 'EUR',
+    PRIMARY KEY (id, date),
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+) PARTITION BY RANGE (date);
+
+CREATE TABLE expenses (
+    id INTEGER NOT NULL DEFAULT nextval('expenses_id_seq'),
+    date DATE NOT NULL,
+    user_id INTEGER NOT NULL,
+    amount NUMERIC(14, 2) NOT NULL,
+    currency VARCHAR(3) NOT NULL DEFAULT 'EUR',
+    category VARCHAR(100) NOT NULL,
+    notes VARCHAR(500),
+    content_hash VARCHAR(32),
+    PRIMARY KEY (id, date),
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+) PARTITION BY RANGE (date);
+
+CREATE TABLE savings (
+    id INTEGER NOT NULL DEFAULT nextval('savings_id_seq'),
+    date DATE NOT NULL,
+    user_id INTEGER NOT NULL,
+    amount NUMERIC(14, 2) NOT NULL,
+    currency VARCHAR(3) NOT NULL DEFAULT 'EUR',
+    category VARCHAR(100) NOT NULL,
+    notes VARCHAR(500),
+    content_hash VARCHAR(32),
+    PRIMARY KEY (id, date),
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+) PARTITION BY RANGE (date);
+
+CREATE TABLE investments (
+    id INTEGER NOT NULL DEFAULT nextval('investments_id_seq'),
+    date DATE NOT NULL,
+    user_id INTEGER NOT NULL,
+    amount NUMERIC(14, 2) NOT NULL,
+    currency VARCHAR(3) NOT NULL DEFAULT 'EUR',
+    category VARCHAR(100) NOT NULL,
+    notes VARCHAR(500),
+    content_hash VARCHAR(32),
+    PRIMARY KEY (id, date),
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+) PARTITION BY RANGE (date);
+
+-- Las secuencias SERIAL pasan a pertenecer a las nuevas tablas para que no se
+-- borren junto con las *_legacy.
+ALTER SEQUENCE income_id_seq OWNED BY income.id;
+ALTER SEQUENCE expenses_id_seq OWNED BY expenses.id;
+ALTER SEQUENCE savings_id_seq OWNED BY savings.id;
+ALTER SEQUENCE investments_id_seq OWNED BY investments.id;
+
+CREATE TABLE income_default PARTITION OF income DEFAULT;
+CREATE TABLE expenses_default PARTITION OF expenses DEFAULT;
+CREATE TABLE savings_default PARTITION OF savings DEFAULT;
+CREATE TABLE investments_default PARTITION OF investments DEFAULT;
+
+-- Particiones para todo el histórico existente y los próximos meses.
+DO $$
+DECLARE
+    ledger TEXT;
+    first_month DATE;
+BEGIN
+    FOREACH ledger IN ARRAY ARRAY['income', 'expenses', 'savings', 'investments'] LOOP
+        EXECUTE format('SELECT min(date) FROM %I', ledger || '_legacy') INTO first_month;
+        first_month := COALESCE(first_month, CURRENT_DATE);
+        PERFORM create_month_partitions(
+            ledger,
+            first_month,
+            ((EXTRACT(YEAR FROM CURRENT_DATE) - EXTRACT(YEAR FROM first_month)) * 12
+             + EXTRACT(MONTH FROM CURRENT_DATE) - EXTRACT(MONTH FROM first_month))::INTEGER + 3
+        );
+    END LOOP;
+END;
+$$;
+
+-- Los índices creados sobre la tabla padre se propagan a cada partición.
+-- Los de tables.sql siguen en las tablas *_legacy con el mismo nombre.
+DROP INDEX IF EXISTS ix_income_user_date, ix_expenses_user_date, ix_savings_user_date, ix_investments_user_date,
+    ix_expenses_user_category, ix_savings_user_category, ix_investments_user_category,
+    ix_expenses_notes_trgm, ix_savings_notes_trgm, ix_investments_notes_trgm,
+    ux_expenses_content_hash, ux_savings_content_hash, ux_investments_content_hash;
+CREATE INDEX ix_income_user_date ON income (user_id, date);
+CREATE INDEX ix_expenses_user_date ON expenses (user_id, date);
+CREATE INDEX ix_savings_user_date ON savings (user_id, date);
+CREATE INDEX ix_investments_user_date ON investments (user_id, date);
+CREATE INDEX ix_expenses_user_category ON expenses (user_id, category, date, amount);
+CREATE INDEX ix_savings_user_category ON savings (user_id, category, date, amount);
+CREATE INDEX ix_investments_user_category ON investments (user_id, category, date, amount);
+CREATE INDEX ix_expenses_notes_trgm ON expenses USING gin (notes gin_trgm_ops);
+CREATE INDEX ix_savings_notes_trgm ON savings USING gin (notes gin_trgm_ops);
+CREATE INDEX ix_investments_notes_trgm ON investments USING gin (notes gin_trgm_ops);
+-- Un índice único de una tabla particionada debe incluir la clave de partición (date).
+CREATE UNIQUE INDEX ux_expenses_content_hash ON expenses (user_id, content_hash, date);
+CREATE UNIQUE INDEX ux_savings_content_hash ON savings (user_id, content_hash, date);
+CREATE UNIQUE INDEX ux_investments_content_hash ON investments (user_id, content_hash, date);
+
+INSERT INTO income (id, date, user_id, amount, currency)
+SELECT id, date, user_id, amount, currency FROM income_legacy;
+INSERT INTO expenses (id, date, user_id, amount, currency, category, notes, content_hash)
+SELECT id, date, user_id, amount, currency, category, notes, content_hash FROM expenses_legacy;
+INSERT INTO savings (id, date, user_id, amount, currency, category, notes, content_hash)
+SELECT id, date, user_id, amount, currency, category, notes, content_hash FROM savings_legacy;
+INSERT INTO investments (id, date, user_id, amount, currency, category, notes, content_hash)
+SELECT id, date, user_id, amount, currency, category, notes, content_hash FROM investments_legacy;
+
+DROP TABLE income_legacy;
+DROP TABLE expenses_legacy;
+DROP TABLE savings_legacy;
+DROP TABLE investments_legacy;
+
+COMMIT;
+
+ANALYZE income;
+ANALYZE expenses;
+ANALYZE savings;
+ANALYZE investments;
@@ -9,7 +9,8 @@ CREATE TABLE income (
     id SERIAL PRIMARY KEY,
     date DATE NOT NULL,
     user_id INTEGER NOT NULL,
-    amount NUMERIC(10, 2) NOT NULL,
+    amount NUMERIC(14, 2) NOT NULL,
+    currency VARCHAR(3) NOT NULL DEFAULT 'EUR',
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
 );
 
@@ -17,8 +18,11 @@ CREATE TABLE expenses (
     id SERIAL PRIMARY KEY,
     date DATE NOT NULL,
     user_id INTEGER NOT NULL,
-    amount NUMERIC(10, 2) NOT NULL,
+    amount NUMERIC(14, 2) NOT NULL,
+    currency VARCHAR(3) NOT NULL DEFAULT 'EUR',
     category VARCHAR(100) NOT NULL,
+    notes VARCHAR(500),
+    content_hash VARCHAR(32),
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
 );
 
@@ -26,8 +30,11 @@ CREATE TABLE savings (
     id SERIAL PRIMARY KEY,
     date DATE NOT NULL,
     user_id INTEGER NOT NULL,
-    amount NUMERIC(10, 2) NOT NULL,
+    amount NUMERIC(14, 2) NOT NULL,
+    currency VARCHAR(3) NOT NULL DEFAULT 'EUR',
     category VARCHAR(100) NOT NULL,
+    notes VARCHAR(500),
+    content_hash VARCHAR(32),
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
 );
 
@@ -35,8 +42,11 @@ CREATE TABLE investments (
     id SERIAL PRIMARY KEY,
     date DATE NOT NULL,
     user_id INTEGER NOT NULL,
-    amount NUMERIC(10, 2) NOT NULL,
+    amount NUMERIC(14, 2) NOT NULL,
+    currency VARCHAR(3) NOT NULL DEFAULT 'EUR',
     category VARCHAR(100) NOT NULL,
+    notes VARCHAR(500),
+    content_hash VARCHAR(32),
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
 );
 
@@ -62,4 +72,147 @@ CREATE TABLE investmentgoals (
     value NUMERIC(5, 2) NOT NULL,
     PRIMARY KEY (date, userid),
     FOREIGN KEY (userid) REFERENCES users(id) ON DELETE CASCADE
-);
\ No newline at end of file
+);
+
+-- Índices para las consultas por usuario y rango de fechas
+CREATE INDEX ix_income_user_date ON income (user_id, date);
+CREATE INDEX ix_expenses_user_date ON expenses (user_id, date);
+CREATE INDEX ix_savings_user_date ON savings (user_id, date);
+CREATE INDEX ix_investments_user_date ON investments (user_id, date);
+CREATE INDEX ix_expensegoals_userid_date ON expensegoals (userid, date);
+CREATE INDEX ix_savinggoals_userid_date ON savinggoals (userid, date);
+CREATE INDEX ix_investmentgoals_userid_date ON investmentgoals (userid, date);
+
+-- Estado precalculado de las metas (app/goal_status.py)
+CREATE TABLE goal_status (
+    user_id INTEGER NOT NULL,
+    month DATE NOT NULL,
+    goal_type VARCHAR(20) NOT NULL,
+    goal_percentage NUMERIC(5, 2) NOT NULL,
+    goal_value NUMERIC(14, 2) NOT NULL,
+    actual_value NUMERIC(14, 2) NOT NULL,
+    met BOOLEAN NOT NULL,
+    PRIMARY KEY (user_id, month, goal_type),
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+);
+
+-- Distribución entre usuarios del total mensual por categoría (app/jobs/cohorts.py)
+CREATE TABLE cohort_sketches (
+    month DATE NOT NULL,
+    kind VARCHAR(20) NOT NULL,
+    category VARCHAR(100) NOT NULL,
+    user_count INTEGER NOT NULL,
+    sketch JSON NOT NULL,
+    computed_at TIMESTAMPTZ NOT NULL,
+    PRIMARY KEY (month, kind, category)
+);
+
+-- Estadísticas robustas por usuario y categoría, y gastos anómalos (app/anomalies.py)
+CREATE TABLE expense_stats (
+    user_id INTEGER NOT NULL,
+    category VARCHAR(100) NOT NULL,
+    samples JSON NOT NULL,
+    sample_count INTEGER NOT NULL,
+    median NUMERIC(14, 2) NOT NULL,
+    mad NUMERIC(14, 2) NOT NULL,
+    PRIMARY KEY (user_id, category),
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+);
+
+CREATE TABLE expense_flags (
+    expense_id INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    category VARCHAR(100) NOT NULL,
+    amount NUMERIC(14, 2) NOT NULL,
+    median NUMERIC(14, 2) NOT NULL,
+    mad NUMERIC(14, 2) NOT NULL,
+    score NUMERIC(10, 2) NOT NULL,
+    flagged_at TIMESTAMPTZ NOT NULL,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+);
+CREATE INDEX ix_expense_flags_user_id ON expense_flags (user_id);
+
+-- Movimientos recurrentes (app/jobs/recurring.py)
+CREATE TABLE recurring_templates (
+    id SERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    ledger VARCHAR(20) NOT NULL,
+    frequency VARCHAR(10) NOT NULL,
+    amount NUMERIC(14, 2) NOT NULL,
+    currency VARCHAR(3) NOT NULL DEFAULT 'EUR',
+    category VARCHAR(100),
+    start_date DATE NOT NULL,
+    end_date DATE,
+    next_run DATE,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+);
+CREATE INDEX ix_recurring_templates_next_run ON recurring_templates (next_run);
+CREATE INDEX ix_recurring_templates_user_id ON recurring_templates (user_id);
+
+CREATE TABLE recurring_runs (
+    template_id INTEGER NOT NULL,
+    period DATE NOT NULL,
+    user_id INTEGER NOT NULL,
+    PRIMARY KEY (template_id, period),
+    FOREIGN KEY (template_id) REFERENCES recurring_templates(id) ON DELETE CASCADE,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+);
+
+-- Respuestas guardadas por Idempotency-Key (app/idempotency.py)
+CREATE TABLE idempotency_keys (
+    key VARCHAR(255) PRIMARY KEY,
+    request_hash VARCHAR(64) NOT NULL,
+    status_code INTEGER,
+    response_headers JSON,
+    response_body BYTEA,
+    created_at TIMESTAMPTZ NOT NULL,
+    expires_at TIMESTAMPTZ NOT NULL
+);
+CREATE INDEX ix_idempotency_keys_expires_at ON idempotency_keys (expires_at);
+
+-- Tipos de cambio diarios: unidades de cada moneda por 1 EUR (app/fx.py)
+CREATE TABLE fx_rates (
+    date DATE NOT NULL,
+    currency VARCHAR(3) NOT NULL,
+    rate NUMERIC(18, 8) NOT NULL,
+    PRIMARY KEY (date, currency)
+);
+
+-- Búsqueda de texto en las notas de los movimientos (/search)
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX ix_expenses_user_category ON expenses (user_id, category, date, amount);
+CREATE INDEX ix_savings_user_category ON savings (user_id, category, date, amount);
+CREATE INDEX ix_investments_user_category ON investments (user_id, category, date, amount);
+CREATE INDEX ix_expenses_notes_trgm ON expenses USING gin (notes gin_trgm_ops);
+CREATE INDEX ix_savings_notes_trgm ON savings USING gin (notes gin_trgm_ops);
+CREATE INDEX ix_investments_notes_trgm ON investments USING gin (notes gin_trgm_ops);
+
+-- Deduplicación de movimientos importados por CSV (app/csv_import.py)
+CREATE UNIQUE INDEX ux_expenses_content_hash ON expenses (user_id, content_hash, date);
+CREATE UNIQUE INDEX ux_savings_content_hash ON savings (user_id, content_hash, date);
+CREATE UNIQUE INDEX ux_investments_content_hash ON investments (user_id, content_hash, date);
+
+-- Registro append-only de cambios de movimientos y metas (app/changes.py)
+CREATE TABLE changes (
+    seq BIGSERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    entity VARCHAR(20) NOT NULL,
+    key VARCHAR(20) NOT NULL,
+    op VARCHAR(6) NOT NULL,
+    data JSON NOT NULL,
+    changed_at TIMESTAMPTZ NOT NULL
+);
+CREATE INDEX ix_changes_user_seq ON changes (user_id, seq);
+
+-- Resúmenes anuales precalculados por usuario (app/year_reports.py)
+CREATE TABLE year_reports (
+    user_id INTEGER NOT NULL,
+    year INTEGER NOT NULL,
+    months JSON NOT NULL,
+    report JSON NOT NULL,
+    stale_months INTEGER NOT NULL DEFAULT 0,
+    version INTEGER NOT NULL DEFAULT 0,
+    built_at TIMESTAMPTZ,
+    PRIMARY KEY (user_id, year),
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+);
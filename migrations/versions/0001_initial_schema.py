@@ -0,0 +1,70 @@
+"""Esquema inicial (db_scripts/tables.sql)
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-19
+
+Las bases ya creadas con tables.sql o con el antiguo create_all() deben
+marcarse como aplicadas en vez de ejecutarla:
+    alembic stamp 0001
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0001"
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+LEDGER_TABLES = ("expenses", "savings", "investments")
+GOAL_TABLES = ("expensegoals", "savinggoals", "investmentgoals")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "users",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("email", sa.String(255), nullable=False),
+        sa.Column("username", sa.String(50)),
+        sa.Column("password", sa.String(255), nullable=False),
+    )
+    op.create_index("ix_users_email", "users", ["email"], unique=True)
+
+    op.create_table(
+        "income",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("date", sa.Date, nullable=False),
+        sa.Column("user_id", sa.Integer, sa.ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("amount", sa.Numeric(10, 2), nullable=False),
+    )
+
+    for table in LEDGER_TABLES:
+        op.create_table(
+            table,
+            sa.Column("id", sa.Integer, primary_key=True),
+            sa.Column("date", sa.Date, nullable=False),
+            sa.Column("user_id", sa.Integer, sa.ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+            sa.Column("amount", sa.Numeric(10, 2), nullable=False),
+            sa.Column("category", sa.String(100), nullable=False),
+        )
+
+    for table in GOAL_TABLES:
+        op.create_table(
+            table,
+            sa.Column("date", sa.Date, primary_key=True),
+            sa.Column("userid", sa.Integer, sa.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True),
+            sa.Column("value", sa.Numeric(5, 2), nullable=False),
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in GOAL_TABLES + tuple(reversed(LEDGER_TABLES)) + ("income",):
+        op.drop_table(table)
+    op.drop_index("ix_users_email", table_name="users")
+    op.drop_table("users")
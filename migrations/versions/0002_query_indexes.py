@@ -0,0 +1,38 @@
+"""Índices para las consultas por usuario y fecha
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19
+
+dashboard, history, goals e import filtran siempre por usuario y rango de
+fechas; sin estos índices cada consulta recorre la tabla completa.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0002"
+down_revision: Union[str, Sequence[str], None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+LEDGER_TABLES = ("income", "expenses", "savings", "investments")
+GOAL_TABLES = ("expensegoals", "savinggoals", "investmentgoals")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for table in LEDGER_TABLES:
+        op.create_index(f"ix_{table}_user_date", table, ["user_id", "date"])
+    for table in GOAL_TABLES:
+        op.create_index(f"ix_{table}_userid_date", table, ["userid", "date"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in GOAL_TABLES:
+        op.drop_index(f"ix_{table}_userid_date", table_name=table)
+    for table in LEDGER_TABLES:
+        op.drop_index(f"ix_{table}_user_date", table_name=table)
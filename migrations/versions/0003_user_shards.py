@@ -0,0 +1,42 @@
+"""Directorio de shards e ids que no se reutilizan en SQLite
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19
+
+user_shards sólo se usa en la base de directorio (DATABASE_URL) cuando
+SHARD_DATABASE_URLS está definido. En SQLite las tablas de movimientos se
+recrean con AUTOINCREMENT para que cada shard pueda arrancar sus ids en un
+rango propio (python -m app.rebalance init-ids).
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0003"
+down_revision: Union[str, Sequence[str], None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+LEDGER_TABLES = ("income", "expenses", "savings", "investments")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "user_shards",
+        sa.Column("user_id", sa.Integer, sa.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("shard", sa.String(50), nullable=False),
+    )
+    if op.get_bind().dialect.name == "sqlite":
+        for table in LEDGER_TABLES:
+            with op.batch_alter_table(table, recreate="always", table_kwargs={"sqlite_autoincrement": True}):
+                pass
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("user_shards")
@@ -0,0 +1,39 @@
+"""Estado precalculado de las metas por usuario y mes
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19
+
+Tras aplicarla, rellenar la tabla con:
+    python -m app.jobs.reconcile_goals
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0004"
+down_revision: Union[str, Sequence[str], None] = "0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "goal_status",
+        sa.Column("user_id", sa.Integer, sa.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("month", sa.Date, primary_key=True),
+        sa.Column("goal_type", sa.String(20), primary_key=True),
+        sa.Column("goal_percentage", sa.Numeric(5, 2), nullable=False),
+        sa.Column("goal_value", sa.Numeric(14, 2), nullable=False),
+        sa.Column("actual_value", sa.Numeric(14, 2), nullable=False),
+        sa.Column("met", sa.Boolean, nullable=False),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("goal_status")
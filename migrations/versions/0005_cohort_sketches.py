@@ -0,0 +1,38 @@
+"""Distribuciones por mes y categoría entre usuarios
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19
+
+Se rellena con:
+    python -m app.jobs.cohorts --months 12
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0005"
+down_revision: Union[str, Sequence[str], None] = "0004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "cohort_sketches",
+        sa.Column("month", sa.Date, primary_key=True),
+        sa.Column("kind", sa.String(20), primary_key=True),
+        sa.Column("category", sa.String(100), primary_key=True),
+        sa.Column("user_count", sa.Integer, nullable=False),
+        sa.Column("sketch", sa.JSON, nullable=False),
+        sa.Column("computed_at", sa.DateTime(timezone=True), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("cohort_sketches")
@@ -0,0 +1,52 @@
+"""Estadísticas robustas por categoría y gastos anómalos
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-19
+
+Tras aplicarla, calcular las ventanas de los gastos existentes con:
+    python -m app.jobs.anomalies
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0006"
+down_revision: Union[str, Sequence[str], None] = "0005"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "expense_stats",
+        sa.Column("user_id", sa.Integer, sa.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("category", sa.String(100), primary_key=True),
+        sa.Column("samples", sa.JSON, nullable=False),
+        sa.Column("sample_count", sa.Integer, nullable=False),
+        sa.Column("median", sa.Numeric(14, 2), nullable=False),
+        sa.Column("mad", sa.Numeric(14, 2), nullable=False),
+    )
+    op.create_table(
+        "expense_flags",
+        sa.Column("expense_id", sa.Integer, sa.ForeignKey("expenses.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("user_id", sa.Integer, sa.ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("category", sa.String(100), nullable=False),
+        sa.Column("amount", sa.Numeric(10, 2), nullable=False),
+        sa.Column("median", sa.Numeric(14, 2), nullable=False),
+        sa.Column("mad", sa.Numeric(14, 2), nullable=False),
+        sa.Column("score", sa.Numeric(10, 2), nullable=False),
+        sa.Column("flagged_at", sa.DateTime(timezone=True), nullable=False),
+    )
+    op.create_index("ix_expense_flags_user_id", "expense_flags", ["user_id"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_expense_flags_user_id", table_name="expense_flags")
+    op.drop_table("expense_flags")
+    op.drop_table("expense_stats")
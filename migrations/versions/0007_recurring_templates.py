@@ -0,0 +1,55 @@
+"""Plantillas de movimientos recurrentes
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-19
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0007"
+down_revision: Union[str, Sequence[str], None] = "0006"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "recurring_templates",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("user_id", sa.Integer, sa.ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("ledger", sa.String(20), nullable=False),
+        sa.Column("frequency", sa.String(10), nullable=False),
+        sa.Column("amount", sa.Numeric(10, 2), nullable=False),
+        sa.Column("category", sa.String(100), nullable=True),
+        sa.Column("start_date", sa.Date, nullable=False),
+        sa.Column("end_date", sa.Date, nullable=True),
+        sa.Column("next_run", sa.Date, nullable=True),
+        sqlite_autoincrement=True,
+    )
+    op.create_index("ix_recurring_templates_next_run", "recurring_templates", ["next_run"])
+    op.create_index("ix_recurring_templates_user_id", "recurring_templates", ["user_id"])
+    op.create_table(
+        "recurring_runs",
+        sa.Column(
+            "template_id",
+            sa.Integer,
+            sa.ForeignKey("recurring_templates.id", ondelete="CASCADE"),
+            primary_key=True,
+        ),
+        sa.Column("period", sa.Date, primary_key=True),
+        sa.Column("user_id", sa.Integer, sa.ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("recurring_runs")
+    op.drop_index("ix_recurring_templates_user_id", table_name="recurring_templates")
+    op.drop_index("ix_recurring_templates_next_run", table_name="recurring_templates")
+    op.drop_table("recurring_templates")
@@ -0,0 +1,55 @@
+"""Moneda por movimiento, importes más anchos y tipos de cambio diarios
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-19
+
+Los movimientos existentes quedan en EUR. Cargar los tipos con:
+    python -m app.jobs.fx_rates eurofxref-hist.csv
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0009"
+down_revision: Union[str, Sequence[str], None] = "0008"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+CURRENCY_TABLES = ("income", "expenses", "savings", "investments", "recurring_templates")
+AMOUNT_TABLES = CURRENCY_TABLES + ("expense_flags",)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "fx_rates",
+        sa.Column("date", sa.Date, primary_key=True),
+        sa.Column("currency", sa.String(3), primary_key=True),
+        sa.Column("rate", sa.Numeric(18, 8), nullable=False),
+    )
+    for table in CURRENCY_TABLES:
+        op.add_column(table, sa.Column("currency", sa.String(3), nullable=False, server_default="EUR"))
+    # SQLite no aplica la precisión de NUMERIC: sólo hace falta en Postgres
+    # (en las tablas particionadas el cambio se propaga a cada partición).
+    if op.get_bind().dialect.name != "sqlite":
+        for table in AMOUNT_TABLES:
+            op.alter_column(
+                table, "amount", type_=sa.Numeric(14, 2), existing_type=sa.Numeric(10, 2), existing_nullable=False
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != "sqlite":
+        for table in AMOUNT_TABLES:
+            op.alter_column(
+                table, "amount", type_=sa.Numeric(10, 2), existing_type=sa.Numeric(14, 2), existing_nullable=False
+            )
+    for table in CURRENCY_TABLES:
+        with op.batch_alter_table(table) as batch:
+            batch.drop_column("currency")
+    op.drop_table("fx_rates")
@@ -0,0 +1,83 @@
+"""Notas en los movimientos e índices de búsqueda de texto
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-19
+
+Postgres: índices GIN de trigramas (pg_trgm) sobre ``notes`` para ILIKE
+'%texto%'. SQLite: tablas FTS5 de contenido externo (<tabla>_fts) que los
+triggers mantienen al día en cada INSERT, UPDATE o DELETE. Indexan también
+user_id para que MATCH sólo recorra los movimientos del usuario.
+
+En ambos, (user_id, category, date, amount) cubre los recuentos por
+categoría de /search sin leer las filas.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0010"
+down_revision: Union[str, Sequence[str], None] = "0009"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+SEARCH_TABLES = ("expenses", "savings", "investments")
+
+
+def _create_fts(table: str) -> None:
+    op.execute(
+        f"CREATE VIRTUAL TABLE {table}_fts USING fts5(notes, user_id, content='{table}', content_rowid='id')"
+    )
+    op.execute(f"""
+        CREATE TRIGGER {table}_fts_insert AFTER INSERT ON {table} WHEN new.notes IS NOT NULL BEGIN
+            INSERT INTO {table}_fts (rowid, notes, user_id) VALUES (new.id, new.notes, new.user_id);
+        END
+    """)
+    op.execute(f"""
+        CREATE TRIGGER {table}_fts_delete AFTER DELETE ON {table} WHEN old.notes IS NOT NULL BEGIN
+            INSERT INTO {table}_fts ({table}_fts, rowid, notes, user_id)
+                VALUES ('delete', old.id, old.notes, old.user_id);
+        END
+    """)
+    op.execute(f"""
+        CREATE TRIGGER {table}_fts_update AFTER UPDATE OF notes, user_id ON {table} BEGIN
+            INSERT INTO {table}_fts ({table}_fts, rowid, notes, user_id)
+                SELECT 'delete', old.id, old.notes, old.user_id WHERE old.notes IS NOT NULL;
+            INSERT INTO {table}_fts (rowid, notes, user_id)
+                SELECT new.id, new.notes, new.user_id WHERE new.notes IS NOT NULL;
+        END
+    """)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for table in SEARCH_TABLES:
+        op.add_column(table, sa.Column("notes", sa.String(500), nullable=True))
+        op.create_index(f"ix_{table}_user_category", table, ["user_id", "category", "date", "amount"])
+
+    if op.get_bind().dialect.name == "sqlite":
+        for table in SEARCH_TABLES:
+            _create_fts(table)
+    else:
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        for table in SEARCH_TABLES:
+            op.execute(f"CREATE INDEX ix_{table}_notes_trgm ON {table} USING gin (notes gin_trgm_ops)")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name == "sqlite":
+        for table in SEARCH_TABLES:
+            for trigger in ("insert", "delete", "update"):
+                op.execute(f"DROP TRIGGER {table}_fts_{trigger}")
+            op.execute(f"DROP TABLE {table}_fts")
+    else:
+        for table in SEARCH_TABLES:
+            op.execute(f"DROP INDEX ix_{table}_notes_trgm")
+    for table in SEARCH_TABLES:
+        op.drop_index(f"ix_{table}_user_category", table_name=table)
+        with op.batch_alter_table(table) as batch:
+            batch.drop_column("notes")
@@ -0,0 +1,47 @@
+"""Huella de contenido de los movimientos importados
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-19
+
+``content_hash`` identifica cada fila que entra por /import (usuario, fecha,
+importe, categoría, moneda y notas normalizadas; ver app/csv_import.py) y
+el índice único hace que reimportar un extracto que se solapa con otro ya
+cargado no duplique movimientos (INSERT ... ON CONFLICT DO NOTHING). Las
+filas creadas por la API y las ya existentes quedan con NULL, que el índice
+no compara.
+
+El índice empieza por user_id para que las filas de un fichero caigan juntas
+en el árbol y no en páginas al azar por todo el índice, e incluye ``date``
+para poder crearse también sobre las tablas particionadas por fecha
+(db_scripts/partitioned_tables.sql); la huella ya contiene usuario y fecha,
+así que no cambia qué filas chocan.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0011"
+down_revision: Union[str, Sequence[str], None] = "0010"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+HASHED_TABLES = ("expenses", "savings", "investments")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for table in HASHED_TABLES:
+        op.add_column(table, sa.Column("content_hash", sa.String(32), nullable=True))
+        op.create_index(f"ux_{table}_content_hash", table, ["user_id", "content_hash", "date"], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in HASHED_TABLES:
+        op.drop_index(f"ux_{table}_content_hash", table_name=table)
+        with op.batch_alter_table(table) as batch:
+            batch.drop_column("content_hash")
@@ -0,0 +1,43 @@
+"""Registro append-only de cambios de movimientos y metas
+
+Revision ID: 0012
+Revises: 0011
+Create Date: 2026-10-19
+
+Ver app/changes.py. El registro empieza vacío: quien lo consuma debe hacer
+una carga completa antes de seguirlo desde ``seq`` 0.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0012"
+down_revision: Union[str, Sequence[str], None] = "0011"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "changes",
+        sa.Column("seq", sa.BigInteger().with_variant(sa.Integer, "sqlite"), primary_key=True, autoincrement=True),
+        sa.Column("user_id", sa.Integer, nullable=False),
+        sa.Column("entity", sa.String(20), nullable=False),
+        sa.Column("key", sa.String(20), nullable=False),
+        sa.Column("op", sa.String(6), nullable=False),
+        sa.Column("data", sa.JSON, nullable=False),
+        sa.Column("changed_at", sa.DateTime(timezone=True), nullable=False),
+        # AUTOINCREMENT en SQLite: un seq nunca se reutiliza, ni tras borrar las últimas filas.
+        sqlite_autoincrement=True,
+    )
+    op.create_index("ix_changes_user_seq", "changes", ["user_id", "seq"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_changes_user_seq", table_name="changes")
+    op.drop_table("changes")
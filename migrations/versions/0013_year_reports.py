@@ -0,0 +1,39 @@
+"""Resúmenes anuales precalculados por usuario
+
+Revision ID: 0013
+Revises: 0012
+Create Date: 2026-10-19
+
+Ver app/year_reports.py. La tabla empieza vacía: cada resumen se calcula en
+la primera petición a /reports/{year} o con ``python -m app.jobs.year_reports``.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0013"
+down_revision: Union[str, Sequence[str], None] = "0012"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "year_reports",
+        sa.Column("user_id", sa.Integer, sa.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("year", sa.Integer, primary_key=True),
+        sa.Column("months", sa.JSON, nullable=False),
+        sa.Column("report", sa.JSON, nullable=False),
+        sa.Column("stale_months", sa.Integer, nullable=False, server_default="0"),
+        sa.Column("version", sa.Integer, nullable=False, server_default="0"),
+        sa.Column("built_at", sa.DateTime(timezone=True), nullable=True),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("year_reports")
@@ -0,0 +1,63 @@
+"""expense_flags sin clave foránea a expenses
+
+Revision ID: 0014
+Revises: 0013
+Create Date: 2026-10-19
+
+Con el esquema particionado (db_scripts/partitioned_tables.sql) la clave de
+expenses es (id, date): la FK de expense_flags.expense_id no se puede
+recrear y además impide borrar expenses_legacy. Las marcas de los gastos
+borrados las quita app/anomalies.py.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0014"
+down_revision: Union[str, Sequence[str], None] = "0013"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _expense_flags(with_expense_fk: bool) -> sa.Table:
+    expense_id = (
+        sa.Column("expense_id", sa.Integer, sa.ForeignKey("expenses.id", ondelete="CASCADE"), primary_key=True)
+        if with_expense_fk else sa.Column("expense_id", sa.Integer, primary_key=True)
+    )
+    return sa.Table(
+        "expense_flags",
+        sa.MetaData(),
+        expense_id,
+        sa.Column("user_id", sa.Integer, sa.ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("category", sa.String(100), nullable=False),
+        sa.Column("amount", sa.Numeric(14, 2), nullable=False),
+        sa.Column("median", sa.Numeric(14, 2), nullable=False),
+        sa.Column("mad", sa.Numeric(14, 2), nullable=False),
+        sa.Column("score", sa.Numeric(10, 2), nullable=False),
+        sa.Column("flagged_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Index("ix_expense_flags_user_id", "user_id"),
+    )
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_bind().dialect.name == "sqlite":
+        # La FK no tiene nombre en SQLite: se recrea la tabla sin ella.
+        with op.batch_alter_table("expense_flags", copy_from=_expense_flags(False), recreate="always"):
+            pass
+        return
+    op.execute("ALTER TABLE expense_flags DROP CONSTRAINT IF EXISTS expense_flags_expense_id_fkey")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name == "sqlite":
+        with op.batch_alter_table("expense_flags", copy_from=_expense_flags(True), recreate="always"):
+            pass
+        return
+    op.create_foreign_key(
+        "expense_flags_expense_id_fkey", "expense_flags", "expenses", ["expense_id"], ["id"], ondelete="CASCADE"
+    )
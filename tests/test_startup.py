@@ -0,0 +1,18 @@
+# tests/test_startup.py
+"""
+Presupuesto de arranque en frío del modo lazy (ver app/startup_profile.py):
+importar app.main con WEALTHTRACK_LAZY_STARTUP=1 no debe pasar de
+BUDGET_MS. Se toma la mediana de tres imports, como ``python -m
+app.startup_profile``.
+"""
+
+from app.startup_profile import profile_import, summarize
+
+BUDGET_MS = 600
+RUNS = 3
+
+
+def test_lazy_import_within_budget():
+    totals = sorted(summarize(profile_import(lazy=True))[0] for _ in range(RUNS))
+    total_ms = totals[RUNS // 2]
+    assert total_ms <= BUDGET_MS, f"import app.main (lazy): {total_ms:.1f} ms > {BUDGET_MS} ms"